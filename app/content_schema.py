@@ -0,0 +1,138 @@
+"""
+Schema for the files in the content directory, checked before a version is served.
+
+Schemas are plain Python values:
+
+- a type (or tuple of types) the value must be an instance of;
+- [schema] for a list whose items all match schema;
+- {"key": schema, "?key": schema} for an object with required and optional
+  keys (other keys are allowed and ignored);
+- {str: schema} for an object with arbitrary keys, e.g. courses by school id.
+
+Only what the flows rely on is required, so content can grow new fields
+without a code change. validate() also checks what a schema cannot express:
+unique ids, courses filed under a known school, details present whenever
+has_details is set.
+"""
+
+TEXT = str
+NUMBER = (int, float)
+TEXT_OR_NUMBER = (str, int, float)
+
+COURSE = {
+    "id": TEXT,
+    "name": TEXT,
+    "?has_details": bool,
+    "?details": {
+        "overview": TEXT,
+        "curriculum": [TEXT],
+        "eligibility": TEXT,
+        "career_prospects": [TEXT],
+        "scholarships": TEXT,
+        "?fees": {"prog_fee_per_sem": NUMBER, "tuition_fee": NUMBER, "?level": TEXT},
+    },
+}
+
+TITLED_ITEM = {"title": TEXT, "description": TEXT}
+
+SCHEMA = {
+    "schools.json": [{
+        "id": TEXT,
+        "name": TEXT,
+        "?description": TEXT,
+        "?programs_offered": [TEXT],
+        "?facilities": [TEXT],
+    }],
+    "courses.json": {str: [COURSE]},
+    "scholarships.json": [{"title": TEXT, "description": TEXT, "?slug": TEXT, "?benefits": TEXT, "?eligibility": TEXT}],
+    "cocurricular.json": [{"name": TEXT, "type": TEXT, "description": TEXT, "?slug": TEXT}],
+    "campus.json": {
+        "?overview": TEXT,
+        "?infrastructure": [TITLED_ITEM],
+        "?facilities": [TITLED_ITEM],
+        "?technology_features": [TEXT],
+    },
+    "placements.json": {
+        "overview": TEXT,
+        "statistics": {"highest_package": TEXT_OR_NUMBER, "average_package": TEXT_OR_NUMBER,
+                       "companies_visited": TEXT_OR_NUMBER},
+        "top_recruiters": [TEXT],
+        "activities": [TEXT],
+    },
+}
+
+# Stop collecting after this many problems; the first ones are enough to fix the file
+MAX_ERRORS = 50
+
+class ContentError(ValueError):
+    """Content that does not match the schema. `errors` lists every problem found."""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        more = f" (and {len(self.errors) - 5} more)" if len(self.errors) > 5 else ""
+        super().__init__("; ".join(self.errors[:5]) + more)
+
+def _type_name(expected):
+    if isinstance(expected, tuple):
+        return " or ".join(dict.fromkeys(_type_name(t) for t in expected))
+    return {str: "text", int: "a number", float: "a number", bool: "true/false"}.get(expected, expected.__name__)
+
+def _check(value, schema, path, errors):
+    if len(errors) >= MAX_ERRORS:
+        return
+    if isinstance(schema, list):
+        if not isinstance(value, (list, tuple)):
+            errors.append(f"{path}: expected a list, got {type(value).__name__}")
+            return
+        for i, item in enumerate(value):
+            _check(item, schema[0], f"{path}[{i}]", errors)
+    elif isinstance(schema, dict):
+        if not hasattr(value, "items"):
+            errors.append(f"{path}: expected an object, got {type(value).__name__}")
+            return
+        if str in schema:
+            for key, item in value.items():
+                _check(item, schema[str], f"{path}.{key}", errors)
+            return
+        for key, item_schema in schema.items():
+            optional = key.startswith("?")
+            key = key.lstrip("?")
+            if key in value:
+                _check(value[key], item_schema, f"{path}.{key}", errors)
+            elif not optional:
+                errors.append(f"{path}: missing {key!r}")
+    # bool is an int subclass, but true is not a fee
+    elif not isinstance(value, schema) or (isinstance(value, bool) and schema is not bool):
+        errors.append(f"{path}: expected {_type_name(schema)}, got {type(value).__name__}")
+
+def _unique(values, what, errors):
+    seen = set()
+    for value in values:
+        if value in seen:
+            errors.append(f"duplicate {what} {value!r}")
+        seen.add(value)
+
+def validate(files):
+    """
+    Returns every problem found in `files` (file name -> parsed content), or an
+    empty list. Files that are absent are not checked; the getters serve them empty.
+    """
+    errors = []
+    for name, schema in SCHEMA.items():
+        if name in files:
+            _check(files[name], schema, name.removesuffix(".json"), errors)
+    if errors:
+        return errors[:MAX_ERRORS]
+
+    schools = files.get("schools.json", ())
+    courses = files.get("courses.json", {})
+    _unique((school["id"] for school in schools), "school id", errors)
+    _unique((course["id"] for school_courses in courses.values() for course in school_courses), "course id", errors)
+    if "schools.json" in files:
+        known = {school["id"] for school in schools}
+        errors.extend(f"courses filed under unknown school {school_id!r}" for school_id in courses if school_id not in known)
+    for school_id, school_courses in courses.items():
+        for course in school_courses:
+            if course.get("has_details") and "details" not in course:
+                errors.append(f"courses.{school_id}: {course['id']!r} has has_details set but no details")
+    return errors[:MAX_ERRORS]
@@ -0,0 +1,166 @@
+"""
+Compiled content snapshots: the whole data directory validated and written
+to one file that workers load with a single read.
+
+    python -m app.content_snapshot build --out content.snapshot
+    python -m app.content_snapshot check
+
+A snapshot is a magic line, a one-line JSON header (format, Python version,
+content version, file names) and a marshal body with:
+
+- every content file, already validated against app/content_schema.py, with
+  lists stored as tuples and equal strings stored once;
+- the course catalogue and the search index built from it, so a worker
+  neither re-parses JSON nor rebuilds them on startup.
+
+marshal is only readable by the Python version that wrote it, so the header
+records that version and a mismatch is refused (the repository then falls
+back to the JSON files). The prebuilt indexes are dropped, and rebuilt as
+usual, if app/course_query.py or app/search.py changed since the build.
+"""
+import argparse
+import hashlib
+import json
+import marshal
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .content_schema import ContentError
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+MAGIC = b"ASKGEETA-CONTENT\n"
+FORMAT = 1
+PYTHON = "%d.%d" % sys.version_info[:2]
+
+# The modules whose structures are stored prebuilt
+INDEX_SOURCES = ("course_query.py", "search.py")
+
+def code_version() -> str:
+    """Hash of the modules that build the prebuilt indexes."""
+    digest = hashlib.sha1()
+    for name in INDEX_SOURCES:
+        digest.update(Path(__file__).with_name(name).read_bytes())
+    return digest.hexdigest()[:12]
+
+def _compact(value, strings):
+    """Lists become tuples and equal strings one object, so marshal writes each string once."""
+    if isinstance(value, str):
+        return strings.setdefault(value, value)
+    if isinstance(value, dict):
+        return {strings.setdefault(k, k): _compact(v, strings) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return tuple(_compact(v, strings) for v in value)
+    return value
+
+def build(data_dir, out):
+    """Validates and compiles data_dir into the snapshot file `out`. Returns its header."""
+    from .data_loader import ContentSnapshot, freeze, read_content
+    from .search import SearchIndex
+
+    files, version = read_content(data_dir)
+    files = _compact(files, {})
+    content = ContentSnapshot({name: freeze(value) for name, value in files.items()}, version)
+    body = marshal.dumps({
+        "files": files,
+        "prebuilt": {"catalog": content.catalog.state(), "search": SearchIndex(content).state()},
+    })
+    header = {
+        "format": FORMAT,
+        "python": PYTHON,
+        "version": version,
+        "code": code_version(),
+        "files": sorted(files),
+        "size": len(body),
+        "built_at": int(time.time()),
+    }
+
+    # Written next to the target and renamed over it, so a worker never reads half a file
+    out = Path(out)
+    fd, tmp = tempfile.mkstemp(dir=out.parent, prefix=f".{out.name}.")
+    try:
+        os.chmod(tmp, 0o644)  # mkstemp creates it private to the builder
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC + json.dumps(header).encode() + b"\n" + body)
+        os.replace(tmp, out)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return header
+
+def _split(data):
+    """(header, body offset) of a snapshot. Raises ValueError if it cannot be loaded here."""
+    if not data.startswith(MAGIC):
+        raise ValueError("not a content snapshot")
+    end = data.find(b"\n", len(MAGIC))
+    try:
+        header = json.loads(data[len(MAGIC):end])
+    except ValueError:
+        raise ValueError("content snapshot header is corrupt") from None
+    if header.get("format") != FORMAT:
+        raise ValueError(f"content snapshot format {header.get('format')} is not {FORMAT}, rebuild it")
+    if header.get("python") != PYTHON:
+        raise ValueError(f"content snapshot was built by Python {header.get('python')}, this is {PYTHON}; rebuild it")
+    return header, end + 1
+
+def read_header(path) -> dict:
+    """The header of the snapshot at `path`, checked like load() does."""
+    with open(path, "rb") as f:
+        head = f.readline() + f.readline()
+    return _split(head)[0]
+
+def load(path):
+    """
+    (files, version, prebuilt) from the snapshot at `path`. The files are
+    plain dicts and tuples, for the repository to freeze. Raises OSError or
+    ValueError.
+    """
+    data = Path(path).read_bytes()
+    header, offset = _split(data)
+    if len(data) - offset != header.get("size"):
+        raise ValueError("content snapshot is truncated")
+    try:
+        payload = marshal.loads(memoryview(data)[offset:])
+        files, prebuilt = payload["files"], payload["prebuilt"]
+        if not isinstance(files, dict) or not isinstance(prebuilt, dict):
+            raise TypeError("files and prebuilt must be dicts")
+    except (EOFError, TypeError, KeyError) as e:
+        raise ValueError(f"content snapshot is corrupt: {e!r}") from None
+
+    if header["code"] != code_version():
+        logger.info("Content snapshot %s predates the current index code, rebuilding its indexes", path)
+        prebuilt = {}
+    return files, header["version"], prebuilt
+
+def main():
+    from .data_loader import DATA_DIR
+
+    parser = argparse.ArgumentParser(description="Validate and compile the content directory.")
+    parser.add_argument("command", choices=("build", "check"),
+                        help="build writes the snapshot, check only validates the content")
+    parser.add_argument("--data", default=DATA_DIR, help="content directory (default: CONTENT_DIR or data/)")
+    parser.add_argument("--out", default="content.snapshot", help="snapshot file to write")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        if args.command == "check":
+            from .data_loader import read_content
+            files, version = read_content(args.data)
+            print(f"{args.data}: {len(files)} files valid, version {version}")
+        else:
+            header = build(args.data, args.out)
+            print(f"Wrote {args.out}: version {header['version']}, {len(header['files'])} files, "
+                  f"{header['size']} bytes in {(time.perf_counter() - start) * 1000:.0f} ms")
+    except ContentError as e:
+        print(f"{args.data}: content is invalid", file=sys.stderr)
+        for error in e.errors:
+            print(f"  {error}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Structured queries over the course catalogue: filter by school, level and
+fee ranges, sort and paginate.
+
+A CourseCatalog is built with every content snapshot. Courses are stored as
+columns (one tuple per field, indexed by row number), with each sortable
+field's row order and each school's and level's rows precomputed, so a query
+never walks the nested courses.json:
+
+- a fee range is two bisects into that fee's sorted column, kept per level
+  as well as for the whole catalogue;
+- the filter with the fewest candidate rows drives, the others are column
+  lookups per candidate;
+- results come out of the sort field's precomputed order (or are sorted by
+  their precomputed rank when there are only a few of them).
+"""
+from bisect import bisect_left, bisect_right
+from types import MappingProxyType
+import re
+
+FEE_FIELDS = ("prog_fee_per_sem", "tuition_fee")
+SORT_FIELDS = ("name", "school", "level") + FEE_FIELDS
+MAX_PAGE_SIZE = 100
+# Levels sort in this order (by level_key), any others after them alphabetically
+LEVEL_ORDER = ("diploma", "ug", "pg", "phd")
+
+_EMPTY = MappingProxyType({})
+
+def level_key(level) -> str:
+    """Normalises a level name so that Ph.D, PhD and phd match."""
+    return re.sub(r"[^a-z0-9]", "", str(level).lower())
+
+def _level_rank(key):
+    return LEVEL_ORDER.index(key) if key in LEVEL_ORDER else len(LEVEL_ORDER)
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+class CourseCatalog:
+    __slots__ = ("ids", "names", "schools", "school_names", "levels", "level_keys", "fees",
+                 "by_school", "by_level", "fee_order", "fee_values", "order", "rank")
+
+    def __init__(self, index):
+        rows = []
+        for course_id, course in index.courses.items():
+            fees = course.get("details", _EMPTY).get("fees", _EMPTY)
+            rows.append((
+                course_id,
+                course["name"],
+                index.course_school[course_id],
+                fees.get("level"),
+                tuple(_number(fees.get(field)) for field in FEE_FIELDS),
+            ))
+
+        self.ids = tuple(r[0] for r in rows)
+        self.names = tuple(r[1] for r in rows)
+        self.schools = tuple(r[2] for r in rows)
+        self.school_names = tuple(index.schools.get(s, _EMPTY).get("name", s) for s in self.schools)
+        self.levels = tuple(r[3] for r in rows)
+        self.level_keys = tuple(None if level is None else level_key(level) for level in self.levels)
+        self.fees = {field: tuple(r[4][i] for r in rows) for i, field in enumerate(FEE_FIELDS)}
+
+        self.by_school, self.by_level = {}, {}
+        for row in range(len(rows)):
+            self.by_school.setdefault(self.schools[row], []).append(row)
+            if self.level_keys[row] is not None:
+                self.by_level.setdefault(self.level_keys[row], []).append(row)
+
+        # Per (level key, fee field): the rows with that fee ordered by it, and the fees in
+        # that order for bisecting. Level None holds every level.
+        self.fee_order, self.fee_values = {}, {}
+        for field, column in self.fees.items():
+            order = sorted((row for row in range(len(rows)) if column[row] is not None),
+                           key=lambda row: (column[row], self.names[row]))
+            by_level = {None: order}
+            for row in order:
+                if self.level_keys[row] is not None:
+                    by_level.setdefault(self.level_keys[row], []).append(row)
+            for level, level_order in by_level.items():
+                self.fee_order[level, field] = tuple(level_order)
+                self.fee_values[level, field] = tuple(column[row] for row in level_order)
+
+        # Row order per (sort field, descending), courses without a value last either way,
+        # and each row's position in that order
+        names = [name.lower() for name in self.names]
+        school_names = [name.lower() for name in self.school_names]
+        keys = {
+            "name": names.__getitem__,
+            "school": lambda row: (school_names[row], names[row]),
+            "level": lambda row: (_level_rank(self.level_keys[row]), self.level_keys[row], names[row]),
+        }
+        self.order, self.rank = {}, {}
+        for field in SORT_FIELDS:
+            if field in keys:
+                column = self.level_keys if field == "level" else self.ids
+                ascending = sorted((row for row in range(len(rows)) if column[row] is not None), key=keys[field])
+            else:
+                column = self.fees[field]
+                ascending = list(self.fee_order[None, field])
+            missing = [row for row in range(len(rows)) if column[row] is None]
+            for descending, order in ((False, ascending + missing), (True, ascending[::-1] + missing)):
+                self.order[field, descending] = tuple(order)
+                rank = [0] * len(rows)
+                for position, row in enumerate(order):
+                    rank[row] = position
+                self.rank[field, descending] = rank
+
+    def state(self) -> dict:
+        """Every column and order as plain tuples, lists and dicts, for a compiled content snapshot."""
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_state(cls, state):
+        catalog = cls.__new__(cls)
+        for slot in cls.__slots__:
+            setattr(catalog, slot, state[slot])
+        return catalog
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _fee_span(self, level, field, low, high):
+        """(rows ordered by fee, start, end): the rows of `level` with low <= fee <= high."""
+        values = self.fee_values.get((level, field), ())
+        start = 0 if low is None else bisect_left(values, low)
+        end = len(values) if high is None else bisect_right(values, high)
+        return self.fee_order.get((level, field), ()), start, max(start, end)
+
+    def query(self, schools=None, levels=None, fee_ranges=None, sort="name", descending=False, offset=0, limit=20):
+        """
+        Courses matching every given filter, as {"total", "offset", "limit", "courses"}.
+
+        schools and levels are collections of school ids and level names (any
+        matches); fee_ranges maps a FEE_FIELDS name to an inclusive (min, max)
+        pair where either bound may be None. Courses without that fee never
+        match a fee range.
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_FIELDS)}")
+        schools = set(schools) if schools else None
+        levels = {level_key(level) for level in levels} if levels else None
+        ranges = []
+        for field, (low, high) in (fee_ranges or {}).items():
+            if field not in FEE_FIELDS:
+                raise ValueError(f"fee range field must be one of {', '.join(FEE_FIELDS)}")
+            if low is not None or high is not None:
+                ranges.append((field, low, high))
+
+        # Pick the filter with the fewest candidate rows without materialising any of them.
+        # A fee range is bisected within each requested level, so it covers the level filter too.
+        options = []  # (candidate count, filter, spans or keys)
+        if schools:
+            options.append((sum(len(self.by_school.get(school, ())) for school in schools), "school", None))
+        if levels and not ranges:
+            options.append((sum(len(self.by_level.get(level, ())) for level in levels), "level", None))
+        for field, low, high in ranges:
+            spans = [self._fee_span(level, field, low, high) for level in (levels or (None,))]
+            options.append((sum(end - start for _, start, end in spans), field, spans))
+
+        ordered = None
+        if not options:
+            matches = None  # everything
+        else:
+            _, driver, spans = min(options, key=lambda option: option[0])
+            if driver == "school":
+                matches = [row for school in schools for row in self.by_school.get(school, ())]
+            elif driver == "level":
+                matches = [row for level in levels for row in self.by_level.get(level, ())]
+            else:
+                matches = [row for order, start, end in spans for row in order[start:end]]
+                if sort == driver and len(spans) == 1:
+                    ordered = matches  # already in fee order
+            if schools and driver != "school":
+                matches = [row for row in matches if self.schools[row] in schools]
+            if levels and driver == "school":
+                matches = [row for row in matches if self.level_keys[row] in levels]
+            for field, low, high in ranges:
+                if field != driver:
+                    column = self.fees[field]
+                    matches = [row for row in matches if column[row] is not None and
+                               (low is None or column[row] >= low) and (high is None or column[row] <= high)]
+            if ordered is not None:
+                ordered = matches[::-1] if descending else matches
+
+        order = self.order[sort, descending]
+        if matches is None:
+            total, ordered = len(order), order
+        elif ordered is not None:
+            total = len(ordered)
+        elif len(matches) * 8 < len(order):
+            total, ordered = len(matches), sorted(matches, key=self.rank[sort, descending].__getitem__)
+        else:
+            # Most rows match: walk the precomputed order rather than sorting
+            matched = set(matches)
+            total, ordered = len(matched), [row for row in order if row in matched]
+
+        limit = max(0, min(limit, MAX_PAGE_SIZE))
+        offset = max(0, offset)
+        return {
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "courses": [self.row(row) for row in ordered[offset:offset + limit]],
+        }
+
+    def row(self, row) -> dict:
+        return {
+            "id": self.ids[row],
+            "name": self.names[row],
+            "school_id": self.schools[row],
+            "school_name": self.school_names[row],
+            "level": self.levels[row],
+            "prog_fee_per_sem": self.fees["prog_fee_per_sem"][row],
+            "tuition_fee": self.fees["tuition_fee"][row],
+            "value": f"course_{self.ids[row]}",
+        }
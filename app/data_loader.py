@@ -1,33 +1,294 @@
+import hashlib
 import json
 import os
+import re
+import threading
+import time
 from pathlib import Path
+from types import MappingProxyType
+
+from . import content_snapshot
+from .content_schema import ContentError, validate
+from .course_query import CourseCatalog
+from .log import get_logger
+from .metrics import register_stats
+from . import tracing
+
+logger = get_logger(__name__)
 
 BASE_DIR = Path(__file__).resolve().parent.parent
-DATA_DIR = BASE_DIR / "data"
+# CONTENT_DIR points the app at another content directory, e.g. a synthetic
+# catalogue from benchmarks/synthetic_content.py
+DATA_DIR = Path(os.getenv("CONTENT_DIR", BASE_DIR / "data"))
+# CONTENT_SNAPSHOT loads a file compiled with `python -m app.content_snapshot build`
+# instead of the JSON directory
+SNAPSHOT_PATH = os.getenv("CONTENT_SNAPSHOT") or None
+
+# How often (seconds) the repository stats data/*.json looking for edits.
+# Between checks every getter is served straight from memory.
+RELOAD_CHECK_INTERVAL = float(os.getenv("CONTENT_RELOAD_INTERVAL", "2"))
+
+EMPTY = MappingProxyType({})
 
 def load_json(filename: str):
     """Loads a JSON file from the data directory."""
     filepath = DATA_DIR / filename
     if not filepath.exists():
         return {} # Return empty dict/list if file missing to avoid crash
-    
+
     with open(filepath, "r", encoding="utf-8") as f:
         return json.load(f)
 
+def freeze(value):
+    """Recursively converts dicts/lists into read-only mappings/tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+def read_content(data_dir, names=None):
+    """
+    (files, version) for the JSON files in data_dir (all of them unless `names`
+    is given), parsed but not frozen. The version is a hash of the file contents.
+    Raises OSError, ValueError, or ContentError if the content fails validation.
+    """
+    data_dir = Path(data_dir)
+    if names is None:
+        names = sorted(path.name for path in data_dir.glob("*.json"))
+    digest = hashlib.sha1()
+    files = {}
+    for name in names:
+        raw = (data_dir / name).read_bytes()
+        digest.update(name.encode("utf-8") + b"\0" + raw)
+        files[name] = json.loads(raw)
+    errors = validate(files)
+    if errors:
+        raise ContentError(errors)
+    return files, digest.hexdigest()[:12]
+
+SLUG_MAX_LENGTH = 24
+SLUG_STOP_WORDS = {"a", "an", "and", "of", "the", "for"}
+
+def slugify(text: str, max_length: int = SLUG_MAX_LENGTH) -> str:
+    """Turns a title into a short payload-safe slug, cut at a word boundary."""
+    words = [w for w in re.split(r"[^a-z0-9]+", text.lower().replace("'", "")) if w]
+    words = [w for w in words if w not in SLUG_STOP_WORDS] or words
+    slug = words[0][:max_length] if words else "item"
+    for word in words[1:]:
+        if len(slug) + 1 + len(word) > max_length:
+            break
+        slug = f"{slug}_{word}"
+    return slug
+
+def _index_by_slug(records, title_key):
+    """Maps slug -> record (in file order), honouring an explicit "slug" field."""
+    by_slug = {}
+    for record in records:
+        slug = record.get("slug") or slugify(record[title_key])
+        base, n = slug, 2
+        while slug in by_slug:
+            slug = f"{base}_{n}"
+            n += 1
+        by_slug[slug] = record
+    return by_slug
+
+class ContentIndex:
+    """
+    Lookup maps built once per snapshot so flows never scan lists per click.
+    The *_by_title maps keep payloads rendered before slugs were introduced working.
+    """
+    __slots__ = (
+        "schools", "courses", "course_school",
+        "scholarships", "scholarships_by_title",
+        "events", "events_by_name",
+    )
+
+    def __init__(self, files):
+        self.schools = MappingProxyType({s["id"]: s for s in files.get("schools.json", ())})
+
+        courses, course_school = {}, {}
+        for school_id, school_courses in files.get("courses.json", EMPTY).items():
+            for course in school_courses:
+                if course["id"] in courses:
+                    logger.warning("Duplicate course id '%s' in school '%s'", course['id'], school_id)
+                    continue
+                courses[course["id"]] = course
+                course_school[course["id"]] = school_id
+        self.courses = MappingProxyType(courses)
+        self.course_school = MappingProxyType(course_school)
+
+        scholarships = files.get("scholarships.json", ())
+        self.scholarships = MappingProxyType(_index_by_slug(scholarships, "title"))
+        self.scholarships_by_title = MappingProxyType({s["title"]: s for s in scholarships})
+
+        events = files.get("cocurricular.json", ())
+        self.events = MappingProxyType(_index_by_slug(events, "name"))
+        self.events_by_name = MappingProxyType({e["name"]: e for e in events})
+
+class ContentSnapshot:
+    """
+    One fully loaded, immutable version of every file in the data directory.
+    A snapshot is never modified after construction, so a request that holds
+    one always sees a consistent set of content even if a reload happens.
+
+    `prebuilt` holds index state from a compiled snapshot file: "catalog" is
+    used here, "search" by the search service.
+    """
+    __slots__ = ("version", "files", "index", "catalog", "prebuilt", "loaded_at")
+
+    def __init__(self, files, version, prebuilt=None):
+        self.files = MappingProxyType(files)
+        self.index = ContentIndex(files)
+        self.prebuilt = MappingProxyType(prebuilt or {})
+        if "catalog" in self.prebuilt:
+            self.catalog = CourseCatalog.from_state(self.prebuilt["catalog"])
+        else:
+            self.catalog = CourseCatalog(self.index)
+        self.version = version
+        self.loaded_at = time.time()
+
+    def get(self, filename):
+        return self.files.get(filename, EMPTY)
+
+class ContentRepository:
+    """
+    Serves data/*.json from memory and hot-swaps a new snapshot when a file changes.
+
+    Files are stat'ed at most once every `check_interval` seconds. A changed
+    mtime/size triggers a re-read; the snapshot version is a hash of the file
+    contents, so touching a file without editing it does not bump the version.
+    Content that fails validation (app/content_schema.py) is not loaded.
+    The new snapshot is built completely before it replaces the old one.
+
+    With a `snapshot_path` the repository loads and watches that compiled file
+    instead, falling back to the directory if it cannot be loaded at startup.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, check_interval=RELOAD_CHECK_INTERVAL, snapshot_path=None):
+        self.data_dir = Path(data_dir)
+        self.check_interval = check_interval
+        self.snapshot_path = None
+        if snapshot_path is not None:
+            try:
+                content_snapshot.read_header(snapshot_path)
+                self.snapshot_path = Path(snapshot_path)
+            except (OSError, ValueError) as e:
+                logger.warning("Not using content snapshot %s, loading %s instead: %s", snapshot_path, self.data_dir, e)
+        self.stats = {"hits": 0, "checks": 0, "reloads": 0, "reload_errors": 0}
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._next_check = 0.0
+        self._snapshot = None
+        self.reload(force=True)
+        if self.snapshot_path and not self.stats["reloads"]:
+            # The header was fine but the body is not; serve the JSON rather than nothing
+            logger.warning("Content snapshot %s could not be loaded, loading %s instead", self.snapshot_path, self.data_dir)
+            self.snapshot_path = None
+            self._snapshot = None
+            self.reload(force=True)
+
+    def snapshot(self) -> ContentSnapshot:
+        """Returns the current snapshot, reloading first if a check is due."""
+        if time.monotonic() >= self._next_check:
+            with tracing.span("data_loader.reload"):
+                self.reload()
+        self.stats["hits"] += 1
+        return self._snapshot
+
+    def _scan(self):
+        fingerprint = {}
+        paths = [self.snapshot_path] if self.snapshot_path else sorted(self.data_dir.glob("*.json"))
+        for path in paths:
+            stat = path.stat()
+            fingerprint[path.name] = (stat.st_mtime_ns, stat.st_size)
+        return fingerprint
+
+    def reload(self, force=False):
+        """Re-reads the data directory if it changed. Returns True if the version changed."""
+        with self._lock:
+            self._next_check = time.monotonic() + self.check_interval
+            self.stats["checks"] += 1
+            try:
+                fingerprint = self._scan()
+            except OSError as e:
+                # The snapshot file or a JSON file vanished between listing and stat; check again later
+                self.stats["reload_errors"] += 1
+                logger.error("Content check failed, keeping version %s: %s",
+                             self._snapshot.version if self._snapshot else None, e)
+                if self._snapshot is None:
+                    self._snapshot = ContentSnapshot({}, "empty")
+                return False
+            if not force and fingerprint == self._fingerprint:
+                return False
+
+            try:
+                if self.snapshot_path:
+                    files, version, prebuilt = content_snapshot.load(self.snapshot_path)
+                else:
+                    files, version = read_content(self.data_dir, fingerprint)
+                    prebuilt = None
+            except (OSError, ValueError) as e:
+                # A file is probably mid-write or fails validation; keep serving the previous snapshot.
+                self.stats["reload_errors"] += 1
+                logger.error("Content reload failed, keeping version %s: %s",
+                             self._snapshot.version if self._snapshot else None, e)
+                if self._snapshot is None:
+                    self._snapshot = ContentSnapshot({}, "empty")
+                return False
+
+            if self._snapshot is not None and version == self._snapshot.version:
+                self._fingerprint = fingerprint
+                return False
+
+            try:
+                snapshot = ContentSnapshot({name: freeze(value) for name, value in files.items()}, version, prebuilt)
+            except (KeyError, TypeError, AttributeError) as e:
+                self.stats["reload_errors"] += 1
+                logger.error("Content in version %s is malformed, not loading it: %r", version, e)
+                if self._snapshot is None:
+                    self._snapshot = ContentSnapshot({}, "empty")
+                return False
+
+            self._fingerprint = fingerprint
+            self._snapshot = snapshot
+            self.stats["reloads"] += 1
+            return True
+
+repository = ContentRepository(snapshot_path=SNAPSHOT_PATH)
+
+def get_content() -> ContentSnapshot:
+    """Returns the current content snapshot. Use one snapshot per request."""
+    return repository.snapshot()
+
+def get_index() -> ContentIndex:
+    return repository.snapshot().index
+
+def get_catalog() -> CourseCatalog:
+    return repository.snapshot().catalog
+
+def get_content_version() -> str:
+    return repository.snapshot().version
+
+def get_content_stats():
+    return dict(repository.stats, version=repository._snapshot.version)
+
+register_stats("askgeeta_content", get_content_stats, "Content repository")
+
 def get_schools():
-    return load_json("schools.json")
+    return get_content().get("schools.json")
 
 def get_courses():
-    return load_json("courses.json")
+    return get_content().get("courses.json")
 
 def get_scholarships():
-    return load_json("scholarships.json")
+    return get_content().get("scholarships.json")
 
 def get_campus():
-    return load_json("campus.json")
+    return get_content().get("campus.json")
 
 def get_placements():
-    return load_json("placements.json")
+    return get_content().get("placements.json")
 
 def get_cocurricular():
-    return load_json("cocurricular.json")
+    return get_content().get("cocurricular.json")
@@ -1,11 +1,25 @@
-from sqlmodel import Field, SQLModel, create_engine, Session, select
+from sqlmodel import Field, SQLModel, create_engine, select
+from sqlalchemy import delete, event, func, insert, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from typing import Optional
+import argparse
+import atexit
+import csv
 import os
+import queue
+import threading
+import time
+
+from .log import get_logger
+from .metrics import db_write_duration, register_stats
+
+logger = get_logger(__name__)
 
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
-    mobile_number: str
+    mobile_number: str = Field(index=True, unique=True)
 
 sqlite_file_name = "users.db"
 sqlite_url = f"sqlite:///{sqlite_file_name}"
@@ -18,15 +32,245 @@ database_url = os.getenv("DATABASE_URL", sqlite_url)
 if database_url.startswith("postgres://"):
     database_url = database_url.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(database_url, echo=True)
+# Logging every statement is synchronous I/O; only enable it when debugging SQL
+SQL_ECHO = os.getenv("SQL_ECHO", "0") == "1"
+
+USER_WRITE_BATCH_SIZE = int(os.getenv("USER_WRITE_BATCH_SIZE", "200"))
+USER_WRITE_INTERVAL = float(os.getenv("USER_WRITE_INTERVAL", "0.5"))
+USER_WRITE_QUEUE_SIZE = int(os.getenv("USER_WRITE_QUEUE_SIZE", "100000"))
+USER_WRITE_RETRIES = 5
+
+if database_url.startswith("sqlite"):
+    # The writer thread owns its connection; allow it to be created off the main thread
+    engine = create_engine(database_url, echo=SQL_ECHO, connect_args={"check_same_thread": False, "timeout": 15})
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+else:
+    engine = create_engine(
+        database_url,
+        echo=SQL_ECHO,
+        pool_size=int(os.getenv("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "5")),
+        pool_pre_ping=True,  # serverless Postgres drops idle connections
+        pool_recycle=1800,
+    )
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
 
+MOBILE_INDEX = "ix_user_mobile_number"
+# Any constant every worker agrees on: serialises migrate() on PostgreSQL
+MIGRATION_LOCK_ID = 7305186
+
+# Whether the unique index on mobile_number exists; upserts need it. Learned on first write.
+_mobile_unique = None
+
+def has_unique_mobile_index(conn=None) -> bool:
+    table = User.__table__
+    return any(ix["column_names"] == ["mobile_number"] and ix["unique"]
+               for ix in inspect(conn if conn is not None else engine).get_indexes(table.name))
+
+def migrate(dedupe: bool = False, export_path: str = None) -> bool:
+    """
+    Adds the unique index on mobile_number to tables created before it
+    existed, when they had one row per verification. Safe to run from every
+    worker at once: it takes a write lock (BEGIN IMMEDIATE on SQLite, an
+    advisory lock on PostgreSQL) and the index is created IF NOT EXISTS.
+
+    Duplicate rows are never removed silently. Without `dedupe` they are
+    logged and the index is left out (verified users are then inserted, not
+    upserted). With it, every row but the latest per number is written to
+    `export_path` as CSV and deleted. Returns True if the index exists.
+    """
+    global _mobile_unique
+    table = User.__table__
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        elif engine.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        if has_unique_mobile_index(conn):
+            conn.rollback()
+            _mobile_unique = True
+            return True
+
+        latest = select(func.max(table.c.id)).group_by(table.c.mobile_number).scalar_subquery()
+        stale = conn.execute(select(table).where(table.c.id.not_in(latest)).order_by(table.c.id)).all()
+        if stale and not dedupe:
+            conn.rollback()
+            _mobile_unique = False
+            logger.warning("%d user rows repeat a mobile number (e.g. %s); not adding the unique index. "
+                           "Run `python -m app.database migrate --dedupe` to export and remove them.",
+                           len(stale), ", ".join(sorted({row.mobile_number for row in stale})[:5]))
+            return False
+        if stale:
+            export_path = export_path or f"user_duplicates_{time.strftime('%Y%m%d%H%M%S')}.csv"
+            with open(export_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["id", "name", "mobile_number"])
+                writer.writerows((row.id, row.name, row.mobile_number) for row in stale)
+            conn.execute(delete(table).where(table.c.id.not_in(latest)))
+            logger.warning("Exported %d duplicate user rows to %s and removed them", len(stale), export_path)
+
+        # The old plain index has the same name; replace it
+        quote = engine.dialect.identifier_preparer.quote
+        for ix in inspect(conn).get_indexes(table.name):
+            if ix["column_names"] == ["mobile_number"]:
+                conn.exec_driver_sql(f"DROP INDEX IF EXISTS {quote(ix['name'])}")
+        conn.exec_driver_sql(f"CREATE UNIQUE INDEX IF NOT EXISTS {MOBILE_INDEX} ON {quote(table.name)} (mobile_number)")
+        conn.commit()
+    _mobile_unique = True
+    logger.info("Unique index on mobile_number is in place")
+    return True
+
+def _upsert(rows):
+    """INSERT ... ON CONFLICT (mobile_number) DO UPDATE name, on the dialects that support it."""
+    global _mobile_unique
+    table = User.__table__
+    if _mobile_unique is None:
+        _mobile_unique = has_unique_mobile_index()
+    dialect = {"sqlite": sqlite, "postgresql": postgresql}.get(engine.dialect.name)
+    if dialect is None or not _mobile_unique:
+        # ON CONFLICT needs the unique index; until `migrate` adds it, keep one row per verification
+        return insert(table), rows
+    stmt = dialect.insert(table)
+    stmt = stmt.on_conflict_do_update(index_elements=[table.c.mobile_number], set_={"name": stmt.excluded.name})
+    # A multi-row upsert may not touch the same row twice; the last verification wins
+    return stmt, list({row["mobile_number"]: row for row in rows}.values())
+
+class UserWriteQueue:
+    """
+    Write-behind queue for User rows.
+
+    put() never touches the database: rows are handed to a background thread
+    that bulk-upserts them (one row per mobile number) in batches of up to `batch_size`, at most
+    `interval` seconds after the first row of a batch arrived. Failed batches
+    are retried with exponential backoff, except for rows the database rejects
+    (integrity errors), which are skipped one by one; stop() drains the queue.
+    """
+
+    _STOP = object()
+
+    def __init__(self, batch_size=USER_WRITE_BATCH_SIZE, interval=USER_WRITE_INTERVAL,
+                 maxsize=USER_WRITE_QUEUE_SIZE, retries=USER_WRITE_RETRIES):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.retries = retries
+        self.stats = {"queued": 0, "written": 0, "batches": 0, "retries": 0, "dropped": 0, "failed": 0}
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._exit_hook = False
+
+    def start(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="user-writer", daemon=True)
+            self._thread.start()
+            if not self._exit_hook:
+                atexit.register(self.stop)
+                self._exit_hook = True
+
+    def put(self, name: str, mobile_number: str):
+        self.start()
+        try:
+            self._queue.put_nowait({"name": name, "mobile_number": mobile_number})
+            self.stats["queued"] += 1
+        except queue.Full:
+            self.stats["dropped"] += 1
+            logger.error("User write queue full, dropping user row for %s", mobile_number)
+
+    def _run(self):
+        # Normally done at startup already; covers writers started without the app's lifespan
+        try:
+            create_db_and_tables()
+        except SQLAlchemyError as e:
+            logger.error("Could not create the users table, writes will be retried: %s", e)
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, rows):
+        for attempt in range(self.retries + 1):
+            try:
+                stmt, params = _upsert(rows)
+                start = time.perf_counter()
+                with engine.begin() as conn:
+                    conn.execute(stmt, params)
+                db_write_duration.observe(time.perf_counter() - start, ("user",))
+                self.stats["written"] += len(rows)
+                self.stats["batches"] += 1
+                return
+            except IntegrityError as e:
+                # Not transient (plain inserts hitting the unique index): retrying fails the
+                # same way, so split the batch until only the offending rows are skipped
+                if len(rows) == 1:
+                    self.stats["failed"] += 1
+                    logger.error("Skipping user row for %s: %s", rows[0]["mobile_number"], e.orig)
+                    return
+                middle = len(rows) // 2
+                self._write(rows[:middle])
+                self._write(rows[middle:])
+                return
+            except SQLAlchemyError as e:
+                if attempt == self.retries:
+                    self.stats["failed"] += len(rows)
+                    logger.error("Giving up on %d user rows after %d attempts: %s", len(rows), attempt + 1, e)
+                    return
+                self.stats["retries"] += 1
+                time.sleep(min(0.1 * 2 ** attempt, 5.0))
+
+    def stop(self, timeout: float = 10.0):
+        """Flushes everything queued so far and stops the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread and thread.is_alive():
+            self._queue.put(self._STOP)
+            thread.join(timeout)
+
+    def get_stats(self):
+        return dict(self.stats, pending=self._queue.qsize())
+
+user_writes = UserWriteQueue()
+register_stats("askgeeta_user_writes", user_writes.get_stats, "Background user writer")
+
 def save_user(name: str, mobile_number: str):
-    with Session(engine) as session:
-        user = User(name=name, mobile_number=mobile_number)
-        session.add(user)
-        session.commit()
-        session.refresh(user)
-        return user
+    """Queues a verified user for a batched upsert; returns immediately."""
+    user_writes.put(name, mobile_number)
+
+def main():
+    parser = argparse.ArgumentParser(description="Database maintenance for verified users.")
+    parser.add_argument("command", choices=("migrate",))
+    parser.add_argument("--dedupe", action="store_true",
+                        help="export and remove all but the latest row per mobile number")
+    parser.add_argument("--export", help="CSV file for the removed rows (default: user_duplicates_<time>.csv)")
+    args = parser.parse_args()
+    create_db_and_tables()
+    if not migrate(dedupe=args.dedupe, export_path=args.export):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
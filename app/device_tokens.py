@@ -0,0 +1,34 @@
+"""
+"Verified device" tokens for returning users.
+
+After a successful OTP check the browser gets a signed, HttpOnly cookie
+holding the verified name and mobile number. When /api/start sees a valid
+one, the visitor goes straight to the main menu: no SMS, no verification
+check and no user write. Tokens are revoked by rotating DEVICE_SIGNING_KEYS.
+"""
+import os
+from typing import Optional
+
+from .signing import Signer, load_keys
+
+DEVICE_COOKIE = "askgeeta_device"
+DEVICE_TOKEN_TTL = float(os.getenv("DEVICE_TOKEN_TTL", str(30 * 24 * 3600)))
+DEVICE_COOKIE_SECURE = os.getenv("DEVICE_COOKIE_SECURE", "0") == "1"
+
+signer = Signer(load_keys("DEVICE_SIGNING_KEYS"))
+
+def issue(name: str, mobile: str) -> str:
+    return signer.sign({"n": name, "m": mobile}, DEVICE_TOKEN_TTL)
+
+def verify(token: Optional[str]):
+    """Returns {"name", "mobile"} for a valid token, else None."""
+    payload = signer.verify(token) if token else None
+    if payload is None or "m" not in payload:  # e.g. a session token signed with the same keys
+        return None
+    return {"name": payload["n"], "mobile": payload["m"]}
+
+def set_cookie(response, name: str, mobile: str):
+    response.set_cookie(
+        DEVICE_COOKIE, issue(name, mobile), max_age=int(DEVICE_TOKEN_TTL),
+        httponly=True, samesite="lax", secure=DEVICE_COOKIE_SECURE,
+    )
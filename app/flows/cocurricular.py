@@ -1,12 +1,12 @@
-from ..data_loader import get_cocurricular
+from ..data_loader import get_index
 
 def get_activities_info(name, session_id=""):
     # List events
-    events = get_cocurricular()
+    events = get_index().events
     
     buttons = []
-    for event in events:
-        buttons.append({"text": event["name"], "value": f"event_{event['name']}"})
+    for slug, event in events.items():
+        buttons.append({"text": event["name"], "value": f"event_{slug}"})
         
     buttons.append({"text": "Back to Main Menu", "value": "main_menu"})
     
@@ -20,10 +20,11 @@ def get_activities_info(name, session_id=""):
 def handle_flow(session, user_choice):
     session_id = session.get("id", "")
     if user_choice.startswith("event_"):
-        event_name = user_choice.replace("event_", "")
-        events = get_cocurricular()
+        slug = user_choice.replace("event_", "")
+        index = get_index()
         
-        selected = next((e for e in events if e["name"] == event_name), None)
+        # Older clients may still send the full event name as the payload
+        selected = index.events.get(slug) or index.events_by_name.get(slug)
         
         if selected:
             return {
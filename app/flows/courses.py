@@ -1,4 +1,4 @@
-from ..data_loader import get_courses
+from ..data_loader import get_courses, get_index
 from ..session import update_session_state
 
 def get_courses_menu(user_name, school_id, session_id=""):
@@ -26,20 +26,14 @@ def get_courses_menu(user_name, school_id, session_id=""):
 def handle_flow(session, user_choice):
     session_id = session.get("id", "")
     # User selected a course (e.g. "course_btech_cse")
-    # This function is called by manager when state starts with "course_" 
-    # BUT wait, manager logic: if state.startswith("schools_") or state.startswith("course_") -> schools.handle_flow
-    # I need to adjust manager.py to route "course_" states to THIS module.
-    # OR schools.py needs to delegate again.
-    # Let's fix manager.py later. For now, assume this is called.
+    # Routed here by manager for any "course_" payload, whatever the current state
     
     course_id = user_choice.replace("course_", "")
     
     # Retrieve course details
-    school_id = session["context"].get("selected_school")
-    all_courses = get_courses()
-    courses_list = all_courses.get(school_id, [])
-    
-    course = next((c for c in courses_list if c["id"] == course_id), None)
+    index = get_index()
+    course = index.courses.get(course_id)
+    school_id = index.course_school.get(course_id, session["context"].get("selected_school"))
     
     if not course:
         return {
@@ -53,7 +47,7 @@ def handle_flow(session, user_choice):
     if course.get("has_details"):
         details = course["details"]
         # Show Course Menu
-        update_session_state(session_id, f"course_detail_{course_id}", {"selected_course": course_id})
+        update_session_state(session_id, f"course_detail_{course_id}", {"selected_course": course_id, "selected_school": school_id})
         
         return {
             "session_id": session_id,
@@ -83,11 +77,9 @@ def handle_flow(session, user_choice):
 def handle_detail_view(session, user_choice):
     session_id = session.get("id", "")
     course_id = session["context"].get("selected_course")
-    school_id = session["context"].get("selected_school")
-    
-    all_courses = get_courses()
-    courses_list = all_courses.get(school_id, [])
-    course = next((c for c in courses_list if c["id"] == course_id), None)
+    index = get_index()
+    course = index.courses.get(course_id)
+    school_id = index.course_school.get(course_id, session["context"].get("selected_school"))
     
     if not course or "details" not in course:
          return {
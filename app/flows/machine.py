@@ -0,0 +1,138 @@
+"""
+Declarative flow routing.
+
+Flows are declared as a list of Route objects and compiled once at import
+time into a TransitionTable: an exact-match dict for button payloads plus
+prefix tries for payload prefixes and session states. Resolving a message
+is then a single lookup regardless of how many flows exist, and wiring
+mistakes (unreachable or unhandled states) fail at startup instead of in
+the middle of a conversation.
+"""
+
+class Route:
+    """
+    One transition rule. Exactly one of `choice`, `choice_prefix` or `state_prefix` selects it:
+
+    - choice:        the message equals this payload (checked first, in any state)
+    - choice_prefix: the message starts with this payload prefix (in any state)
+    - state_prefix:  the session state starts with this prefix (any message)
+
+    `next_state` is applied before the handler runs; `enters` lists the states
+    (or state prefixes) the handler itself may move the session into.
+    `accepts` lists the payload prefixes a state route handles; any other
+    message in its states (a typed question) goes to the fallback instead.
+    """
+    __slots__ = ("name", "handler", "choice", "choice_prefix", "state_prefix", "accepts",
+                 "next_state", "enters", "exit_button", "cacheable", "requires_session")
+
+    def __init__(self, name, handler, choice=None, choice_prefix=None, state_prefix=None, accepts=None,
+                 next_state=None, enters=(), exit_button=True, cacheable=True, requires_session=True):
+        self.name = name
+        self.handler = handler
+        self.choice = choice
+        self.choice_prefix = choice_prefix
+        self.state_prefix = state_prefix
+        self.accepts = tuple(accepts) if accepts is not None else None
+        self.next_state = next_state
+        self.enters = tuple(enters)
+        self.exit_button = exit_button
+        self.cacheable = cacheable
+        self.requires_session = requires_session
+
+    def __repr__(self):
+        return f"Route({self.name!r})"
+
+class PrefixTrie:
+    """Character trie returning the value of the longest inserted prefix of a string."""
+    __slots__ = ("_root",)
+
+    _VALUE = object()
+
+    def __init__(self):
+        self._root = {}
+
+    def insert(self, prefix, value):
+        node = self._root
+        for ch in prefix:
+            node = node.setdefault(ch, {})
+        if self._VALUE in node:
+            raise ValueError(f"Duplicate prefix {prefix!r}")
+        node[self._VALUE] = value
+
+    def longest_match(self, text):
+        node = self._root
+        found = node.get(self._VALUE)
+        for ch in text:
+            node = node.get(ch)
+            if node is None:
+                break
+            if self._VALUE in node:
+                found = node[self._VALUE]
+        return found
+
+class TransitionTable:
+    __slots__ = ("routes", "exact", "choice_prefixes", "state_prefixes", "fallback")
+
+    def __init__(self, routes, fallback):
+        self.routes = tuple(routes)
+        self.exact = {}
+        self.choice_prefixes = PrefixTrie()
+        self.state_prefixes = PrefixTrie()
+        self.fallback = fallback
+
+        for route in self.routes:
+            selectors = [s for s in (route.choice, route.choice_prefix, route.state_prefix) if s is not None]
+            if len(selectors) != 1:
+                raise ValueError(f"{route!r} must set exactly one of choice, choice_prefix, state_prefix")
+            if route.choice is not None:
+                if route.choice in self.exact:
+                    raise ValueError(f"Duplicate choice {route.choice!r} in {route!r}")
+                self.exact[route.choice] = route
+            elif route.choice_prefix is not None:
+                self.choice_prefixes.insert(route.choice_prefix, route)
+            else:
+                self.state_prefixes.insert(route.state_prefix, route)
+
+    def resolve(self, state, choice):
+        """Returns the Route for a message; payload routes win over state routes."""
+        route = self.exact.get(choice)
+        if route is None and choice:
+            route = self.choice_prefixes.longest_match(choice)
+        if route is None and state:
+            route = self.state_prefixes.longest_match(state)
+            if route is not None and route.accepts is not None and not (choice or "").startswith(route.accepts):
+                route = None
+        return route or self.fallback
+
+def _covers(prefix, pattern):
+    """True if some state matching `pattern` (a state or state prefix) can start with `prefix`."""
+    return pattern.startswith(prefix) or prefix.startswith(pattern)
+
+def compile_routes(routes, fallback, initial_states=(), global_states=()):
+    """
+    Builds a TransitionTable and checks it:
+
+    - every state route must be reachable from some entered or initial state
+    - every entered state must be handled by a state route, or be listed in
+      `global_states` (states where only payload routes apply, e.g. main_menu)
+    """
+    table = TransitionTable(routes, fallback)
+
+    entered = set(initial_states)
+    for route in table.routes:
+        if route.next_state:
+            entered.add(route.next_state)
+        entered.update(route.enters)
+
+    state_routes = [r for r in table.routes if r.state_prefix is not None]
+    for route in state_routes:
+        if not any(_covers(route.state_prefix, state) for state in entered):
+            raise ValueError(f"{route!r} handles state prefix {route.state_prefix!r} which no route enters")
+
+    for state in entered:
+        if state in global_states:
+            continue
+        if not any(_covers(r.state_prefix, state) for r in state_routes):
+            raise ValueError(f"State {state!r} is entered but no route handles it")
+
+    return table
@@ -1,172 +1,224 @@
+import time
+
 from . import schools, courses, scholarships, campus, cocurricular, placements
-from ..session import update_session_state
+from .machine import Route, compile_routes
+from ..session import record_updates, update_session_state
+from ..data_loader import get_content_version
+from ..response_cache import response_cache, RenderedResponse, CachedResponse
+from ..search import search
+from ..log import get_logger, sampled_debug
+from ..metrics import flow_duration
+from .. import tracing
+
+logger = get_logger(__name__)
 
 def handle_request(session, user_choice):
     """
     Dispatches the user choice to the appropriate flow handler based on current state or global menu options.
     """
-    print(f"DEBUG: Handling request for user_choice: {user_choice}, session_id: {session['id']}")
+    sampled_debug(logger, "Handling request for user_choice: %s, session_id: %s", user_choice, session["id"])
+    start = time.perf_counter()
+    route = ROUTING.resolve(session["state"], user_choice)
+    try:
+        return _dispatch(session, user_choice, route)
+    except Exception as e:
+        return _error_response(session, e)
+    finally:
+        flow_duration.observe(time.perf_counter() - start, (route.name, "bypass"))
+
+def handle_request_cached(session, user_choice):
+    """
+    Same as handle_request, but responses that are pure functions of
+    (state, choice, content version) are served pre-rendered from the response cache.
+    Returns a RenderedResponse when the cache was used, otherwise the response dict.
+    """
+    with tracing.span("manager.handle_request", state=session.get("state"), choice=user_choice):
+        return _handle_request_cached(session, user_choice)
+
+def _handle_request_cached(session, user_choice):
+    sampled_debug(logger, "Handling request for user_choice: %s, session_id: %s", user_choice, session.get("id"))
+    start = time.perf_counter()
+    session_id = session.get("id")
     state = session["state"]
-    name = session["name"]
-    
+    route = ROUTING.resolve(state, user_choice)
+    cacheable = (
+        bool(session_id)
+        and route.cacheable
+        and (user_choice in ROUTING.exact or response_cache.is_known_payload(user_choice))
+    )
+
+    if cacheable:
+        entry = response_cache.get(state, user_choice)
+        if entry is not None:
+            if entry.new_state is not None or entry.context_update:
+                update_session_state(session_id, entry.new_state or state, entry.context_update)
+            flow_duration.observe(time.perf_counter() - start, (route.name, "hit"))
+            return entry.rendered
+
+    version = get_content_version()
     try:
-        # Global Back/Exit handlers (if applicable, though usually handled per flow if state context matters)
-        if user_choice == "exit":
-            return {
-                "session_id": "", # Clear session on client
-                "messages": [f"Goodbye, {name}! It was a pleasure assisting you.", "Feel free to return anytime."],
-                "buttons": [{"text": "Start Over", "value": "restart"}],
-                "input_type": "button"
-            }
-        
-        if user_choice == "restart":
-             # This should strictly be handled by client re-hitting /api/start usually, but here for safety
-             return {
-                "session_id": "",
-                "messages": ["Restarting..."],
-                "buttons": [],
-                "input_type": "text" # Force restart
-             }
-    
-        session_id = session.get("id")
-        if not session_id:
-            print("ERROR: Session ID missing in manager handle_request")
-            return {
-                "session_id": "",
-                "messages": ["Session error. Please restart."],
-                "buttons": [{"text": "Restart", "value": "restart"}],
-                "input_type": "button"
-            }
-
-        # Main Menu Routing
-        if user_choice == "flow_schools":
-            update_session_state(session_id, "schools_menu")
-            response = schools.get_main_menu(name, session_id)
-            add_exit_button(response)
-            return response
-        
-        if user_choice == "flow_scholarships":
-            update_session_state(session_id, "scholarships_view")
-            response = scholarships.get_scholarships_info(name, session_id)
-            add_exit_button(response)
-            return response
-    
-        if user_choice == "flow_campus":
-            update_session_state(session_id, "campus_menu")
-            response = campus.get_main_menu(name, session_id)
-            add_exit_button(response)
-            return response
-            
-        if user_choice == "flow_cocurricular":
-            update_session_state(session_id, "cocurricular_view")
-            response = cocurricular.get_activities_info(name, session_id)
-            add_exit_button(response)
-            return response
-            
-        if user_choice == "flow_placements":
-            update_session_state(session_id, "placements_view")
-            response = placements.get_placements_info(name, session_id)
-            add_exit_button(response)
-            return response
-            
-        if user_choice == "flow_contact":
-            response = {
-                "session_id": session_id,
-                "messages": [
-                     "Here is the official contact information for Geeta University:",
-                     "Phone: +91-99960-51000",
-                     "Email: info@geetauniversity.edu.in",
-                     "Address: NH-71, Naultha, Panipat, Haryana"
-                ],
-                "buttons": [{"text": "Back to Main Menu", "value": "main_menu"}],
-                "input_type": "button"
-            }
-            add_exit_button(response)
-            return response
-    
-        if user_choice == "main_menu":
-            update_session_state(session_id, "main_menu")
-            return {
-                "session_id": session_id,
-                "messages": ["Welcome back to the Main Menu. What would you like to explore?"],
-                "buttons": [
-                    {"text": "Explore Schools & Courses", "value": "flow_schools"},
-                    {"text": "Scholarships & Financial Aid", "value": "flow_scholarships"},
-                    {"text": "Campus & Facilities", "value": "flow_campus"},
-                    {"text": "Co-curricular & Student Activities", "value": "flow_cocurricular"},
-                    {"text": "Placements Overview", "value": "flow_placements"},
-                    {"text": "Contact University", "value": "flow_contact"},
-                    {"text": "Exit", "value": "exit"}
-                ],
-                "input_type": "button"
-            }
-    
-        # Handle back to school navigation
-        if user_choice.startswith("school_"):
-            school_id = user_choice.replace("school_", "")
-            update_session_state(session_id, "course_selection", {"selected_school": school_id})
-            response = courses.get_courses_menu("", school_id, session_id)
-            add_exit_button(response)
-            return response
-    
-        # Dispatch to specific module handlers based on current state
-        if state.startswith("schools_"):
-            response = schools.handle_flow(session, user_choice)
-            add_exit_button(response)
-            return response
-    
-        if state.startswith("course_selection"):
-            # User is selecting a course from the list
-            response = courses.handle_flow(session, user_choice)
-            add_exit_button(response)
-            return response
-            
-        if state.startswith("course_detail_"):
-            # User is viewing details of a course (Curriculum, etc.)
-            response = courses.handle_detail_view(session, user_choice)
-            add_exit_button(response)
-            return response
-        
-        if state.startswith("scholarships_"):
-            response = scholarships.handle_flow(session, user_choice)
-            add_exit_button(response)
-            return response
-            
-        if state.startswith("campus_"):
-            response = campus.handle_flow(session, user_choice)
-            add_exit_button(response)
-            return response
-             
-        if state.startswith("cocurricular_"):
-            response = cocurricular.handle_flow(session, user_choice)
-            add_exit_button(response)
-            return response
-             
-        if state.startswith("placements_"):
-            response = placements.handle_flow(session, user_choice)
-            add_exit_button(response)
-            return response
-    
-        # Fallback
-        response = {
-            "session_id": session_id,
-            "messages": ["I'm sorry, I didn't catch that.", "Please select an option from the menu."],
-            "buttons": [{"text": "Back to Main Menu", "value": "main_menu"}],
+        with record_updates() as updates:
+            response = _dispatch(session, user_choice, route)
+    except Exception as e:
+        flow_duration.observe(time.perf_counter() - start, (route.name, "error"))
+        return _error_response(session, e)
+    response_cache.learn_payloads(btn.get("value") for btn in response.get("buttons", []))
+
+    if not cacheable:
+        flow_duration.observe(time.perf_counter() - start, (route.name, "bypass"))
+        return response
+
+    # Record every write the handler made so cache hits can replay it. Not a diff of the
+    # session: a key the handler rewrote with the value it already had must be replayed too.
+    new_state = updates["state"] if updates["state"] not in (None, state) else None
+    rendered = RenderedResponse(response)
+    response_cache.put(state, user_choice, CachedResponse(rendered, new_state, updates["context"] or None), version)
+    flow_duration.observe(time.perf_counter() - start, (route.name, "miss"))
+    return rendered
+
+def _dispatch(session, user_choice, route):
+    session_id = session.get("id")
+    if route.requires_session and not session_id:
+        logger.error("Session ID missing in manager handle_request")
+        return {
+            "session_id": "",
+            "messages": ["Session error. Please restart."],
+            "buttons": [{"text": "Restart", "value": "restart"}],
             "input_type": "button"
         }
+
+    if route.next_state:
+        update_session_state(session_id, route.next_state)
+    with tracing.span("flow." + route.name):
+        response = route.handler(session, user_choice)
+    if route.exit_button:
         add_exit_button(response)
-        return response
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        session_id = session.get("id", "") if session else ""
-        response = {
-            "session_id": session_id,
-            "messages": [f"Error: {str(e)}", "Please check server logs."],
-            "buttons": [{"text": "Main Menu", "value": "main_menu"}, {"text": "Exit", "value": "exit"}],
+    return response
+
+# --- Route handlers that don't live in a flow module ---
+
+def _exit(session, user_choice):
+    return {
+        "session_id": "", # Clear session on client
+        "messages": [f"Goodbye, {session['name']}! It was a pleasure assisting you.", "Feel free to return anytime."],
+        "buttons": [{"text": "Start Over", "value": "restart"}],
+        "input_type": "button"
+    }
+
+def _restart(session, user_choice):
+    # This should strictly be handled by client re-hitting /api/start usually, but here for safety
+    return {
+        "session_id": "",
+        "messages": ["Restarting..."],
+        "buttons": [],
+        "input_type": "text" # Force restart
+    }
+
+def _contact(session, user_choice):
+    return {
+        "session_id": session["id"],
+        "messages": [
+             "Here is the official contact information for Geeta University:",
+             "Phone: +91-99960-51000",
+             "Email: info@geetauniversity.edu.in",
+             "Address: NH-71, Naultha, Panipat, Haryana"
+        ],
+        "buttons": [{"text": "Back to Main Menu", "value": "main_menu"}],
+        "input_type": "button"
+    }
+
+def get_main_menu(session_id, messages=("Welcome back to the Main Menu. What would you like to explore?",)):
+    return {
+        "session_id": session_id,
+        "messages": list(messages),
+        "buttons": [
+            {"text": "Explore Schools & Courses", "value": "flow_schools"},
+            {"text": "Scholarships & Financial Aid", "value": "flow_scholarships"},
+            {"text": "Campus & Facilities", "value": "flow_campus"},
+            {"text": "Co-curricular & Student Activities", "value": "flow_cocurricular"},
+            {"text": "Placements Overview", "value": "flow_placements"},
+            {"text": "Contact University", "value": "flow_contact"},
+            {"text": "Exit", "value": "exit"}
+        ],
+        "input_type": "button"
+    }
+
+def _main_menu(session, user_choice):
+    return get_main_menu(session["id"])
+
+def _select_school(session, user_choice):
+    # Handle back to school navigation from any state
+    school_id = user_choice.replace("school_", "")
+    update_session_state(session["id"], "course_selection", {"selected_school": school_id})
+    return courses.get_courses_menu("", school_id, session["id"])
+
+def _fallback(session, user_choice):
+    # Typed questions ("btech fees", "hostel") get the screens that match them
+    results = search(user_choice) if user_choice else []
+    if results:
+        buttons = [{"text": r["text"], "value": r["value"]} for r in results]
+        buttons.append({"text": "Back to Main Menu", "value": "main_menu"})
+        return {
+            "session_id": session["id"],
+            "messages": ["Here is what I found that matches your question:"],
+            "buttons": buttons,
             "input_type": "button"
         }
-        return response
+    return {
+        "session_id": session["id"],
+        "messages": ["I'm sorry, I didn't catch that.", "Please select an option from the menu."],
+        "buttons": [{"text": "Back to Main Menu", "value": "main_menu"}],
+        "input_type": "button"
+    }
+
+# --- Flow declarations ---
+# Payload routes (choice / choice_prefix) apply in every state and win over state routes.
+# State routes only take the payloads they accept; typed questions are searched in any state.
+ROUTES = [
+    Route("exit", _exit, choice="exit", exit_button=False, cacheable=False, requires_session=False),
+    Route("restart", _restart, choice="restart", exit_button=False, cacheable=False, requires_session=False),
+    Route("main_menu", _main_menu, choice="main_menu", next_state="main_menu", exit_button=False),
+    Route("schools", lambda s, c: schools.get_main_menu(s["name"], s["id"]),
+          choice="flow_schools", next_state="schools_menu"),
+    Route("scholarships", lambda s, c: scholarships.get_scholarships_info(s["name"], s["id"]),
+          choice="flow_scholarships", next_state="scholarships_view"),
+    Route("campus", lambda s, c: campus.get_main_menu(s["name"], s["id"]),
+          choice="flow_campus", next_state="campus_menu"),
+    Route("cocurricular", lambda s, c: cocurricular.get_activities_info(s["name"], s["id"]),
+          choice="flow_cocurricular", next_state="cocurricular_view"),
+    Route("placements", lambda s, c: placements.get_placements_info(s["name"], s["id"]),
+          choice="flow_placements", next_state="placements_view"),
+    Route("contact", _contact, choice="flow_contact"),
+    Route("school_select", _select_school, choice_prefix="school_", enters=("course_selection",)),
+    # Course payloads are resolved through the content index, so they work from any state
+    Route("course_select", courses.handle_flow, choice_prefix="course_", enters=("course_detail_",)),
+
+    Route("schools_flow", schools.handle_flow, state_prefix="schools_", accepts=("school_",), enters=("course_selection",)),
+    Route("course_selection_flow", courses.handle_flow, state_prefix="course_selection", accepts=("course_",), enters=("course_detail_",)),
+    Route("course_detail_flow", courses.handle_detail_view, state_prefix="course_detail_", accepts=("detail_",)),
+    Route("scholarships_flow", scholarships.handle_flow, state_prefix="scholarships_", accepts=("scholarship_",)),
+    Route("campus_flow", campus.handle_flow, state_prefix="campus_", accepts=("campus_",)),
+    Route("cocurricular_flow", cocurricular.handle_flow, state_prefix="cocurricular_", accepts=("event_",)),
+    Route("placements_flow", placements.handle_flow, state_prefix="placements_", accepts=("placements_",)),
+]
+
+ROUTING = compile_routes(
+    ROUTES,
+    fallback=Route("fallback", _fallback, state_prefix="", cacheable=False),
+    initial_states=("main_menu",),
+    global_states=("main_menu",),
+)
+
+def _error_response(session, e):
+    logger.exception("Flow handler failed for state %s", session.get("state") if session else None)
+    session_id = session.get("id", "") if session else ""
+    response = {
+        "session_id": session_id,
+        "messages": [f"Error: {str(e)}", "Please check server logs."],
+        "buttons": [{"text": "Main Menu", "value": "main_menu"}, {"text": "Exit", "value": "exit"}],
+        "input_type": "button"
+    }
+    return response
 
 def add_exit_button(response):
     """Adds Exit button to the response if not already present (except on main menu)."""
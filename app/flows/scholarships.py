@@ -1,8 +1,8 @@
-from ..data_loader import get_scholarships
+from ..data_loader import get_index
 
 def get_scholarships_info(name, session_id=""):
     # Retrieve the list of scholarships
-    scholarships = get_scholarships()
+    scholarships = get_index().scholarships
     
     # We can display them as a carousel in messages or just a list.
     # Given button-based UI, we can list them as buttons to "Read More" about each,
@@ -12,8 +12,8 @@ def get_scholarships_info(name, session_id=""):
     messages = [f"Geeta University offers {len(scholarships)} types of scholarships."]
     buttons = []
     
-    for s in scholarships:
-        buttons.append({"text": s["title"], "value": f"scholarship_{s['title']}"})
+    for slug, s in scholarships.items():
+        buttons.append({"text": s["title"], "value": f"scholarship_{slug}"})
         
     buttons.append({"text": "Back to Main Menu", "value": "main_menu"})
     
@@ -27,10 +27,11 @@ def get_scholarships_info(name, session_id=""):
 def handle_flow(session, user_choice):
     session_id = session.get("id", "")
     if user_choice.startswith("scholarship_"):
-        title = user_choice.replace("scholarship_", "")
-        all_scholarships = get_scholarships()
+        slug = user_choice.replace("scholarship_", "")
+        index = get_index()
         
-        selected = next((s for s in all_scholarships if s["title"] == title), None)
+        # Older clients may still send the full title as the payload
+        selected = index.scholarships.get(slug) or index.scholarships_by_title.get(slug)
         
         if selected:
             return {
@@ -0,0 +1,90 @@
+"""
+Leveled, non-blocking logging.
+
+Records go through a QueueHandler to a listener thread that does the actual
+write, so a log call on the request path never waits on stderr. LOG_LEVEL
+sets the level of every `app.*` logger. Per-request debug lines use
+sampled_debug(), which logs only LOG_DEBUG_SAMPLE of the calls (after a
+cheap level check, so they cost nothing when DEBUG is off).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_DEBUG_SAMPLE = float(os.getenv("LOG_DEBUG_SAMPLE", "0.01"))
+
+_listener = None
+
+def _configure():
+    global _listener
+    root = logging.getLogger("app")
+    records = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(LOG_LEVEL)
+    root.propagate = False
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+def get_logger(name: str) -> logging.Logger:
+    if _listener is None:
+        _configure()
+    return logging.getLogger(name)
+
+def sampled_debug(logger: logging.Logger, msg: str, *args, rate: float = LOG_DEBUG_SAMPLE):
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < rate:
+        logger.debug(msg, *args)
+
+class JsonlAppender:
+    """Appends JSON records to a file, one per line, from a background thread."""
+
+    def __init__(self, path, name="jsonl-writer", max_batch=500):
+        self.path = path
+        self.name = name
+        self.max_batch = max_batch
+        self.stats = {"written": 0, "write_errors": 0}
+        self._queue = queue.SimpleQueue()
+        self._pending = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def append(self, record):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+                    atexit.register(self.flush)
+        with self._lock:
+            self._pending += 1
+        self._queue.put(record)
+
+    def _run(self):
+        while True:
+            lines = [json.dumps(self._queue.get(), separators=(",", ":"), ensure_ascii=False)]
+            while not self._queue.empty() and len(lines) < self.max_batch:
+                lines.append(json.dumps(self._queue.get(), separators=(",", ":"), ensure_ascii=False))
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("\n".join(lines) + "\n")
+                self.stats["written"] += len(lines)
+            except OSError as e:
+                self.stats["write_errors"] += 1
+                logging.getLogger(__name__).error("Writing %d records to %s failed: %s", len(lines), self.path, e)
+            with self._lock:
+                self._pending -= len(lines)
+
+    def flush(self, timeout=5.0):
+        """Waits until everything appended so far has been written."""
+        deadline = time.monotonic() + timeout
+        while self._pending and time.monotonic() < deadline:
+            time.sleep(0.01)
@@ -1,8 +1,66 @@
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
+from starlette.routing import Route
 from .router import router
+from .session import store as session_store
+from .database import create_db_and_tables, migrate, user_writes
+from .metrics import http_request_duration
+from .profiling import ProfilingMiddleware
+from .recorder import TRAFFIC_RECORD_PATH, TrafficRecorderMiddleware
+from .search import search_service
 
-app = FastAPI(title="ASK GEETA AI")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Expire idle sessions and persist users in the background instead of on the request path
+    session_store.start_sweeper()
+    # Create and index the users table at startup, not on import (once, under a lock,
+    # whichever worker gets there first)
+    create_db_and_tables()
+    migrate()
+    user_writes.start()
+    # Build the search index now rather than on the first typed question
+    search_service.index()
+    yield
+    session_store.stop_sweeper()
+    user_writes.stop()
+
+app = FastAPI(title="ASK GEETA AI", lifespan=lifespan)
+
+class MetricsMiddleware:
+    """Plain ASGI middleware timing every HTTP request by matched route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            if isinstance(route, Route):
+                endpoint = route.path
+            elif isinstance(scope.get("endpoint"), StaticFiles):
+                endpoint = "static"
+            else:
+                endpoint = "unmatched"
+            http_request_duration.observe(time.perf_counter() - start, (endpoint, scope["method"], str(status[0])))
+
+if TRAFFIC_RECORD_PATH:
+    app.add_middleware(TrafficRecorderMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 # Include the API router
 app.include_router(router)
@@ -0,0 +1,120 @@
+"""
+Prometheus-style metrics without a client library.
+
+Counters and histograms are plain dicts keyed by label values, updated under
+a lock; recording one is a dict lookup and a few additions. Components that
+already keep a stats dict (session store, response cache, user writer, ...)
+are exported with register_stats() and only read when /metrics is scraped.
+render() produces the text exposition format (version 0.0.4).
+"""
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stats entries that go up and down; everything else numeric is exported as a counter
+GAUGE_STATS = frozenset({"live", "capacity", "cached", "pending", "inflight", "size"})
+
+_collectors = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _collectors.append(self.collect)
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+class Histogram:
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _collectors.append(self.collect)
+
+    def observe(self, value, labels=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = [(labels, list(values)) for labels, values in self._series.items()]
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values):
+                cumulative += count
+                le = bound if bound == "+Inf" else _number(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, (('le', le),))} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(values[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+def register_stats(prefix, get_stats, help):
+    """Exports every numeric entry of `get_stats()` as `<prefix>_<key>[_total]`."""
+
+    def collect():
+        for key, value in sorted(get_stats().items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if key in GAUGE_STATS:
+                name, kind = f"{prefix}_{key}", "gauge"
+            else:
+                name, kind = f"{prefix}_{key}_total", "counter"
+            yield f"# HELP {name} {help}: {key}"
+            yield f"# TYPE {name} {kind}"
+            yield f"{name} {_number(value)}"
+
+    _collectors.append(collect)
+
+def render() -> str:
+    lines = []
+    for collect in _collectors:
+        try:
+            lines.extend(collect())
+        except Exception as e:  # one broken component must not hide the others
+            lines.append(f"# collector error: {_escape(e)}")
+    return "\n".join(lines) + "\n"
+
+http_request_duration = Histogram(
+    "askgeeta_http_request_duration_seconds", "Time to handle an HTTP request", ("endpoint", "method", "status"))
+flow_duration = Histogram(
+    "askgeeta_flow_duration_seconds", "Time spent in the flow manager per route", ("flow", "cache"))
+verify_call_duration = Histogram(
+    "askgeeta_verify_call_duration_seconds", "Latency of calls to the verification/SMS provider", ("op", "outcome"))
+db_write_duration = Histogram(
+    "askgeeta_db_write_duration_seconds", "Latency of batched database writes", ("table",))
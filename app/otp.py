@@ -0,0 +1,98 @@
+"""
+Local one-time passwords (OTP_MODE=local).
+
+The server generates the code itself and only uses an SMS sender to deliver
+it, so a verification check is a local HMAC comparison instead of a second
+round trip to Twilio. Codes are never stored: the session context keeps a
+record with a random salt, HMAC-SHA256(pepper, salt + number + code), the
+expiry time and the number of failed attempts.
+
+The pepper comes from OTP_PEPPER (`kid:secret,...`, first key used for new
+codes), so a leaked session store or a readable token session can't be
+brute-forced offline. With SESSION_BACKEND=token the record travels in the
+client's token, and a client could replay an older token to reset the
+counter in it. Guesses are therefore also counted on the server, in the OTP
+throttle backend (app/otp_throttle.py) under the number and the record's
+salt; use OTP_THROTTLE_BACKEND=sqlite so every worker shares that count.
+"""
+import hashlib
+import hmac
+import math
+import os
+import secrets
+import time
+
+from .signing import load_keys
+
+OTP_MODE = os.getenv("OTP_MODE", "verify")
+OTP_LENGTH = int(os.getenv("OTP_LENGTH", "6"))
+OTP_TTL = float(os.getenv("OTP_TTL", "300"))
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
+OTP_MESSAGE = os.getenv("OTP_MESSAGE", "Your AskGeeta verification code is {code}. It expires in {minutes} minutes.")
+
+VERIFIED = "verified"
+WRONG = "wrong"
+EXPIRED = "expired"
+LOCKED = "locked"
+
+class OtpEngine:
+
+    def __init__(self, keys=None, length=OTP_LENGTH, ttl=OTP_TTL, max_attempts=OTP_MAX_ATTEMPTS, attempts=None):
+        """`attempts` is an OTP throttle backend that counts guesses per code on the server."""
+        keys = keys or load_keys("OTP_PEPPER")
+        self.attempts = attempts
+        self.kid = keys[0][0]
+        self.keys = dict(keys)
+        self.length = length
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.stats = {"issued": 0, VERIFIED: 0, WRONG: 0, EXPIRED: 0, LOCKED: 0}
+
+    def _digest(self, key, salt, number, code):
+        return hmac.new(key, f"{salt}:{number}:{code}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def issue(self, number: str, now: float = None):
+        """Returns (code, record); only the record may be stored."""
+        code = str(secrets.randbelow(10 ** self.length)).zfill(self.length)
+        salt = secrets.token_hex(8)
+        record = {
+            "n": number,
+            "k": self.kid,
+            "s": salt,
+            "h": self._digest(self.keys[self.kid], salt, number, code),
+            "e": (now or time.time()) + self.ttl,
+            "a": 0,
+        }
+        self.stats["issued"] += 1
+        return code, record
+
+    def message(self, code: str) -> str:
+        return OTP_MESSAGE.format(code=code, minutes=max(1, int(self.ttl // 60)))
+
+    def check(self, record, number: str, code: str, now: float = None) -> str:
+        """
+        Returns VERIFIED, WRONG, EXPIRED or LOCKED. A wrong code increments
+        record["a"] in place; the caller must persist the record. Every guess
+        also takes one of the code's max_attempts tokens on the server, which
+        a replayed copy of the record cannot give back.
+        """
+        now = now or time.time()
+        key = self.keys.get(record.get("k")) if record else None
+        if key is None or record["n"] != number or now > record["e"]:
+            result = EXPIRED
+        elif record["a"] >= self.max_attempts:
+            result = LOCKED
+        elif self.attempts is not None and not self.attempts.take(
+                f"otp:{record['n']}:{record['s']}", self.max_attempts, math.inf, now):
+            # A bucket that never refills: max_attempts guesses per issued code
+            result = LOCKED
+        elif hmac.compare_digest(record["h"], self._digest(key, record["s"], number, code.strip())):
+            result = VERIFIED
+        else:
+            record["a"] += 1
+            result = WRONG if record["a"] < self.max_attempts else LOCKED
+        self.stats[result] += 1
+        return result
+
+    def get_stats(self):
+        return dict(self.stats)
@@ -0,0 +1,214 @@
+"""
+Coalescing and rate limiting for OTP sends.
+
+Every verifications.create call costs money and adds external latency, so
+before sending, OtpSendGate:
+
+1. joins a send to the same number that is already in flight in this process;
+2. reuses a send made to the number within OTP_RESEND_INTERVAL seconds
+   (recorded before the call starts, so other workers see it immediately);
+3. takes a token from per-session and per-number token buckets.
+
+State lives in memory by default; OTP_THROTTLE_BACKEND=sqlite shares it
+between workers through a SQLite file.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .data_loader import BASE_DIR
+
+OTP_THROTTLE_BACKEND = os.getenv("OTP_THROTTLE_BACKEND", "memory")
+OTP_THROTTLE_DB_PATH = os.getenv("OTP_THROTTLE_DB_PATH", str(BASE_DIR / "sessions.db"))
+OTP_RESEND_INTERVAL = float(os.getenv("OTP_RESEND_INTERVAL", "30"))
+
+# (capacity, seconds to refill one token)
+OTP_NUMBER_LIMIT = (int(os.getenv("OTP_NUMBER_BURST", "3")), float(os.getenv("OTP_NUMBER_REFILL", "300")))
+OTP_SESSION_LIMIT = (int(os.getenv("OTP_SESSION_BURST", "3")), float(os.getenv("OTP_SESSION_REFILL", "300")))
+
+SENT = "sent"
+REUSED = "reused"
+THROTTLED = "throttled"
+
+def _refill(tokens, updated_at, capacity, refill_seconds, now):
+    return min(capacity, tokens + (now - updated_at) / refill_seconds)
+
+class MemoryThrottleBackend:
+    """Token buckets and last-send times in a bounded LRU dict."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._state = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def _put(self, key, value):
+        self._state[key] = value
+        self._state.move_to_end(key)
+        while len(self._state) > self.max_keys:
+            self._state.popitem(last=False)
+
+    def take(self, key, capacity, refill_seconds, now) -> bool:
+        with self._lock:
+            tokens, updated_at = self._state.get(key, (capacity, now))
+            tokens = _refill(tokens, updated_at, capacity, refill_seconds, now)
+            allowed = tokens >= 1
+            self._put(key, (tokens - 1 if allowed else tokens, now))
+            return allowed
+
+    def refund(self, key, capacity):
+        """Gives back a token taken by take()."""
+        with self._lock:
+            if key in self._state:
+                tokens, updated_at = self._state[key]
+                self._state[key] = (min(capacity, tokens + 1), updated_at)
+
+    def claim_send(self, number, interval, now) -> bool:
+        """Records a send to `number` unless one was recorded less than `interval` ago."""
+        with self._lock:
+            last = self._state.get("sent:" + number)
+            if last and now - last[1] < interval:
+                return False
+            self._put("sent:" + number, (0, now))
+            return True
+
+    def release_send(self, number):
+        with self._lock:
+            self._state.pop("sent:" + number, None)
+
+class SQLiteThrottleBackend:
+    """Same state in a SQLite table, so every worker on the host shares the limits."""
+
+    def __init__(self, path=OTP_THROTTLE_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS otp_throttle (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, fn):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _upsert(self, conn, key, tokens, now):
+        conn.execute(
+            "INSERT INTO otp_throttle (key, tokens, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+            (key, tokens, now),
+        )
+
+    def take(self, key, capacity, refill_seconds, now) -> bool:
+        def take_token(conn):
+            row = conn.execute("SELECT tokens, updated_at FROM otp_throttle WHERE key = ?", (key,)).fetchone()
+            tokens = _refill(*(row or (capacity, now)), capacity, refill_seconds, now)
+            allowed = tokens >= 1
+            self._upsert(conn, key, tokens - 1 if allowed else tokens, now)
+            return allowed
+        return self._transaction(take_token)
+
+    def refund(self, key, capacity):
+        self._conn().execute("UPDATE otp_throttle SET tokens = MIN(?, tokens + 1) WHERE key = ?", (capacity, key))
+
+    def claim_send(self, number, interval, now) -> bool:
+        def claim(conn):
+            row = conn.execute("SELECT updated_at FROM otp_throttle WHERE key = ?", ("sent:" + number,)).fetchone()
+            if row and now - row[0] < interval:
+                return False
+            self._upsert(conn, "sent:" + number, 0, now)
+            return True
+        return self._transaction(claim)
+
+    def release_send(self, number):
+        self._conn().execute("DELETE FROM otp_throttle WHERE key = ?", ("sent:" + number,))
+
+class OtpSendGate:
+
+    def __init__(self, backend=None, resend_interval=OTP_RESEND_INTERVAL,
+                 number_limit=OTP_NUMBER_LIMIT, session_limit=OTP_SESSION_LIMIT):
+        self.backend = backend or make_throttle_backend()
+        self.resend_interval = resend_interval
+        self.number_limit = number_limit
+        self.session_limit = session_limit
+        self.stats = {"sent": 0, "coalesced": 0, "reused": 0, "throttled_session": 0, "throttled_number": 0}
+        self._inflight = {}  # number -> asyncio.Future
+
+    async def send(self, number: str, session_key: str, send_fn) -> str:
+        """
+        Calls `await send_fn(number)` unless the send can be shared or must be refused.
+        Returns SENT, REUSED or THROTTLED; exceptions from send_fn propagate to every waiter.
+        """
+        inflight = self._inflight.get(number)
+        if inflight is not None:
+            self.stats["coalesced"] += 1
+            try:
+                await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise  # this request was cancelled
+                # The request making the send went away mid-call, not this one: send it ourselves
+                return await self.send(number, session_key, send_fn)
+            return REUSED
+
+        now = time.time()
+        if not self.backend.claim_send(number, self.resend_interval, now):
+            self.stats["reused"] += 1
+            return REUSED
+        if not self.backend.take("session:" + session_key, *self.session_limit, now):
+            self.backend.release_send(number)
+            self.stats["throttled_session"] += 1
+            return THROTTLED
+        if not self.backend.take("number:" + number, *self.number_limit, now):
+            # Nothing was sent, so the session's token is not spent
+            self.backend.refund("session:" + session_key, self.session_limit[0])
+            self.backend.release_send(number)
+            self.stats["throttled_number"] += 1
+            return THROTTLED
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[number] = future
+        try:
+            await send_fn(number)
+        except asyncio.CancelledError:
+            self.backend.release_send(number)
+            future.cancel()
+            raise
+        except Exception as e:
+            # Let the next attempt actually send instead of "reusing" a failed one
+            self.backend.release_send(number)
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody was waiting
+            raise
+        else:
+            future.set_result(None)
+        finally:
+            del self._inflight[number]
+        self.stats["sent"] += 1
+        return SENT
+
+    def get_stats(self):
+        suppressed = self.stats["coalesced"] + self.stats["reused"]
+        throttled = self.stats["throttled_session"] + self.stats["throttled_number"]
+        return dict(self.stats, suppressed=suppressed + throttled, inflight=len(self._inflight))
+
+def make_throttle_backend(backend: str = OTP_THROTTLE_BACKEND):
+    if backend == "memory":
+        return MemoryThrottleBackend()
+    if backend == "sqlite":
+        return SQLiteThrottleBackend()
+    raise ValueError(f"Unknown OTP_THROTTLE_BACKEND '{backend}' (expected memory or sqlite)")
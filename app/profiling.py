@@ -0,0 +1,96 @@
+"""
+On-demand cProfile for the next N requests.
+
+POST /debug/profile arms the profiler and waits (up to `timeout` seconds)
+until N requests have been profiled, then returns the merged pstats report.
+Only one request is profiled at a time; requests arriving while one is being
+profiled run normally. cProfile follows the event-loop thread, so work done
+by other coroutines interleaved with a profiled request is included too.
+"""
+import asyncio
+import cProfile
+import io
+import pstats
+import time
+
+class RequestProfiler:
+
+    def __init__(self):
+        self.remaining = 0
+        self.profiled = 0
+        self.stats = None
+        self._active = False
+        self._done = None
+        self._loop = None
+
+    @property
+    def armed(self) -> bool:
+        return self._done is not None
+
+    def arm(self, requests: int):
+        if self.armed:
+            raise RuntimeError("A profiling session is already running")
+        self.remaining = requests
+        self.profiled = 0
+        self.stats = None
+        self._done = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+
+    def claim(self):
+        """Returns a started profile if this request should be profiled, else None."""
+        if self.remaining <= 0 or self._active:
+            return None
+        self._active = True
+        self.remaining -= 1
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def release(self, profile):
+        profile.disable()
+        self._active = False
+        self.profiled += 1
+        if self.stats is None:
+            self.stats = pstats.Stats(profile)
+        else:
+            self.stats.add(profile)
+        if self.remaining <= 0 and self._done is not None:
+            # Thread-safe in case the app is served from more than one event loop
+            self._loop.call_soon_threadsafe(self._done.set)
+
+    async def collect(self, timeout: float, sort: str = "cumulative", limit: int = 40) -> str:
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.remaining = 0
+            self._done = None
+        header = f"# {self.profiled} request(s) profiled in {time.monotonic() - started:.1f}s\n"
+        if self.stats is None:
+            return header
+        out = io.StringIO()
+        self.stats.stream = out
+        self.stats.sort_stats(sort).print_stats(limit)
+        return header + out.getvalue()
+
+profiler = RequestProfiler()
+
+class ProfilingMiddleware:
+    """Profiles whole requests (routing, handler and response) while the profiler is armed."""
+
+    def __init__(self, app, skip_paths=("/debug/profile",)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.remaining or scope["path"] in self.skip_paths:
+            return await self.app(scope, receive, send)
+        profile = profiler.claim()
+        if profile is None:
+            return await self.app(scope, receive, send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.release(profile)
@@ -0,0 +1,196 @@
+"""
+Anonymised traffic recorder.
+
+With TRAFFIC_RECORD_PATH set, every /api/start, /api/message,
+/api/message/batch and /api/restart call is appended to that file as one compact JSON line, for
+benchmarks/replay.py to play back later. Names, phone numbers, OTP codes and
+free text never reach the file: a message is kept verbatim only if it is a
+button payload the app has offered or a fixed command such as main_menu, and
+is otherwise replaced by <name>, <mobile>, <otp> (<wrong-otp> if it was
+rejected) or <text>. Session ids are replaced by a per-conversation counter,
+and the response is stored only as a digest of its normalised body, so a
+replay can tell whether it got the same answer.
+
+Record fields: ts (epoch seconds), c (conversation), p (path), m (message,
+or list of them for a batch), s (status), ms (server time to first byte),
+h (response digest), plus b for a batch with mode=all, k when the request
+named a session the recorder had not seen and d when it carried a verified
+device cookie.
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+
+from . import device_tokens
+from .flows.manager import ROUTING
+from .log import JsonlAppender
+from .response_cache import response_cache
+
+TRAFFIC_RECORD_PATH = os.getenv("TRAFFIC_RECORD_PATH")
+TRAFFIC_RECORD_CONVERSATIONS = int(os.getenv("TRAFFIC_RECORD_CONVERSATIONS", "10000"))
+
+RECORDED_PATHS = ("/api/start", "/api/message", "/api/message/batch", "/api/restart")
+
+_PHONE = re.compile(r"\+?\d[\d ]{8,14}\d")
+_OTP = re.compile(r"\d{4,8}")
+
+def normalize_response(body, name=None):
+    """The parts of a response that should be the same on replay, with user details masked."""
+    messages = []
+    for message in body.get("messages", []):
+        message = _PHONE.sub("<mobile>", message)
+        if name:
+            message = re.sub(rf"\b{re.escape(name)}\b", "<name>", message)
+        messages.append(message)
+    return {
+        "messages": messages,
+        "buttons": body.get("buttons", []),
+        "input_type": body.get("input_type"),
+        "placeholder": body.get("placeholder"),
+    }
+
+def digest(body, name=None):
+    if "responses" in body:  # /api/message/batch with mode=all
+        normalized = [normalize_response(r, name) for r in body["responses"]]
+    else:
+        normalized = normalize_response(body, name)
+    normalized = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+def anonymize(message, previous, has_session):
+    """Replaces user-typed text with a placeholder, keeping button payloads."""
+    if not message:
+        return message
+    if not has_session:
+        return "<name>"
+    if message in previous.get("values", ()) or message in ROUTING.exact or response_cache.is_known_payload(message):
+        return message
+    if previous.get("input_type") == "tel":
+        return "<mobile>"
+    if previous.get("placeholder") in ("Enter OTP", "123456") or previous.get("awaiting_code"):
+        return "<otp>" if _OTP.fullmatch(message.strip()) else "<text>"
+    return "<text>"
+
+class TrafficRecorder:
+    """Tracks conversations by session id and appends one anonymised record per call."""
+
+    def __init__(self, path, max_conversations=TRAFFIC_RECORD_CONVERSATIONS):
+        self.file = JsonlAppender(path, name="traffic-recorder")
+        self.max_conversations = max_conversations
+        # session id -> {"c": conversation id, "name", "previous": prompt state}
+        self.conversations = OrderedDict()
+        self.next_id = 0
+
+    def _new_conversation(self):
+        self.next_id += 1
+        return {"c": f"c{self.next_id}", "name": None, "previous": {}}
+
+    def record(self, path, request, status, response, elapsed, device=None):
+        session_id = request.get("session_id") or ""
+        conversation = self.conversations.pop(session_id, None) if session_id else None
+        event = {"ts": round(time.time(), 3)}
+        if conversation is None:
+            conversation = self._new_conversation()
+            if session_id:
+                event["k"] = 1
+        event.update(c=conversation["c"], p=path)
+
+        message = request.get("message")
+        if path == "/api/message" and isinstance(message, str):
+            previous = conversation["previous"]
+            event["m"] = anonymize(message, previous, bool(session_id))
+            if event["m"] == "<name>":
+                conversation["name"] = message.strip()
+        elif path == "/api/message/batch" and isinstance(request.get("messages"), list):
+            event["m"] = [anonymize(m, conversation["previous"], True) for m in request["messages"] if isinstance(m, str)]
+            if request.get("mode") == "all":
+                event["b"] = 1
+        if device:
+            event["d"] = 1
+            conversation["name"] = device["name"]
+        event.update(s=status, ms=round(elapsed * 1000, 2))
+
+        if isinstance(response, dict):
+            event["h"] = digest(response, conversation["name"])
+            if event.get("m") == "<otp>" and response.get("input_type") != "button":
+                event["m"] = "<wrong-otp>"  # so a replay sends a wrong code here too
+            last = response["responses"][-1] if response.get("responses") else response
+            messages = " ".join(last.get("messages", []))
+            conversation["previous"] = {
+                "values": {b.get("value") for b in last.get("buttons", [])},
+                "input_type": last.get("input_type"),
+                "placeholder": last.get("placeholder"),
+                "awaiting_code": "code" in messages and last.get("input_type") == "text",
+            }
+            new_id = response.get("session_id")
+            if new_id and path != "/api/restart":
+                self.conversations[new_id] = conversation
+                while len(self.conversations) > self.max_conversations:
+                    self.conversations.popitem(last=False)
+        self.file.append(event)
+
+class TrafficRecorderMiddleware:
+    """Captures request and response bodies of the chat endpoints for the TrafficRecorder."""
+
+    def __init__(self, app, recorder=None):
+        self.app = app
+        self.recorder = recorder or TrafficRecorder(TRAFFIC_RECORD_PATH)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in RECORDED_PATHS:
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        request_body = []
+        response_body = []
+        status = [500]
+        first_byte = []
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                request_body.append(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                if not first_byte:
+                    first_byte.append(time.perf_counter())
+                response_body.append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, receive_wrapper, send_wrapper)
+        # Time to the first body chunk, so paced streaming replies aren't counted as slow
+        elapsed = (first_byte[0] if first_byte else time.perf_counter()) - start
+        try:
+            request = json.loads(b"".join(request_body) or b"{}")
+            response = _parse_response(b"".join(response_body))
+        except (ValueError, KeyError, IndexError, TypeError):
+            request, response = {}, None
+        if not isinstance(request, dict):
+            request = {}
+        device = None
+        if scope["path"] == "/api/start":
+            device = device_tokens.verify(_cookie(scope, device_tokens.DEVICE_COOKIE))
+        self.recorder.record(scope["path"], request, status[0], response, elapsed, device)
+
+def _parse_response(data):
+    """A JSON reply, or an NDJSON one (header line, then one line per bubble) put back together."""
+    try:
+        return json.loads(data)
+    except ValueError:
+        lines = [json.loads(line) for line in data.splitlines() if line.strip()]
+        return dict(lines[0], messages=[line["message"] for line in lines[1:]])
+
+def _cookie(scope, name):
+    for key, value in scope.get("headers", ()):
+        if key == b"cookie":
+            for part in value.decode("latin-1").split(";"):
+                k, _, v = part.strip().partition("=")
+                if k == name:
+                    return v
+    return None
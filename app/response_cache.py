@@ -0,0 +1,133 @@
+import os
+import threading
+from collections import OrderedDict
+
+from .data_loader import get_content_version
+from .metrics import register_stats
+from .responses import bot_response_body, dumps
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))
+PREFETCH_MAX_BYTES = int(os.getenv("PREFETCH_MAX_BYTES", "16384"))
+
+class RenderedResponse:
+    """
+    A BotResponse body serialized once, with only the session_id left to fill in.
+    Field order and JSON separators match what FastAPI produces for BotResponse.
+    """
+    __slots__ = ("tail", "buttons")
+
+    def __init__(self, response):
+        body = bot_response_body(response)
+        del body["session_id"]
+        self.tail = b"," + dumps(body)[1:]
+        self.buttons = tuple(btn.get("value") for btn in body["buttons"])
+
+    def render(self, session_id: str) -> bytes:
+        return b'{"session_id":' + dumps(session_id) + self.tail
+
+    def body(self) -> bytes:
+        """The response without a session id, as embedded in another response's "prefetched"."""
+        return b"{" + self.tail[1:]
+
+class CachedResponse:
+    """A rendered response plus the session transition the handler made when producing it."""
+    __slots__ = ("rendered", "new_state", "context_update")
+
+    def __init__(self, rendered, new_state=None, context_update=None):
+        self.rendered = rendered
+        self.new_state = new_state
+        self.context_update = context_update
+
+class ResponseCache:
+    """
+    Bounded LRU of rendered responses keyed by (state, choice) for the current content version.
+
+    Only choices that the server has itself offered as a button value are cached,
+    so free text typed by users never fills the cache. The whole cache (and the
+    set of known payloads) is dropped as soon as the content version changes.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "clears": 0, "prefetched": 0}
+        self._entries = OrderedDict()
+        self._payloads = set()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _check_version(self):
+        version = get_content_version()
+        if version != self._version:
+            self._entries.clear()
+            self._payloads.clear()
+            if self._version is not None:
+                self.stats["clears"] += 1
+            self._version = version
+
+    def is_known_payload(self, choice) -> bool:
+        with self._lock:
+            self._check_version()
+            return choice in self._payloads
+
+    def learn_payloads(self, values):
+        with self._lock:
+            self._check_version()
+            self._payloads.update(v for v in values if v)
+
+    def get(self, state, choice):
+        with self._lock:
+            self._check_version()
+            key = (state, choice)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def put(self, state, choice, entry, version):
+        """Stores an entry rendered against content `version`; stale renders are dropped."""
+        with self._lock:
+            self._check_version()
+            if version != self._version:
+                return
+            self._entries[(state, choice)] = entry
+            self._entries.move_to_end((state, choice))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def prefetch(self, state, choices, max_bytes=PREFETCH_MAX_BYTES) -> bytes:
+        """
+        A JSON object mapping each of `choices` to the response it would get in `state`.
+        Only responses already in the cache are included, so nothing is rendered and no
+        session changes; choices that would take the object past max_bytes are left out.
+        """
+        parts = []
+        size = 2
+        with self._lock:
+            self._check_version()
+            for choice in choices:
+                entry = self._entries.get((state, choice))
+                if entry is None:
+                    continue
+                part = dumps(choice) + b":" + entry.rendered.body()
+                if size + len(part) + 1 > max_bytes:
+                    continue
+                parts.append(part)
+                size += len(part) + 1
+            self.stats["prefetched"] += len(parts)
+        return b"{" + b",".join(parts) + b"}"
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._payloads.clear()
+            self._version = None
+
+    def get_stats(self):
+        return dict(self.stats, size=len(self._entries), version=self._version)
+
+response_cache = ResponseCache()
+register_stats("askgeeta_response_cache", response_cache.get_stats, "Pre-rendered response cache")
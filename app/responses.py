@@ -0,0 +1,43 @@
+"""
+JSON encoding for chat responses without FastAPI's per-request validation.
+
+Flow handlers build plain dicts shaped like BotResponse. Returned as-is,
+FastAPI would validate each one against the model and serialize it again;
+the chat endpoints instead put the fields in BotResponse order, fill its
+defaults and encode the result directly (with orjson when it is installed),
+so clients get the same JSON for less CPU.
+
+STRICT_RESPONSES=1 validates every response against the model first, which
+is how development and CI runs should catch a handler returning a malformed
+response.
+"""
+import json
+import os
+
+try:
+    import orjson
+except ImportError:  # optional dependency, the standard library encoder is used instead
+    orjson = None
+
+STRICT_RESPONSES = os.getenv("STRICT_RESPONSES", "0") == "1"
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def bot_response_body(response) -> dict:
+    """A handler's response dict (or BotResponse) as the dict BotResponse would serialize to."""
+    fields = response if isinstance(response, dict) else response.__dict__
+    return {
+        "session_id": fields.get("session_id", ""),
+        "messages": fields.get("messages", []),
+        "buttons": fields.get("buttons", []),
+        "input_type": fields.get("input_type", "button"),
+        "placeholder": fields.get("placeholder"),
+    }
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict
-from .session import create_session, get_session, update_session_state, delete_session
-from .database import create_db_and_tables, save_user
-from twilio.rest import Client
-from twilio.base.exceptions import TwilioRestException
+from typing import Optional, List, Dict, Literal, Union
+from .session import create_session, get_session, get_session_async, update_session_state, delete_session, current_session_id, begin_request
+from .database import save_user
+from . import device_tokens, metrics, responses, search, streaming, tracing
+from .data_loader import get_catalog
+from .profiling import profiler
+from .log import get_logger, sampled_debug
 from dotenv import load_dotenv
+import hmac
 import os
 from pathlib import Path
 
@@ -19,16 +23,36 @@ TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
 TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_VERIFY_SERVICE_SID = os.getenv("TWILIO_VERIFY_SERVICE_SID")
 
-print(f"DEBUG: Looking for .env at: {env_path}")
-print(f"DEBUG: .env exists: {env_path.exists()}")
-print(f"DEBUG: TWILIO_ACCOUNT_SID: {'Set' if TWILIO_ACCOUNT_SID else 'Not Set'}")
-print(f"DEBUG: TWILIO_AUTH_TOKEN: {'Set' if TWILIO_AUTH_TOKEN else 'Not Set'}")
-print(f"DEBUG: TWILIO_VERIFY_SERVICE_SID: {'Set' if TWILIO_VERIFY_SERVICE_SID else 'Not Set'}")
+# Enables /debug/* when set; requests must send it as "Authorization: Bearer <token>"
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN")
+# Most choices /api/message/batch applies in one request
+MAX_BATCH_MESSAGES = int(os.getenv("MAX_BATCH_MESSAGES", "20"))
+# Most results /api/search returns
+MAX_SEARCH_RESULTS = 20
 
-client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN) if TWILIO_ACCOUNT_SID else None
+logger = get_logger(__name__)
+logger.debug("Looking for .env at: %s (exists: %s)", env_path, env_path.exists())
+logger.debug("TWILIO_ACCOUNT_SID: %s", 'Set' if TWILIO_ACCOUNT_SID else 'Not Set')
+logger.debug("TWILIO_AUTH_TOKEN: %s", 'Set' if TWILIO_AUTH_TOKEN else 'Not Set')
+logger.debug("TWILIO_VERIFY_SERVICE_SID: %s", 'Set' if TWILIO_VERIFY_SERVICE_SID else 'Not Set')
 
-# Initialize DB on startup
-create_db_and_tables()
+from . import verify
+from .otp_throttle import OtpSendGate, REUSED, THROTTLED
+from . import otp
+verify_service = verify.make_verify_service(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_VERIFY_SERVICE_SID)
+otp_gate = OtpSendGate()
+metrics.register_stats("askgeeta_otp_sends", otp_gate.get_stats, "OTP send gate")
+metrics.register_stats("askgeeta_chat_sockets", streaming.get_socket_stats, "WebSocket chat connections")
+if verify_service:
+    metrics.register_stats("askgeeta_verify", verify_service.get_stats, "Verification provider calls")
+
+# OTP_MODE=local: codes are generated and checked here, SMS only delivers them
+if otp.OTP_MODE == "local":
+    otp_engine = otp.OtpEngine(attempts=otp_gate.backend)
+    sms_sender = verify.make_sms_sender(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+    metrics.register_stats("askgeeta_otp_checks", otp_engine.get_stats, "Local OTP codes")
+else:
+    otp_engine = sms_sender = None
 
 router = APIRouter()
 
@@ -37,6 +61,7 @@ class UserInput(BaseModel):
     session_id: Optional[str] = None
     message: Optional[str] = None # For button value or text
     payload: Optional[str] = None # specific action payload if needed
+    prefetch: bool = False # also return cached responses for the offered buttons, see process_flow
 
 class BotResponse(BaseModel):
     session_id: str
@@ -45,8 +70,70 @@ class BotResponse(BaseModel):
     input_type: str = "button" # 'text', 'button', 'tel'
     placeholder: Optional[str] = None
 
+class BatchInput(BaseModel):
+    session_id: str
+    messages: List[str] # Button values, applied in order
+    mode: Literal["final", "all"] = "final"
+
+class BatchResponse(BaseModel):
+    session_id: str
+    responses: List[BotResponse]
+
+class CourseSummary(BaseModel):
+    id: str
+    name: str
+    school_id: str
+    school_name: str
+    level: Optional[str] = None
+    prog_fee_per_sem: Optional[float] = None
+    tuition_fee: Optional[float] = None
+    value: str # button payload opening the course from any state
+
+class CoursePage(BaseModel):
+    total: int # courses matching the filters, across all pages
+    offset: int
+    limit: int
+    courses: List[CourseSummary]
+
+class SearchResult(BaseModel):
+    kind: str # school, course, scholarship, campus, placements, event, contact
+    title: str # the record that matched
+    text: str # button label for the screen it is shown on
+    value: str # button payload opening that screen from any state
+    score: float
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
+
+def response_body(response) -> dict:
+    """The dict a handler response (dict, BotResponse or pre-rendered Response) is sent as."""
+    if isinstance(response, Response):
+        return responses.loads(response.body)
+    body = responses.bot_response_body(response)
+    # Token sessions get a new id whenever the session changes; send back the latest one
+    if body["session_id"]:
+        body["session_id"] = current_session_id(body["session_id"])
+    if responses.STRICT_RESPONSES:
+        body = BotResponse.model_validate(body).model_dump()
+    return body
+
+def encode_body(response) -> bytes:
+    """
+    Encodes a BotResponse-shaped dict (or BotResponse) directly, see app/responses.py.
+    response_model stays on the routes for the API docs; a returned Response skips it.
+    """
+    return responses.dumps(response_body(response))
+
+def encode_response(response, http_response: Response = None) -> Response:
+    encoded = Response(content=encode_body(response), media_type="application/json")
+    if http_response is not None:
+        # FastAPI only copies headers (cookies) from the injected response when it builds the response itself
+        encoded.headers.raw.extend(http_response.headers.raw)
+    return encoded
+
 @router.post("/api/start", response_model=BotResponse)
-async def start_chat(user_input: UserInput):
+async def start_chat(user_input: UserInput, request: Request, response: Response):
     """
     Initializes chat. Expects user name in 'name' field if it's the very first step,
     or just starts the handshake.
@@ -61,13 +148,24 @@ async def start_chat(user_input: UserInput):
     # and create session when they send the name.
     # OR create a pre-session.
     
+    # Returning visitor on a verified device: skip name, SMS and OTP entirely
+    device = device_tokens.verify(request.cookies.get(device_tokens.DEVICE_COOKIE))
+    if device:
+        session_id = create_session(device["name"])
+        update_session_state(session_id, "main_menu", {"mobile": device["mobile"]})
+        device_tokens.set_cookie(response, device["name"], device["mobile"])  # slide the expiry
+        return encode_response(manager.get_main_menu(
+            current_session_id(session_id),
+            [f"Welcome back, {device['name']}!", "How can I help you today?"],
+        ), response)
+
     # Simplest: Return instructions to UI to show Name Input.
-    return BotResponse(
+    return encode_response(BotResponse(
         session_id="", 
         messages=["Hello! Welcome to ASKGEETAI. \nI am your virtual guide for Geeta University.", "May I know your name so I can address you properly?"],
         buttons=[],
         input_type="text"
-    )
+    ))
 
 @router.post("/api/restart", response_model=BotResponse)
 async def restart_chat(user_input: UserInput):
@@ -79,15 +177,205 @@ async def restart_chat(user_input: UserInput):
         delete_session(session_id)
     
     # Return the welcome message to restart
-    return BotResponse(
+    return encode_response(BotResponse(
         session_id="", 
         messages=["Hello! Welcome to ASKGEETAI. \nI am your virtual guide for Geeta University.", "May I know your name so I can address you properly?"],
         buttons=[],
         input_type="text"
-    )
+    ))
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def require_debug_token(request: Request):
+    supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+    # 404 rather than 401 so the endpoints don't advertise themselves when disabled
+    if not DEBUG_TOKEN:
+        raise HTTPException(status_code=404)
+    if not hmac.compare_digest(supplied.encode(), DEBUG_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid debug token")
+
+@router.post("/debug/profile", include_in_schema=False)
+async def debug_profile(request: Request, requests: int = 20, timeout: float = 60, sort: str = "cumulative", limit: int = 40):
+    """Profiles the next `requests` requests with cProfile and returns the pstats report as text."""
+    require_debug_token(request)
+    if sort not in ("cumulative", "tottime", "calls", "ncalls", "time"):
+        raise HTTPException(status_code=400, detail="sort must be cumulative, tottime, calls, ncalls or time")
+    try:
+        profiler.arm(max(1, min(requests, 10000)))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    report = await profiler.collect(min(timeout, 600), sort, limit)
+    return Response(content=report, media_type="text/plain; charset=utf-8")
+
+@router.get("/debug/traces", include_in_schema=False)
+async def debug_traces(request: Request, limit: int = 50):
+    """Most recent sampled traces from the in-memory buffer."""
+    require_debug_token(request)
+    return {"stats": tracing.get_stats(), "traces": tracing.exporter.recent(limit)}
 
 @router.post("/api/message", response_model=BotResponse)
-async def chat_message(user_input: UserInput):
+async def chat_message(user_input: UserInput, request: Request, http_response: Response, pace: Optional[float] = None):
+    """
+    Handles one chat message. With "Accept: application/x-ndjson" the reply is
+    streamed instead (see streaming.ndjson_lines), with bubbles paced like the
+    WebSocket transport; `pace=0` sends them all at once.
+    """
+    with tracing.trace("chat_message"):
+        response = await handle_message(user_input, http_response)
+    if "application/x-ndjson" in request.headers.get("accept", ""):
+        lines = streaming.ndjson_lines(response_body(response), streaming.bubble_delay(pace))
+        stream = StreamingResponse(lines, media_type="application/x-ndjson")
+        stream.headers.raw.extend(http_response.headers.raw)
+        return stream
+    if isinstance(response, Response):
+        return response
+    return encode_response(response, http_response)
+
+@router.post("/api/message/sse")
+async def chat_message_sse(user_input: UserInput, http_response: Response, pace: Optional[float] = None):
+    """
+    /api/message as a server-sent event stream of frames (see app/streaming.py),
+    for clients that cannot keep a WebSocket open.
+    """
+    with tracing.trace("chat_message", transport="sse"):
+        response = await handle_message(user_input, http_response)
+    body = response_body(response)
+
+    async def events():
+        async for frame in streaming.bot_frames(body, streaming.bubble_delay(pace)):
+            yield streaming.sse_event(frame)
+
+    stream = StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+    stream.headers.raw.extend(http_response.headers.raw)
+    return stream
+
+@router.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket, session_id: str = "", pace: Optional[float] = None):
+    """
+    Persistent chat connection bound to one session. The client sends
+    {"message": "...", "prefetch": false} frames; each is handled like
+    /api/message and answered with the frames of app/streaming.py, one request
+    at a time and in order. A frame may carry the client's latest session_id,
+    which then replaces the bound one. Device cookies can't be set over a
+    WebSocket, so clients should verify over REST and connect afterwards.
+    """
+    await websocket.accept()
+    streaming.socket_stats["opened"] += 1
+    streaming.socket_stats["live"] += 1
+    delay = streaming.bubble_delay(pace)
+    try:
+        while True:
+            try:
+                frame = responses.loads(await websocket.receive_text())
+                text = frame["message"]
+                if not isinstance(text, str):
+                    raise TypeError
+            except (ValueError, KeyError, TypeError):
+                streaming.socket_stats["rejected"] += 1
+                await websocket.send_text(responses.dumps({"type": "error", "detail": 'Expected {"message": "..."}'}).decode())
+                continue
+            streaming.socket_stats["received"] += 1
+            begin_request()
+            with tracing.trace("chat_message", transport="websocket"):
+                user_input = UserInput(session_id=frame.get("session_id") or session_id, message=text,
+                                       prefetch=frame.get("prefetch") is True)
+                response = await handle_message(user_input)
+            body = response_body(response)
+            session_id = body["session_id"]
+            async for out in streaming.bot_frames(body, delay):
+                await websocket.send_text(responses.dumps(out).decode())
+            if not session_id:
+                # The session ended (exit, expiry); a new conversation starts over REST
+                await websocket.close()
+                return
+    except WebSocketDisconnect:
+        pass
+    finally:
+        streaming.socket_stats["live"] -= 1
+
+@router.post("/api/message/batch", response_model=Union[BotResponse, BatchResponse])
+async def chat_message_batch(batch: BatchInput):
+    """
+    Applies several button choices in one round trip, e.g. a deep link
+    flow_schools -> school_x -> course_y -> detail_fees. mode=final returns the
+    last screen like /api/message; mode=all returns every screen in order.
+    Stops early if a choice ends the session (exit, restart).
+    """
+    if not batch.messages or len(batch.messages) > MAX_BATCH_MESSAGES:
+        raise HTTPException(status_code=400, detail=f"messages must hold 1 to {MAX_BATCH_MESSAGES} choices")
+    with tracing.trace("chat_message_batch", steps=len(batch.messages)):
+        session = await get_session_async(batch.session_id)
+        if not session:
+            return encode_response(BotResponse(session_id="", messages=["Session expired. Please restart."], buttons=[{"text": "Restart", "value": "restart"}], input_type="button"))
+        if session.get("state") in ("AWAITING_MOBILE", "AWAITING_OTP"):
+            raise HTTPException(status_code=409, detail="The session must be verified before sending a batch")
+
+        session_id = batch.session_id
+        screens = []
+        for choice in batch.messages:
+            response = await process_flow(session, choice)
+            if isinstance(response, Response):
+                screens.append(response.body)  # pre-rendered from the response cache
+                session_id = current_session_id(session["id"])
+            else:
+                screens.append(encode_body(response))
+                session_id = current_session_id(response["session_id"]) if response["session_id"] else ""
+            if not session_id:
+                break
+            # A no-op for the in-memory store; shared backends may hand out a fresher copy
+            session = await get_session_async(session_id) or session
+
+    if batch.mode == "final":
+        return Response(content=screens[-1], media_type="application/json")
+    content = b'{"session_id":' + responses.dumps(session_id) + b',"responses":[' + b",".join(screens) + b"]}"
+    return Response(content=content, media_type="application/json")
+
+@router.get("/api/search", response_model=SearchResponse)
+async def search_content(q: str, limit: int = search.SEARCH_RESULTS):
+    """
+    Free-text search over schools, courses, scholarships, campus, placements and
+    events. Each result's value can be sent to /api/message as a button choice.
+    """
+    with tracing.trace("search", query_length=len(q)):
+        results = search.search(q, max(1, min(limit, MAX_SEARCH_RESULTS)))
+    return Response(content=responses.dumps({"query": q, "results": results}), media_type="application/json")
+
+@router.get("/api/courses", response_model=CoursePage)
+async def list_courses(
+    school: List[str] = Query(default=[]),
+    level: List[str] = Query(default=[]),
+    min_prog_fee: Optional[float] = None,
+    max_prog_fee: Optional[float] = None,
+    min_tuition_fee: Optional[float] = None,
+    max_tuition_fee: Optional[float] = None,
+    sort: Literal["name", "school", "level", "prog_fee_per_sem", "tuition_fee"] = "name",
+    order: Literal["asc", "desc"] = "asc",
+    offset: int = 0,
+    limit: int = 20,
+):
+    """
+    Courses across all schools, e.g. UG courses under a fee or every PG course:
+    /api/courses?level=UG&max_prog_fee=60000&sort=prog_fee_per_sem.
+    school and level may be repeated; fee bounds are inclusive.
+    """
+    with tracing.trace("list_courses"):
+        page = get_catalog().query(
+            schools=school,
+            levels=level,
+            fee_ranges={
+                "prog_fee_per_sem": (min_prog_fee, max_prog_fee),
+                "tuition_fee": (min_tuition_fee, max_tuition_fee),
+            },
+            sort=sort,
+            descending=order == "desc",
+            offset=offset,
+            limit=limit,
+        )
+    return Response(content=responses.dumps(page), media_type="application/json")
+
+async def handle_message(user_input: UserInput, http_response: Response = None):
     session_id = user_input.session_id
     text = user_input.message
     
@@ -107,7 +395,8 @@ async def chat_message(user_input: UserInput):
             placeholder="+91..."
         )
 
-    session = get_session(session_id)
+    with tracing.span("session.get"):
+        session = await get_session_async(session_id)
     if not session:
         return BotResponse(session_id="", messages=["Session expired. Please restart."], buttons=[{"text": "Restart", "value": "restart"}], input_type="button")
 
@@ -130,13 +419,30 @@ async def chat_message(user_input: UserInput):
                 placeholder="+91..."
             )
 
-        if client and TWILIO_VERIFY_SERVICE_SID:
+        if otp_engine:
+            return await send_local_otp(session, session_id, mobile)
+
+        if verify_service:
             try:
-                verification = client.verify.v2.services(TWILIO_VERIFY_SERVICE_SID) \
-                    .verifications \
-                    .create(to=mobile, channel='sms')
-                
+                result = await otp_gate.send(mobile, session.get("key", session_id), verify_service.send)
+                if result == THROTTLED:
+                    return BotResponse(
+                        session_id=session_id,
+                        messages=["Too many code requests. Please wait a few minutes and try again.", "Please enter your mobile number again."],
+                        buttons=[],
+                        input_type="tel",
+                        placeholder="+91..."
+                    )
+
                 update_session_state(session_id, "AWAITING_OTP", {"mobile": mobile})
+                if result == REUSED:
+                    return BotResponse(
+                        session_id=session_id,
+                        messages=[f"A verification code was already sent to {mobile} and may take a minute to arrive.", "Please enter the 6-digit code below."],
+                        buttons=[],
+                        input_type="text",
+                        placeholder="Enter OTP"
+                    )
                 return BotResponse(
                     session_id=session_id,
                     messages=[f"I've sent a verification code to {mobile}.", "Please enter the 6-digit code below."],
@@ -144,12 +450,20 @@ async def chat_message(user_input: UserInput):
                     input_type="text",
                     placeholder="Enter OTP"
                 )
-            except TwilioRestException as e:
+            except verify.VerifyUnavailable:
+                 return BotResponse(
+                    session_id=session_id,
+                    messages=["SMS verification is temporarily unavailable. Please try again in a minute.", "Please enter your mobile number again."],
+                    buttons=[],
+                    input_type="tel",
+                    placeholder="+91..."
+                )
+            except verify.VerifyError as e:
                  # Map specific Twilio errors to user-friendly messages
                  error_msg = "Something went wrong while sending the code. Please double-check your number."
-                 if e.code == 60200:
+                 if e.code == verify.INVALID_NUMBER:
                      error_msg = f"The number '{mobile}' is invalid. Please enter a valid mobile number with country code."
-                 elif e.code == 60203:
+                 elif e.code == verify.UNSUPPORTED_NUMBER:
                      error_msg = "This number is not supported for SMS verification."
                  
                  return BotResponse(
@@ -180,47 +494,66 @@ async def chat_message(user_input: UserInput):
 
     if state == "AWAITING_OTP":
         mobile = session.get("context", {}).get("mobile")
-        otp = text
+        code = text
         
         verified = False
-        if client and TWILIO_VERIFY_SERVICE_SID and not (otp == "123456" and not TWILIO_AUTH_TOKEN):
+        if otp_engine:
+            record = session.get("context", {}).get("otp")
+            result = otp_engine.check(record, mobile, code)
+            if result in (otp.EXPIRED, otp.LOCKED):
+                update_session_state(session_id, "AWAITING_MOBILE", {"otp": None})
+                return BotResponse(
+                    session_id=session_id,
+                    messages=["This code has expired or too many attempts were made.", "Please enter your mobile number to get a new code."],
+                    buttons=[],
+                    input_type="tel",
+                    placeholder="+91..."
+                )
+            verified = result == otp.VERIFIED
+            if not verified:
+                update_session_state(session_id, "AWAITING_OTP", {"otp": record})
+        elif verify_service:
             try:
-                verification_check = client.verify.v2.services(TWILIO_VERIFY_SERVICE_SID) \
-                    .verification_checks \
-                    .create(to=mobile, code=otp)
-                if verification_check.status == "approved":
-                    verified = True
-            except Exception as e:
+                verified = await verify_service.check(mobile, code)
+            except verify.VerifyUnavailable:
                 return BotResponse(
                     session_id=session_id,
-                    messages=[f"Error verifying OTP: {str(e)}", "Please try again."],
+                    messages=["We couldn't reach the verification service just now.", "Please enter the code again in a moment."],
+                    buttons=[],
+                    input_type="text"
+                )
+            except verify.VerifyError as e:
+                error_msg = f"Error verifying OTP: {str(e)}"
+                if e.code in (verify.NOT_FOUND, verify.MAX_CHECK_ATTEMPTS):
+                    # Code expired or too many wrong attempts: a new code is needed
+                    update_session_state(session_id, "AWAITING_MOBILE")
+                    return BotResponse(
+                        session_id=session_id,
+                        messages=["This code has expired or too many attempts were made.", "Please enter your mobile number to get a new code."],
+                        buttons=[],
+                        input_type="tel",
+                        placeholder="+91..."
+                    )
+                return BotResponse(
+                    session_id=session_id,
+                    messages=[error_msg, "Please try again."],
                     buttons=[],
                     input_type="text"
                 )
         else:
             # Mock verification
-            if otp == "123456": verified = True
+            if code == "123456": verified = True
 
         if verified:
             # Save to DB
-            save_user(session.get("name"), mobile)
+            with tracing.span("save_user"):
+                save_user(session.get("name"), mobile)
+            if http_response is not None:
+                device_tokens.set_cookie(http_response, session.get("name"), mobile)
             
             # Move to Main Menu
-            update_session_state(session_id, "main_menu")
-            return BotResponse(
-                session_id=session_id,
-                messages=["Verification successful!", "How can I help you today?"],
-                buttons=[
-                    {"text": "Explore Schools & Courses", "value": "flow_schools"},
-                    {"text": "Scholarships & Financial Aid", "value": "flow_scholarships"},
-                    {"text": "Campus & Facilities", "value": "flow_campus"},
-                    {"text": "Co-curricular & Student Activities", "value": "flow_cocurricular"},
-                    {"text": "Placements Overview", "value": "flow_placements"},
-                    {"text": "Contact University", "value": "flow_contact"},
-                    {"text": "Exit", "value": "exit"}
-                ],
-                input_type="button"
-            )
+            update_session_state(session_id, "main_menu", {"otp": None} if otp_engine else None)
+            return manager.get_main_menu(session_id, ["Verification successful!", "How can I help you today?"])
         else:
             return BotResponse(
                 session_id=session_id,
@@ -233,18 +566,101 @@ async def chat_message(user_input: UserInput):
     # We will implement a dispatcher here.
     # For now, just echo logic until flows are ready.
     
-    print(f"DEBUG: calling process_flow with text: {text}")
-    response = await process_flow(session, text)
-    print("DEBUG: process_flow returned successfully")
-    return response
+    sampled_debug(logger, "calling process_flow with text: %s", text)
+    return await process_flow(session, text, user_input.prefetch)
+
+async def send_local_otp(session, session_id, mobile):
+    """Issues a local code, delivers it through the OTP send gate and keeps only its hash."""
+    code, record = otp_engine.issue(mobile)
+
+    async def deliver(number):
+        if sms_sender:
+            await sms_sender.deliver(number, otp_engine.message(code))
+        else:
+            logger.info("DEV: OTP for %s is %s", number, code)
+
+    try:
+        result = await otp_gate.send(mobile, session.get("key", session_id), deliver)
+    except verify.VerifyUnavailable:
+        result = None
+        messages = ["SMS verification is temporarily unavailable. Please try again in a minute."]
+    except verify.VerifyError as e:
+        result = None
+        messages = ["Something went wrong while sending the code. Please double-check your number."]
+        if e.code == verify.INVALID_NUMBER:
+            messages = [f"The number '{mobile}' is invalid. Please enter a valid mobile number with country code."]
+        elif e.code == verify.UNSUPPORTED_NUMBER:
+            messages = ["This number is not supported for SMS verification."]
+    except Exception:
+        result = None
+        messages = ["An unexpected error occurred. Please try again later."]
+    if result == THROTTLED:
+        messages = ["Too many code requests. Please wait a few minutes and try again."]
+    elif result == REUSED:
+        previous = session.get("context", {}).get("otp")
+        if previous and previous["n"] == mobile:
+            update_session_state(session_id, "AWAITING_OTP", {"mobile": mobile})
+            return BotResponse(
+                session_id=session_id,
+                messages=[f"A verification code was already sent to {mobile} and may take a minute to arrive.", "Please enter the 6-digit code below."],
+                buttons=[],
+                input_type="text",
+                placeholder="Enter OTP"
+            )
+        messages = ["A code was just sent to this number. Please wait a moment before requesting another."]
+    elif result is not None:
+        update_session_state(session_id, "AWAITING_OTP", {"mobile": mobile, "otp": record})
+        messages = [f"I've sent a verification code to {mobile}.", "Please enter the 6-digit code below."]
+        if not sms_sender:
+            messages[0] = "[DEV MODE] No SMS sender configured; the code is printed in the server log."
+        return BotResponse(
+            session_id=session_id,
+            messages=messages,
+            buttons=[],
+            input_type="text",
+            placeholder="Enter OTP"
+        )
+
+    return BotResponse(
+        session_id=session_id,
+        messages=messages + ["Please enter your mobile number again."],
+        buttons=[],
+        input_type="tel",
+        placeholder="+91..."
+    )
 
 # Placeholder for the dispatcher
 from .flows import manager
+from .response_cache import RenderedResponse, response_cache
 
-async def process_flow(session, user_choice):
+async def process_flow(session, user_choice, prefetch=False):
     # This function will eventually call specific flow handlers
-    response = manager.handle_request(session, user_choice)
+    with tracing.span("process_flow"):
+        response = manager.handle_request_cached(session, user_choice)
+    if prefetch:
+        return await with_prefetched(session, response)
+    if isinstance(response, RenderedResponse):
+        # Already serialized; skip re-validation and only fill in the session id
+        return Response(content=response.render(session.get('id', '')), media_type="application/json")
     # Ensure session_id is in the response
     if 'session_id' not in response:
         response['session_id'] = session.get('id', '')
     return response
+
+async def with_prefetched(session, response) -> Response:
+    """
+    Encodes a flow response with a "prefetched" object holding the cached
+    responses of its buttons (up to PREFETCH_MAX_BYTES), so the client can show
+    the next screen without waiting for the server.
+    """
+    if isinstance(response, RenderedResponse):
+        content, choices = response.render(session.get("id", "")), response.buttons
+    else:
+        response.setdefault("session_id", session.get("id", ""))
+        content, choices = encode_body(response), [b.get("value") for b in response.get("buttons", [])]
+        if not response["session_id"]:
+            return Response(content=content, media_type="application/json")
+    # The state the choices will be made in; the live session dict has it unless a shared store reloaded it
+    state = (await get_session_async(current_session_id(session["id"])) or session)["state"]
+    prefetched = response_cache.prefetch(state, choices)
+    return Response(content=content[:-1] + b',"prefetched":' + prefetched + b"}", media_type="application/json")
@@ -0,0 +1,299 @@
+"""
+Free-text search over the university content.
+
+Everything a user can navigate to (schools, courses, scholarships, campus,
+placements, co-curricular events) is tokenized into one inverted index the
+first time it is needed for a content version, and again only when the
+version changes. Each posting stores its precomputed BM25 weight, so a query
+is dict lookups and additions over the postings of its rarer terms plus a
+top-k selection.
+
+A result points at the screen a button can open from any state: a school or
+course payload, or the flow_* menu the matching record is listed in.
+"""
+import heapq
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from operator import itemgetter
+
+from .data_loader import get_content
+from .log import get_logger
+from .metrics import register_stats
+
+logger = get_logger(__name__)
+
+SEARCH_RESULTS = int(os.getenv("SEARCH_RESULTS", "5"))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Names and titles count this many times over the body text
+TITLE_WEIGHT = 3
+# Results scoring below this fraction of the best one are dropped as noise
+RELATIVE_CUTOFF = 0.5
+
+STOP_WORDS = frozenset({
+    "a", "an", "and", "are", "about", "as", "at", "be", "by", "can", "do", "does", "for", "from",
+    "how", "i", "in", "is", "it", "me", "my", "of", "on", "or", "tell", "the", "there", "to",
+    "what", "which", "with", "you", "your", "want", "know", "show", "please", "any",
+})
+
+# Buttons for results that open a flow menu rather than a specific record
+SECTIONS = {
+    "scholarship": ("Scholarships & Financial Aid", "flow_scholarships"),
+    "campus": ("Campus & Facilities", "flow_campus"),
+    "event": ("Co-curricular & Student Activities", "flow_cocurricular"),
+    "placements": ("Placements Overview", "flow_placements"),
+    "contact": ("Contact University", "flow_contact"),
+}
+
+_CHUNK = re.compile(r"[^\s/,;:()&+]+")
+_WORD = re.compile(r"[a-z0-9]+")
+
+def _stem(word):
+    if len(word) <= 3:
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+def tokenize(text):
+    """
+    Lowercased word stems without stop words. Dotted and hyphenated forms
+    also yield their joined spelling, so "B.Tech" matches "btech" and "b tech".
+    """
+    tokens = []
+    for chunk in _CHUNK.findall(text.lower()):
+        words = _WORD.findall(chunk)
+        for word in words:
+            if word not in STOP_WORDS:
+                tokens.append(_stem(word))
+        if len(words) > 1:
+            tokens.append(_stem("".join(words)))
+    return tokens
+
+def _text(value):
+    """All the strings in a content record, depth first. Field names are left out."""
+    if isinstance(value, str):
+        yield value
+    elif hasattr(value, "items"):
+        for key, item in value.items():
+            if key not in ("id", "slug"):
+                yield from _text(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _text(item)
+
+def _records(content):
+    """(kind, title, button text, button value, body text) for everything a user can open."""
+    index = content.index
+    for school_id, school in index.schools.items():
+        body = _text({k: v for k, v in school.items() if k != "name"})
+        yield "school", school["name"], school["name"], f"school_{school_id}", body
+    for course_id, course in index.courses.items():
+        school = index.schools.get(index.course_school[course_id], {})
+        details = course.get("details", {})
+        # The detail screens a course offers, so "btech fees" finds B.Tech courses
+        body = (school.get("name", ""), " ".join(details).replace("_", " "), *_text(details))
+        yield "course", course["name"], course["name"], f"course_{course_id}", body
+    for scholarship in index.scholarships.values():
+        body = _text({k: v for k, v in scholarship.items() if k != "title"})
+        yield "scholarship", scholarship["title"], *SECTIONS["scholarship"], body
+    campus = content.get("campus.json")
+    yield "campus", "Campus", *SECTIONS["campus"], _text(campus.get("overview", ""))
+    for key in ("infrastructure", "facilities", "technology_features"):
+        for item in campus.get(key, ()):
+            if hasattr(item, "get"):
+                yield "campus", item.get("title", ""), *SECTIONS["campus"], _text(item.get("description", ""))
+            else:
+                yield "campus", item, *SECTIONS["campus"], ()
+    yield "placements", "Placements", *SECTIONS["placements"], _text(content.get("placements.json"))
+    for event in index.events.values():
+        yield "event", event["name"], *SECTIONS["event"], _text({k: v for k, v in event.items() if k != "name"})
+    # The contact screen is not content driven, only its keywords are indexed
+    yield "contact", "Contact", *SECTIONS["contact"], ("phone call email address location admission office",)
+
+class SearchIndex:
+    """
+    BM25 inverted index over one content version.
+
+    Records are scored with BM25 one by one, then grouped by the screen
+    (button value) they open: a screen's weight for a term is the best weight
+    of any of its records, so the scholarships menu matches "sports
+    scholarship" as a whole and results never repeat a screen.
+
+    `postings` maps term -> {screen: weight} and `ranked` lists each term's
+    screens by descending weight.
+    """
+    __slots__ = ("version", "screens", "postings", "ranked", "sources", "records", "build_seconds")
+
+    def __init__(self, content):
+        start = time.perf_counter()
+        self.version = content.version
+        self.screens = []  # {"kind", "title", "text", "value"} of the first record on each screen
+        screen_of = {}
+        records = []  # (screen, title, kind, term counts)
+        for kind, title, text, value, body in _records(content):
+            counts = {}
+            for token in tokenize(title) * TITLE_WEIGHT + [t for part in body for t in tokenize(part)]:
+                counts[token] = counts.get(token, 0) + 1
+            if value not in screen_of:
+                screen_of[value] = len(self.screens)
+                self.screens.append({"kind": kind, "title": title, "text": text, "value": value})
+            records.append((screen_of[value], title, kind, counts))
+
+        n = len(records)
+        lengths = [sum(counts.values()) for _, _, _, counts in records]
+        average = (sum(lengths) / n) if n else 1.0
+        frequency = {}
+        for _, _, _, counts in records:
+            for token in counts:
+                frequency[token] = frequency.get(token, 0) + 1
+
+        shared = {screen for screen, count in Counter(screen for screen, *_ in records).items() if count > 1}
+        self.postings = {}
+        # (term, screen) -> record that gave the screen its weight, for screens with several records
+        self.sources = {}
+        for record, (screen, _, _, counts) in enumerate(records):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[record] / average)
+            for token, tf in counts.items():
+                idf = math.log(1 + (n - frequency[token] + 0.5) / (frequency[token] + 0.5))
+                weight = idf * tf * (BM25_K1 + 1) / (tf + norm)
+                postings = self.postings.setdefault(token, {})
+                if weight > postings.get(screen, 0.0):
+                    postings[screen] = weight
+                    if screen in shared:
+                        self.sources[token, screen] = record
+        self.records = [(title, kind) for _, title, kind, _ in records]
+        # Ties keep content order, so equally good results come out in file order
+        self.ranked = {
+            token: tuple(sorted(postings, key=lambda screen, p=postings: (-p[screen], screen)))
+            for token, postings in self.postings.items()
+        }
+        self.build_seconds = time.perf_counter() - start
+
+    def state(self) -> dict:
+        """The index as plain tuples, lists and dicts, for a compiled content snapshot."""
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_state(cls, state):
+        index = cls.__new__(cls)
+        for slot in cls.__slots__:
+            setattr(index, slot, state[slot])
+        return index
+
+    def search(self, query, limit=SEARCH_RESULTS):
+        """
+        The best `limit` screens for `query`.
+
+        The top `limit` screens of each term's ranking are scored first; the
+        `limit`-th best of those scores is a floor for the final results. A
+        screen that only appears in the posting lists of the commonest terms
+        cannot reach that floor if their best weights add up to less, and
+        the top of the single commonest list has already been scored, so only
+        the postings of the remaining rarer terms are read in full. A query
+        costs its rare terms' postings, however common its other terms are.
+        """
+        tokens = sorted({t for t in tokenize(query) if t in self.postings}, key=lambda t: len(self.postings[t]))
+        if not tokens or limit <= 0:
+            return []
+        lists = [self.postings[t] for t in tokens]
+
+        seeds = {}
+        for token in tokens:
+            for screen in self.ranked[token][:limit]:
+                if screen not in seeds:
+                    seeds[screen] = sum(p.get(screen, 0.0) for p in lists)
+        floor = heapq.nlargest(limit, seeds.values())[-1] if len(seeds) >= limit else 0.0
+
+        essential = len(lists) - 1
+        bound = self.postings[tokens[-1]][self.ranked[tokens[-1]][0]]
+        while essential > 0:
+            best = self.postings[tokens[essential - 1]][self.ranked[tokens[essential - 1]][0]]
+            if bound + best >= floor:
+                break
+            bound += best
+            essential -= 1
+
+        # Term at a time: accumulate the essential lists, then look the other terms up
+        scores = dict(lists[0]) if essential else {}
+        for postings in lists[1:essential]:
+            for screen, weight in postings.items():
+                scores[screen] = scores.get(screen, 0.0) + weight
+        if scores:
+            for postings in lists[essential:]:
+                scores = {screen: score + postings.get(screen, 0.0) for screen, score in scores.items()}
+        scores.update(seeds)
+
+        top = heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+        cutoff = top[0][1] * RELATIVE_CUTOFF
+        results = []
+        for screen, score in top:
+            if score < cutoff:
+                break
+            result = dict(self.screens[screen], score=round(score, 4))
+            # Name the record that matched best on screens listing several
+            strongest = max(tokens, key=lambda t: self.postings[t].get(screen, 0.0))
+            source = self.sources.get((strongest, screen))
+            if source is not None:
+                result["title"], result["kind"] = self.records[source]
+            results.append(result)
+        return results
+
+class SearchService:
+    """Holds the index for the current content version and rebuilds it after a reload."""
+
+    def __init__(self):
+        self.stats = {"queries": 0, "empty": 0, "builds": 0, "loaded": 0}
+        self._index = None
+        self._lock = threading.Lock()
+
+    def index(self) -> SearchIndex:
+        content = get_content()
+        index = self._index
+        if index is None or index.version != content.version:
+            with self._lock:
+                index = self._index
+                if index is None or index.version != content.version:
+                    # A compiled content snapshot may carry the index already built
+                    state = content.prebuilt.get("search")
+                    if state is not None and state["version"] == content.version:
+                        index = SearchIndex.from_state(state)
+                        self.stats["loaded"] += 1
+                        logger.info("Loaded prebuilt search index for content %s: %d records, %d terms",
+                                    index.version, len(index.records), len(index.postings))
+                    else:
+                        index = SearchIndex(content)
+                        self.stats["builds"] += 1
+                        logger.info("Built search index for content %s: %d records, %d terms in %.1f ms",
+                                    index.version, len(index.records), len(index.postings),
+                                    index.build_seconds * 1000)
+                    self._index = index
+        return index
+
+    def search(self, query, limit=SEARCH_RESULTS):
+        results = self.index().search(query, limit)
+        self.stats["queries"] += 1
+        if not results:
+            self.stats["empty"] += 1
+        return results
+
+    def get_stats(self):
+        index = self._index
+        return dict(
+            self.stats,
+            size=len(index.screens) if index else 0,
+            version=index.version if index else None,
+        )
+
+search_service = SearchService()
+register_stats("askgeeta_search", search_service.get_stats, "Free-text content search")
+
+def search(query, limit=SEARCH_RESULTS):
+    return search_service.search(query, limit)
@@ -1,49 +1,279 @@
+import contextvars
+import heapq
+import os
+import threading
 import uuid
 import time
-from typing import Dict, Any
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
 
-# In-memory session store
-# Structure: { session_id: { "name": str, "state": str, "timestamp": float, ... } }
-sessions: Dict[str, Dict[str, Any]] = {}
+from .log import get_logger
+from .metrics import register_stats
 
-SESSION_TIMEOUT = 3600  # 1 hour expiry for cleanup (optional safety)
+logger = get_logger(__name__)
 
-def create_session(name: str) -> str:
-    """Creates a new session for a user and returns the session ID."""
+SESSION_TIMEOUT = int(os.getenv("SESSION_TIMEOUT", "3600"))  # 1 hour idle expiry for verified sessions
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "50000"))
+SESSION_SWEEP_INTERVAL = float(os.getenv("SESSION_SWEEP_INTERVAL", "30"))
+
+# "memory" (single process), "sqlite" (shared file, WAL), "redis" (any Redis-protocol server)
+# or "token" (stateless: the session travels in a signed session_id)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+
+# Visitors who never finish verification should not hold memory for an hour
+STATE_TTLS = {
+    "AWAITING_MOBILE": 300,
+    "AWAITING_OTP": 600,
+}
+
+def state_ttl(state: str) -> int:
+    return STATE_TTLS.get(state, SESSION_TIMEOUT)
+
+def new_session(name: str) -> Dict[str, Any]:
     session_id = str(uuid.uuid4())
-    sessions[session_id] = {
+    return {
         "id": session_id,
         "name": name,
         "state": "main_menu", # Initial state after welcome
         "context": {}, # To store temporary selections (e.g. selected_school_id)
         "timestamp": time.time()
     }
-    return session_id
+
+class SessionStore:
+    """
+    Interface implemented by every session backend.
+
+    get() returns the live session dict; handlers read it directly but must
+    change state/context only through update() so shared backends persist it.
+    """
+
+    def create(self, name: str) -> str:
+        raise NotImplementedError
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def update(self, session_id: str, new_state: str, context_update: Dict = None):
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def current_id(self, session_id: str) -> str:
+        """The id to send back to the client; only changes for stores whose id encodes the session."""
+        return session_id
+
+    async def get_async(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """get() for async callers; stores whose reads block override it to read off the event loop."""
+        return self.get(session_id)
+
+    def begin_request(self):
+        """Drops per-request state. Called by long-lived connections before each message."""
+        pass
+
+    def sweep(self, now: float = None) -> int:
+        """Removes expired sessions; returns how many were removed."""
+        return 0
+
+    def start_sweeper(self):
+        pass
+
+    def stop_sweeper(self):
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {}
+
+class InMemorySessionStore(SessionStore):
+    """
+    Bounded in-process session store.
+
+    Sessions live in an OrderedDict kept in LRU order; creating a session past
+    `capacity` evicts the least recently used one. Expiry deadlines are kept in
+    a min-heap so a sweep only touches sessions that are actually due. Heap
+    entries are not updated on every access: when a popped entry turns out to
+    have been touched since, it is pushed back with its new deadline.
+    """
+
+    def __init__(self, capacity=SESSION_MAX_SESSIONS, sweep_interval=SESSION_SWEEP_INTERVAL):
+        self.capacity = capacity
+        self.sweep_interval = sweep_interval
+        self.stats = {"created": 0, "deleted": 0, "evictions": 0, "expiries": 0}
+        # Structure: { session_id: { "id": str, "name": str, "state": str, "context": dict, "timestamp": float } }
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._expiry_heap = []
+        self._next_sweep = time.time() + sweep_interval
+        self._lock = threading.RLock()
+        self._sweeper = None
+        self._stop = threading.Event()
+
+    def _deadline(self, session):
+        return session["timestamp"] + state_ttl(session["state"])
+
+    def create(self, name: str) -> str:
+        session = new_session(name)
+        session_id, now = session["id"], session["timestamp"]
+        with self._lock:
+            if now >= self._next_sweep:
+                self.sweep(now)
+            while len(self._sessions) >= self.capacity:
+                self._sessions.popitem(last=False)
+                self.stats["evictions"] += 1
+            self._sessions[session_id] = session
+            heapq.heappush(self._expiry_heap, (self._deadline(session), session_id))
+            self.stats["created"] += 1
+        return session_id
+
+    def get(self, session_id: str):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            now = time.time()
+            if now > self._deadline(session):
+                del self._sessions[session_id]
+                self.stats["expiries"] += 1
+                return None
+            # Update timestamp on access
+            session["timestamp"] = now
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def update(self, session_id: str, new_state: str, context_update: Dict = None):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            old_ttl = state_ttl(session["state"])
+            session["state"] = new_state
+            if context_update:
+                session["context"].update(context_update)
+            # A shorter TTL moves the deadline earlier than any entry already in the heap
+            if state_ttl(new_state) < old_ttl:
+                heapq.heappush(self._expiry_heap, (self._deadline(session), session_id))
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            if self._sessions.pop(session_id, None) is None:
+                return False
+            self.stats["deleted"] += 1
+            return True
+
+    def sweep(self, now: float = None) -> int:
+        """Expires every session whose deadline has passed. Returns how many were removed."""
+        now = now or time.time()
+        expired = 0
+        with self._lock:
+            heap = self._expiry_heap
+            while heap and heap[0][0] <= now:
+                _, session_id = heapq.heappop(heap)
+                session = self._sessions.get(session_id)
+                if session is None:
+                    continue  # already deleted/evicted
+                deadline = self._deadline(session)
+                if deadline > now:
+                    heapq.heappush(heap, (deadline, session_id))
+                    continue
+                del self._sessions[session_id]
+                expired += 1
+            # Drop stale entries left behind by deletes/evictions
+            if len(heap) > 2 * len(self._sessions) + 1024:
+                self._expiry_heap = [(self._deadline(s), sid) for sid, s in self._sessions.items()]
+                heapq.heapify(self._expiry_heap)
+            self.stats["expiries"] += expired
+            self._next_sweep = now + self.sweep_interval
+        return expired
+
+    def start_sweeper(self):
+        """Starts a daemon thread that sweeps expired sessions every `sweep_interval` seconds."""
+        if self._sweeper and self._sweeper.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(self.sweep_interval):
+                self.sweep()
+
+        self._sweeper = threading.Thread(target=run, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+    def get_stats(self):
+        return dict(self.stats, live=len(self._sessions), capacity=self.capacity)
+
+def make_store(backend: str = SESSION_BACKEND) -> SessionStore:
+    if backend == "memory":
+        return InMemorySessionStore()
+    if backend == "sqlite":
+        from .session_backends import SQLiteSessionStore
+        return SQLiteSessionStore()
+    if backend == "redis":
+        from .session_backends import RedisSessionStore
+        return RedisSessionStore()
+    if backend == "token":
+        from .session_tokens import TokenSessionStore
+        return TokenSessionStore()
+    raise ValueError(f"Unknown SESSION_BACKEND '{backend}' (expected memory, sqlite, redis or token)")
+
+store = make_store()
+register_stats("askgeeta_sessions", store.get_stats, "Session store")
+
+def create_session(name: str) -> str:
+    """Creates a new session for a user and returns the session ID."""
+    return store.create(name)
 
 def get_session(session_id: str):
     """Retrieves a session by ID."""
-    if session_id in sessions:
-        # Update timestamp on access
-        sessions[session_id]["timestamp"] = time.time()
-        return sessions[session_id]
-    return None
+    return store.get(session_id)
+
+async def get_session_async(session_id: str):
+    """Retrieves a session by ID without blocking the event loop on a shared backend."""
+    return await store.get_async(session_id)
 
 def delete_session(session_id: str):
     """Deletes a session by ID."""
-    if session_id in sessions:
-        del sessions[session_id]
-        print(f"DEBUG: Session {session_id} deleted")
+    if store.delete(session_id):
+        logger.debug("Session %s deleted", session_id)
+
+# Set by record_updates(): the state and context keys written in the current block
+_recorded_updates: contextvars.ContextVar = contextvars.ContextVar("session_updates", default=None)
+
+@contextmanager
+def record_updates():
+    """
+    Collects every update_session_state() call made inside the block as
+    {"state": last state written or None, "context": every key written}.
+    """
+    updates = {"state": None, "context": {}}
+    token = _recorded_updates.set(updates)
+    try:
+        yield updates
+    finally:
+        _recorded_updates.reset(token)
 
 def update_session_state(session_id: str, new_state: str, context_update: Dict = None):
     """Updates the state and context of a session."""
-    if session_id in sessions:
-        sessions[session_id]["state"] = new_state
+    updates = _recorded_updates.get()
+    if updates is not None:
+        updates["state"] = new_state
         if context_update:
-            sessions[session_id]["context"].update(context_update)
+            updates["context"].update(context_update)
+    store.update(session_id, new_state, context_update)
+
+def current_session_id(session_id: str) -> str:
+    """Returns the session id to send back, which may have changed during this request."""
+    return store.current_id(session_id) if session_id else session_id
+
+def begin_request():
+    """Starts a new request scope on a connection that handles many messages."""
+    store.begin_request()
 
 def cleanup_sessions():
-    """Removes old sessions."""
-    current_time = time.time()
-    to_remove = [sid for sid, data in sessions.items() if current_time - data["timestamp"] > SESSION_TIMEOUT]
-    for sid in to_remove:
-        del sessions[sid]
\ No newline at end of file
+    """Removes expired sessions."""
+    return store.sweep()
+
+def get_session_stats():
+    return store.get_stats()
@@ -0,0 +1,348 @@
+"""
+Shared session backends, so a user's next click can land on any worker or node.
+
+Both backends keep a small read-through cache of recently used sessions and
+write changes behind in batches: every create/update/delete marks the
+session dirty, and a flusher thread persists all dirty sessions in a single
+transaction/pipeline every SESSION_FLUSH_INTERVAL seconds. Repeated writes
+to the same session within one interval collapse into one. Reads that
+only refresh the idle timer persist just the new expiry, never the whole
+document, so they can't overwrite a newer state written by another worker.
+
+Another worker sees a change after at most SESSION_FLUSH_INTERVAL plus
+SESSION_CACHE_TTL. The defaults (0.05s + 0.5s) are well under the time a
+person takes to read a reply and click. Set SESSION_CACHE_TTL=0 to always
+read through. Backend reads block, so async callers use get_async(), which
+serves fresh cache entries directly and runs a backend read in a thread.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict
+
+from .data_loader import BASE_DIR
+from .session import SessionStore, SESSION_SWEEP_INTERVAL, new_session, state_ttl
+from .log import get_logger
+from .metrics import db_write_duration
+
+logger = get_logger(__name__)
+
+try:
+    import redis
+except ImportError:  # optional dependency, only needed for SESSION_BACKEND=redis
+    redis = None
+
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", str(BASE_DIR / "sessions.db"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "0.5"))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "0.05"))
+
+# Access timestamps are only re-persisted when they are older than this,
+# so idle-expiry tracking doesn't turn every read into a write.
+TOUCH_GRANULARITY = 15.0
+
+def _with_expiry(session, expires_at):
+    """A touch only moves the stored expiry, so the idle timer restarts from it, not from the document."""
+    session["timestamp"] = max(session["timestamp"], expires_at - state_ttl(session["state"]))
+    return session
+
+class SharedSessionStore(SessionStore):
+    """Read-through cache and write-behind batching on top of a key/value backend."""
+
+    def __init__(self, cache_ttl=SESSION_CACHE_TTL, cache_size=SESSION_CACHE_SIZE,
+                 flush_interval=SESSION_FLUSH_INTERVAL, sweep_interval=SESSION_SWEEP_INTERVAL):
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+        self.stats = {"created": 0, "deleted": 0, "expiries": 0, "cache_hits": 0,
+                      "cache_misses": 0, "flushes": 0, "rows_written": 0, "write_errors": 0}
+        self._cache = OrderedDict()   # session_id -> (cached_at, session)
+        self._pending = {}            # session_id -> session dict, or None for a delete
+        self._touched = {}            # session_id -> session whose expiry alone needs writing
+        self._persisted_at = {}       # session_id -> timestamp last written, for cached sessions only
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    # --- backend hooks ---
+
+    def _load(self, session_id):
+        raise NotImplementedError
+
+    def _write_batch(self, upserts, touches, deletes):
+        """
+        upserts: [(session_id, json_data, expires_at)], touches: [(session_id, expires_at)]
+        (only the expiry of an existing session changes), deletes: [session_id]
+        """
+        raise NotImplementedError
+
+    def _delete_expired(self, now) -> int:
+        return 0
+
+    def _count_live(self):
+        return None
+
+    # --- SessionStore ---
+
+    def _remember(self, session, now):
+        self._cache[session["id"]] = (now, session)
+        self._cache.move_to_end(session["id"])
+        while len(self._cache) > self.cache_size:
+            evicted, _ = self._cache.popitem(last=False)
+            self._persisted_at.pop(evicted, None)
+
+    def _mark_dirty(self, session):
+        self._pending[session["id"]] = session
+        self._touched.pop(session["id"], None)
+        self._persisted_at[session["id"]] = session["timestamp"]
+
+    def _touch(self, session):
+        if session["id"] not in self._pending:
+            self._touched[session["id"]] = session
+        self._persisted_at[session["id"]] = session["timestamp"]
+
+    def create(self, name: str) -> str:
+        session = new_session(name)
+        with self._lock:
+            self._remember(session, time.time())
+            self._mark_dirty(session)
+            self.stats["created"] += 1
+        return session["id"]
+
+    def _lookup(self, session_id, now, fresh=True):
+        """`fresh=False` accepts a cached copy of any age (the caller's request has just read it)."""
+        cached = self._cache.get(session_id)
+        if cached and (not fresh or now - cached[0] < self.cache_ttl):
+            self.stats["cache_hits"] += 1
+            return cached[1]
+        if session_id in self._pending:
+            session = self._pending[session_id]
+            if session is not None:
+                self._remember(session, now)
+            return session
+        self.stats["cache_misses"] += 1
+        session = self._load(session_id)
+        if session is not None:
+            self._persisted_at[session_id] = session["timestamp"]
+            self._remember(session, now)
+        return session
+
+    def get(self, session_id: str):
+        if not session_id:
+            return None
+        now = time.time()
+        with self._lock:
+            session = self._lookup(session_id, now)
+            if session is None:
+                return None
+            if now > session["timestamp"] + state_ttl(session["state"]):
+                self._forget(session_id)
+                self.stats["expiries"] += 1
+                return None
+            # Update timestamp on access
+            session["timestamp"] = now
+            if now - self._persisted_at.get(session_id, 0) > TOUCH_GRANULARITY:
+                self._touch(session)
+            return session
+
+    async def get_async(self, session_id: str):
+        if session_id:
+            with self._lock:
+                cached = self._cache.get(session_id)
+                in_memory = (cached and time.time() - cached[0] < self.cache_ttl) or session_id in self._pending
+            if in_memory:
+                return self.get(session_id)
+        return await asyncio.to_thread(self.get, session_id)
+
+    def update(self, session_id: str, new_state: str, context_update: Dict = None):
+        # Updates follow a get() in the same request, so the cached copy is current
+        with self._lock:
+            session = self._lookup(session_id, time.time(), fresh=False)
+            if session is None:
+                return
+            session["state"] = new_state
+            if context_update:
+                session["context"].update(context_update)
+            self._mark_dirty(session)
+
+    def _forget(self, session_id):
+        self._cache.pop(session_id, None)
+        self._persisted_at.pop(session_id, None)
+        self._touched.pop(session_id, None)
+        self._pending[session_id] = None
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            exists = self._lookup(session_id, time.time(), fresh=False) is not None
+            self._forget(session_id)
+            if exists:
+                self.stats["deleted"] += 1
+            return exists
+
+    def flush(self):
+        """Writes all dirty sessions in one batch. Failed batches are re-queued."""
+        with self._lock:
+            if not self._pending and not self._touched:
+                return
+            pending, self._pending = self._pending, {}
+            touched, self._touched = self._touched, {}
+            # Serialize under the lock: handlers may be mutating these dicts
+            upserts = [
+                (sid, json.dumps(s, separators=(",", ":")), s["timestamp"] + state_ttl(s["state"]))
+                for sid, s in pending.items() if s is not None
+            ]
+            touches = [(sid, s["timestamp"] + state_ttl(s["state"])) for sid, s in touched.items()]
+            deletes = [sid for sid, s in pending.items() if s is None]
+        start = time.perf_counter()
+        try:
+            self._write_batch(upserts, touches, deletes)
+        except Exception as e:
+            logger.error("Session flush of %d rows failed, will retry: %s", len(pending) + len(touched), e)
+            with self._lock:
+                self.stats["write_errors"] += 1
+                for sid, s in pending.items():
+                    self._pending.setdefault(sid, s)
+                for sid, s in touched.items():
+                    if sid not in self._pending:
+                        self._touched.setdefault(sid, s)
+            return
+        db_write_duration.observe(time.perf_counter() - start, ("sessions",))
+        with self._lock:
+            self.stats["flushes"] += 1
+            self.stats["rows_written"] += len(pending) + len(touched)
+
+    def sweep(self, now: float = None) -> int:
+        expired = self._delete_expired(now or time.time())
+        with self._lock:
+            self.stats["expiries"] += expired
+        return expired
+
+    def start_sweeper(self):
+        if self._threads:
+            return
+        self._stop.clear()
+
+        def flusher():
+            while not self._stop.wait(self.flush_interval):
+                self.flush()
+
+        def sweeper():
+            while not self._stop.wait(self.sweep_interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.error("Session sweep failed: %s", e)
+
+        for target, name in ((flusher, "session-flusher"), (sweeper, "session-sweeper")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop_sweeper(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        self.flush()
+
+    def get_stats(self):
+        return dict(self.stats, live=self._count_live(), cached=len(self._cache),
+                    pending=len(self._pending) + len(self._touched))
+
+class SQLiteSessionStore(SharedSessionStore):
+    """Sessions in a SQLite file in WAL mode, shared by every worker on the host."""
+
+    def __init__(self, path=SESSION_DB_PATH, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_expires_at ON sessions (expires_at)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _load(self, session_id):
+        row = self._conn().execute(
+            "SELECT data, expires_at FROM sessions WHERE id = ? AND expires_at > ?", (session_id, time.time())
+        ).fetchone()
+        return _with_expiry(json.loads(row[0]), row[1]) if row else None
+
+    def _write_batch(self, upserts, touches, deletes):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if upserts:
+                conn.executemany(
+                    "INSERT INTO sessions (id, data, expires_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at",
+                    upserts,
+                )
+            if touches:
+                conn.executemany("UPDATE sessions SET expires_at = MAX(expires_at, ?) WHERE id = ?",
+                                 [(expires_at, sid) for sid, expires_at in touches])
+            if deletes:
+                conn.executemany("DELETE FROM sessions WHERE id = ?", [(sid,) for sid in deletes])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _delete_expired(self, now):
+        return self._conn().execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+
+    def _count_live(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM sessions WHERE expires_at > ?", (time.time(),)
+        ).fetchone()[0]
+
+class RedisSessionStore(SharedSessionStore):
+    """
+    Sessions in any Redis-protocol server (Redis, Valkey, KeyDB, Dragonfly...).
+    Expiry is delegated to the server via per-key TTLs, so sweep() is a no-op.
+    """
+
+    KEY_PREFIX = "askgeeta:session:"
+
+    def __init__(self, url=REDIS_URL, **kwargs):
+        if redis is None:
+            raise RuntimeError("SESSION_BACKEND=redis requires the 'redis' package (pip install redis)")
+        super().__init__(**kwargs)
+        self.client = redis.Redis.from_url(url)
+
+    def _load(self, session_id):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(self.KEY_PREFIX + session_id)
+        pipe.pttl(self.KEY_PREFIX + session_id)
+        data, ttl_ms = pipe.execute()
+        if not data:
+            return None
+        return _with_expiry(json.loads(data), time.time() + ttl_ms / 1000) if ttl_ms > 0 else json.loads(data)
+
+    def _write_batch(self, upserts, touches, deletes):
+        pipe = self.client.pipeline(transaction=False)
+        now = time.time()
+        for sid, data, expires_at in upserts:
+            pipe.set(self.KEY_PREFIX + sid, data, px=max(1, int((expires_at - now) * 1000)))
+        for sid, expires_at in touches:
+            pipe.pexpire(self.KEY_PREFIX + sid, max(1, int((expires_at - now) * 1000)))
+        if deletes:
+            pipe.delete(*[self.KEY_PREFIX + sid for sid in deletes])
+        pipe.execute()
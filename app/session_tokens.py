@@ -0,0 +1,94 @@
+"""
+Stateless sessions: the whole session travels in a signed token used as the session_id.
+
+Any worker on any node can serve any request without a lookup, and the server
+holds no memory per visitor. Because the token changes whenever the session
+changes, update() re-signs it and stores the new token in session["id"];
+callers that captured the old id earlier in the same request resolve it with
+current_id(). Tokens are signed, not encrypted: the client can read its own
+name, state and context (e.g. the mobile number it typed), but not alter them.
+"""
+import contextvars
+import time
+from typing import Dict
+
+from .session import SessionStore, new_session, state_ttl
+from .signing import Signer, load_keys
+
+# Sessions decoded/updated during the current request: token -> live session dict
+_live: contextvars.ContextVar = contextvars.ContextVar("token_sessions")
+
+class TokenSessionStore(SessionStore):
+
+    def __init__(self, signer: Signer = None):
+        self.signer = signer or Signer(load_keys("SESSION_SIGNING_KEYS"))
+        self.stats = {"created": 0, "reissued": 0}
+
+    def _live_sessions(self):
+        live = _live.get(None)
+        if live is None:
+            live = {}
+            _live.set(live)
+        return live
+
+    def _issue(self, session):
+        """Signs the session and makes the new token its id."""
+        payload = {"k": session["key"], "n": session["name"], "s": session["state"], "c": session["context"],
+                   "t": int(session["timestamp"])}
+        token = self.signer.sign(payload, state_ttl(session["state"]))
+        session["id"] = token
+        self._live_sessions()[token] = session
+        return token
+
+    def create(self, name: str) -> str:
+        session = new_session(name)
+        # The id changes with every re-issue; "key" stays stable for per-session limits
+        session["key"] = session["id"]
+        self.stats["created"] += 1
+        return self._issue(session)
+
+    def get(self, session_id: str):
+        if not session_id:
+            return None
+        live = self._live_sessions()
+        if session_id in live:
+            return live[session_id]
+        payload = self.signer.verify(session_id)
+        if payload is None:
+            return None
+        now = time.time()
+        session = {"id": session_id, "key": payload["k"], "name": payload["n"], "state": payload["s"],
+                   "context": payload["c"], "timestamp": now}
+        live[session_id] = session
+        # Sliding expiry: re-issue once more than half the lifetime is used up
+        if payload["e"] - now < state_ttl(session["state"]) / 2:
+            self._issue(session)
+            self.stats["reissued"] += 1
+        return session
+
+    def update(self, session_id: str, new_state: str, context_update: Dict = None):
+        session = self.get(session_id)
+        if session is None:
+            return
+        session["state"] = new_state
+        if context_update:
+            session["context"].update(context_update)
+        self._issue(session)
+
+    def begin_request(self):
+        # A WebSocket handles every message in one context; without this the
+        # live sessions of the whole connection would pile up here
+        _live.set({})
+
+    def delete(self, session_id: str) -> bool:
+        # Nothing to delete server-side; the client drops the token. It stays
+        # valid until it expires, exactly like a leaked cookie would.
+        self._live_sessions().pop(session_id, None)
+        return True
+
+    def current_id(self, session_id: str) -> str:
+        session = self._live_sessions().get(session_id)
+        return session["id"] if session else session_id
+
+    def get_stats(self):
+        return dict(self.stats, **self.signer.stats)
@@ -0,0 +1,88 @@
+"""
+Compact HMAC-signed tokens with key rotation.
+
+A token is `<kid>.<payload>.<signature>`: the key id, the base64url-encoded
+compact JSON payload and a truncated HMAC-SHA256 over both. Tokens are
+signed with the first configured key and verified with any of them, so a
+key is rotated by prepending a new one and removing the old one once its
+tokens have expired. Payloads are signed, not encrypted.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from typing import Optional
+
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+SIGNATURE_BYTES = 16
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def load_keys(env_var: str):
+    """
+    Reads `kid:secret,kid:secret,...` from the environment (first key signs).
+    Without it, a random per-process key is used, which only works with a single worker.
+    """
+    raw = os.getenv(env_var, "")
+    keys = []
+    for item in filter(None, (part.strip() for part in raw.split(","))):
+        kid, sep, secret = item.partition(":")
+        if not sep or not kid or not secret or "." in kid:
+            raise ValueError(f"{env_var} entries must look like 'kid:secret' (got '{item}')")
+        keys.append((kid, secret.encode("utf-8")))
+    if not keys:
+        logger.warning("%s not set; using a random key, which is lost on restart and differs between workers.", env_var)
+        keys.append(("dev", secrets.token_bytes(32)))
+    return keys
+
+class Signer:
+    def __init__(self, keys):
+        if not keys:
+            raise ValueError("At least one signing key is required")
+        self.keys = dict(keys)
+        self.active_kid = keys[0][0]
+        self.stats = {"signed": 0, "verified": 0, "rejected": 0, "expired": 0}
+
+    def _signature(self, secret: bytes, signed_part: str) -> str:
+        digest = hmac.new(secret, signed_part.encode("ascii"), hashlib.sha256).digest()
+        return _b64encode(digest[:SIGNATURE_BYTES])
+
+    def sign(self, payload: dict, ttl: float) -> str:
+        """Signs `payload` plus an expiry `ttl` seconds from now (stored under "e")."""
+        body = dict(payload, e=int(time.time() + ttl))
+        encoded = _b64encode(json.dumps(body, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+        signed_part = f"{self.active_kid}.{encoded}"
+        self.stats["signed"] += 1
+        return f"{signed_part}.{self._signature(self.keys[self.active_kid], signed_part)}"
+
+    def verify(self, token: str) -> Optional[dict]:
+        """Returns the payload of a valid, unexpired token, else None."""
+        try:
+            kid, encoded, signature = token.split(".")
+        except (AttributeError, ValueError):
+            self.stats["rejected"] += 1
+            return None
+        secret = self.keys.get(kid)
+        if secret is None or not hmac.compare_digest(signature, self._signature(secret, f"{kid}.{encoded}")):
+            self.stats["rejected"] += 1
+            return None
+        try:
+            payload = json.loads(_b64decode(encoded))
+        except ValueError:
+            self.stats["rejected"] += 1
+            return None
+        if payload.get("e", 0) < time.time():
+            self.stats["expired"] += 1
+            return None
+        self.stats["verified"] += 1
+        return payload
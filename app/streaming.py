@@ -0,0 +1,72 @@
+"""
+Frame protocol shared by the WebSocket and SSE chat transports, and the
+NDJSON encoding of /api/message.
+
+Instead of one JSON body, a BotResponse goes out as a sequence of frames:
+
+    {"type": "typing"}                    the next bubble is on its way
+    {"type": "message", "text": "..."}    one chat bubble
+    {"type": "input", "session_id": ..., "buttons": [...], "input_type": ..., "placeholder": ...}
+                                          end of the response: what the user can do next
+                                          (plus "prefetched" when the request asked for it)
+    {"type": "error", "detail": "..."}    the request could not be handled
+
+Bubbles after the first are paced by the server, CHAT_BUBBLE_DELAY seconds
+apart and each announced by a typing frame, so clients just render frames as
+they arrive instead of running their own timers. A client may ask for a
+shorter delay (e.g. 0 for tests and benchmarks) but not a longer one.
+
+NDJSON replies put what the client needs to lay out the screen first, so the
+first bubble can be shown as soon as its line arrives:
+
+    {"session_id": ..., "input_type": ..., "placeholder": ..., "buttons": [...]}
+    {"message": "..."}                    one line per bubble
+"""
+import asyncio
+import os
+
+from .responses import dumps
+
+CHAT_BUBBLE_DELAY = float(os.getenv("CHAT_BUBBLE_DELAY", "1.0"))
+
+def bubble_delay(requested=None) -> float:
+    if requested is None:
+        return CHAT_BUBBLE_DELAY
+    return min(max(requested, 0.0), CHAT_BUBBLE_DELAY)
+
+async def bot_frames(body, delay=CHAT_BUBBLE_DELAY):
+    """Yields the frames for a BotResponse body (as produced by responses.bot_response_body)."""
+    for index, text in enumerate(body["messages"]):
+        if index and delay > 0:
+            yield {"type": "typing"}
+            await asyncio.sleep(delay)
+        yield {"type": "message", "text": text}
+    end = {
+        "type": "input",
+        "session_id": body["session_id"],
+        "buttons": body["buttons"],
+        "input_type": body["input_type"],
+        "placeholder": body["placeholder"],
+    }
+    if "prefetched" in body:
+        end["prefetched"] = body["prefetched"]
+    yield end
+
+async def ndjson_lines(body, delay=0.0):
+    """Yields a BotResponse body as NDJSON: a header line, then one line per bubble."""
+    header = {key: body[key] for key in ("session_id", "input_type", "placeholder", "buttons")}
+    if "prefetched" in body:
+        header["prefetched"] = body["prefetched"]
+    yield dumps(header) + b"\n"
+    for index, text in enumerate(body["messages"]):
+        if index and delay > 0:
+            await asyncio.sleep(delay)
+        yield dumps({"message": text}) + b"\n"
+
+def sse_event(frame) -> bytes:
+    return b"data: " + dumps(frame) + b"\n\n"
+
+socket_stats = {"opened": 0, "live": 0, "received": 0, "rejected": 0}
+
+def get_socket_stats():
+    return dict(socket_stats)
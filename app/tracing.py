@@ -0,0 +1,94 @@
+"""
+Lightweight request tracing.
+
+trace() opens the root span of a request and decides up front whether the
+request is sampled (TRACE_SAMPLE_RATE). Nested span() calls record child
+spans only inside a sampled trace; otherwise they return a shared no-op
+context manager, so unsampled requests pay one contextvar lookup per span.
+
+Finished traces go to an in-memory ring buffer of TRACE_BUFFER_SIZE traces
+(readable through /debug/traces) and, if TRACE_EXPORT_PATH is set, are
+appended as one JSON line per trace by a background thread.
+"""
+import contextvars
+import os
+import random
+import secrets
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+from .log import JsonlAppender
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH")
+
+# (trace dict, id of the innermost open span) for the current request, or None
+_current = contextvars.ContextVar("trace", default=None)
+_NOOP = nullcontext()
+
+class TraceExporter:
+    """Keeps the last `buffer_size` traces and optionally appends them to a JSONL file."""
+
+    def __init__(self, buffer_size=TRACE_BUFFER_SIZE, path=TRACE_EXPORT_PATH):
+        self.buffer = deque(maxlen=buffer_size)
+        self.file = JsonlAppender(path, name="trace-writer") if path else None
+        self.stats = {"started": 0, "sampled": 0}
+
+    def export(self, trace):
+        self.buffer.append(trace)
+        if self.file:
+            self.file.append(trace)
+
+    def recent(self, limit=50):
+        return list(self.buffer)[-limit:]
+
+    def get_stats(self):
+        exported = self.file.stats if self.file else {}
+        return dict(self.stats, buffered=len(self.buffer), **exported)
+
+exporter = TraceExporter()
+
+@contextmanager
+def _record(name, attrs, sampled_trace=None):
+    trace, parent_id = sampled_trace or _current.get()
+    span = {"id": secrets.token_hex(4), "parent": parent_id, "name": name, "start": time.time()}
+    if attrs:
+        span["attrs"] = attrs
+    trace["spans"].append(span)
+    token = _current.set((trace, span["id"]))
+    start = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        span["error"] = repr(e)
+        raise
+    finally:
+        span["ms"] = round((time.perf_counter() - start) * 1000, 3)
+        _current.reset(token)
+
+def span(name, **attrs):
+    """Child span of the current trace; a no-op outside a sampled trace."""
+    if _current.get() is None:
+        return _NOOP
+    return _record(name, attrs)
+
+@contextmanager
+def trace(name, sample_rate=None, **attrs):
+    """Root span of a request. Sampled traces are exported when the block exits."""
+    exporter.stats["started"] += 1
+    rate = TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+    if _current.get() is not None or not rate or random.random() >= rate:
+        yield None
+        return
+    exporter.stats["sampled"] += 1
+    trace = {"trace_id": secrets.token_hex(8), "spans": []}
+    try:
+        with _record(name, attrs, (trace, None)) as root:
+            yield root
+    finally:
+        exporter.export(trace)
+
+def get_stats():
+    return exporter.get_stats()
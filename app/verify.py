@@ -0,0 +1,303 @@
+"""
+Non-blocking phone verification.
+
+The Twilio SDK is synchronous, so calls run on a small dedicated thread pool
+and the event loop only awaits them. Every call has a hard deadline and goes
+through a circuit breaker: after repeated infrastructure failures (timeouts,
+connection errors, 5xx) the breaker opens and calls fail fast for a cooldown
+period instead of tying up threads and users. User errors such as an invalid
+number are not infrastructure failures and don't trip it.
+
+The same services can also deliver a plain SMS (deliver()), which is all
+app/otp.py needs when codes are generated and checked locally
+(OTP_MODE=local); TwilioSmsSender does only that, through Twilio Messaging.
+
+VERIFY_BACKEND=fake swaps in FakeVerifyService, an in-process stand-in with
+configurable latency and error rate for offline load tests.
+benchmarks/fake_verify_server.py serves the same fake over HTTP; point the
+real client at it with TWILIO_VERIFY_BASE_URL.
+"""
+import asyncio
+import os
+import random
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.adapters import HTTPAdapter
+from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
+from twilio.base.exceptions import TwilioRestException, TwilioServiceException
+
+from .metrics import verify_call_duration
+from . import tracing
+
+VERIFY_BACKEND = os.getenv("VERIFY_BACKEND", "twilio")
+VERIFY_TIMEOUT = float(os.getenv("VERIFY_TIMEOUT", "5"))
+VERIFY_POOL_SIZE = int(os.getenv("VERIFY_POOL_SIZE", "16"))
+VERIFY_BREAKER_FAILURES = int(os.getenv("VERIFY_BREAKER_FAILURES", "5"))
+VERIFY_BREAKER_COOLDOWN = float(os.getenv("VERIFY_BREAKER_COOLDOWN", "30"))
+TWILIO_VERIFY_BASE_URL = os.getenv("TWILIO_VERIFY_BASE_URL")
+# Sender for OTP_MODE=local: a phone number, or a Messaging Service SID (MG...)
+TWILIO_SMS_FROM = os.getenv("TWILIO_SMS_FROM")
+
+# Twilio error codes used by the router to pick user-facing messages
+INVALID_NUMBER = 60200
+UNSUPPORTED_NUMBER = 60203
+MAX_CHECK_ATTEMPTS = 60202
+NOT_FOUND = 20404
+
+class VerifyError(Exception):
+    """The provider rejected the request (bad number, expired verification, ...)."""
+
+    def __init__(self, message, code=None, status=None):
+        super().__init__(message)
+        self.code = code
+        self.status = status
+
+class VerifyUnavailable(VerifyError):
+    """The provider could not be reached in time, or the circuit breaker is open."""
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures. While open, allow()
+    returns False until `cooldown` seconds have passed; then a single trial
+    call is let through (half-open) and its outcome closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold=VERIFY_BREAKER_FAILURES, cooldown=VERIFY_BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.stats = {"opened": 0, "rejected": 0}
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        self.stats["rejected"] += 1
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def release(self):
+        """The call ended without an outcome (cancelled); let the next one be the trial."""
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                self.stats["opened"] += 1
+            self.opened_at = time.monotonic()
+
+class VerifyService:
+    """
+    Base class: send() starts a verification, check() returns True if the code
+    is approved, deliver() sends an arbitrary SMS.
+    """
+
+    def __init__(self, timeout=VERIFY_TIMEOUT, breaker=None):
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.stats = {"calls": 0, "errors": 0, "timeouts": 0}
+
+    async def _guarded(self, op, make_call):
+        if not self.breaker.allow():
+            verify_call_duration.observe(0.0, (op, "circuit_open"))
+            raise VerifyUnavailable("Verification provider unavailable (circuit open)")
+        self.stats["calls"] += 1
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            with tracing.span("verify." + op):
+                result = await asyncio.wait_for(make_call(), self.timeout)
+        except VerifyUnavailable:
+            outcome = "error"
+            self.stats["errors"] += 1
+            self.breaker.record_failure()
+            raise
+        except VerifyError:
+            # The provider answered; it just said no
+            outcome = "rejected"
+            self.stats["errors"] += 1
+            self.breaker.record_success()
+            raise
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            self.stats["timeouts"] += 1
+            self.breaker.record_failure()
+            raise VerifyUnavailable(f"Verification provider timed out after {self.timeout}s")
+        except asyncio.CancelledError:
+            # The client went away mid-call. Not a verdict on the provider, but a
+            # half-open trial must be released or the breaker never closes again.
+            outcome = "cancelled"
+            self.breaker.release()
+            raise
+        except Exception as e:
+            outcome = "error"
+            self.stats["errors"] += 1
+            self.breaker.record_failure()
+            raise VerifyUnavailable(f"Verification provider error: {e}") from e
+        finally:
+            verify_call_duration.observe(time.perf_counter() - start, (op, outcome))
+        self.breaker.record_success()
+        return result
+
+    async def send(self, to: str) -> str:
+        return await self._guarded("send", lambda: self._send(to))
+
+    async def check(self, to: str, code: str) -> bool:
+        return await self._guarded("check", lambda: self._check(to, code))
+
+    async def deliver(self, to: str, body: str):
+        return await self._guarded("deliver", lambda: self._deliver(to, body))
+
+    async def _send(self, to):
+        raise NotImplementedError
+
+    async def _check(self, to, code):
+        raise NotImplementedError
+
+    async def _deliver(self, to, body):
+        raise NotImplementedError
+
+    def get_stats(self):
+        return dict(self.stats, breaker=self.breaker.state, **self.breaker.stats)
+
+class TwilioService(VerifyService):
+    """Shared setup: the synchronous SDK on a bounded thread pool with pooled connections."""
+
+    def __init__(self, account_sid, auth_token, pool_size=VERIFY_POOL_SIZE, **kwargs):
+        super().__init__(**kwargs)
+        http_client = TwilioHttpClient(pool_connections=True, timeout=self.timeout)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        http_client.session.mount("https://", adapter)
+        http_client.session.mount("http://", adapter)
+        self.client = Client(account_sid, auth_token, http_client=http_client)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="twilio-verify")
+
+    async def _run(self, fn):
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, fn)
+        except (TwilioRestException, TwilioServiceException) as e:
+            if e.status is not None and int(e.status) >= 500:
+                raise VerifyUnavailable(str(e), code=e.code, status=e.status) from e
+            raise VerifyError(str(e), code=e.code, status=e.status) from e
+
+class TwilioVerifyService(TwilioService):
+    """Twilio Verify v2: Twilio generates, delivers and checks the code."""
+
+    def __init__(self, account_sid, auth_token, service_sid, base_url=TWILIO_VERIFY_BASE_URL, **kwargs):
+        super().__init__(account_sid, auth_token, **kwargs)
+        if base_url:
+            self.client.verify.base_url = base_url.rstrip("/")
+        self.service = self.client.verify.v2.services(service_sid)
+
+    async def _send(self, to):
+        verification = await self._run(lambda: self.service.verifications.create(to=to, channel="sms"))
+        return verification.status
+
+    async def _check(self, to, code):
+        check = await self._run(lambda: self.service.verification_checks.create(to=to, code=code))
+        return check.status == "approved"
+
+class TwilioSmsSender(TwilioService):
+    """Plain SMS through Twilio Messaging, for codes generated by app/otp.py."""
+
+    def __init__(self, account_sid, auth_token, sender=TWILIO_SMS_FROM, **kwargs):
+        super().__init__(account_sid, auth_token, **kwargs)
+        self.sender = {"messaging_service_sid": sender} if sender.startswith("MG") else {"from_": sender}
+
+    async def _deliver(self, to, body):
+        message = await self._run(lambda: self.client.messages.create(to=to, body=body, **self.sender))
+        return message.sid
+
+class FakeVerifyService(VerifyService):
+    """
+    In-process stand-in for Twilio Verify. Accepts `code` for any number it
+    sent to, rejects numbers that don't look like E.164 with INVALID_NUMBER,
+    sleeps `latency` seconds (plus up to `jitter`) and fails `error_rate` of
+    calls with a 503, so timeouts and the circuit breaker can be exercised.
+    """
+
+    E164 = re.compile(r"^\+[1-9]\d{7,14}$")
+
+    def __init__(self, latency=None, jitter=None, error_rate=None, code=None, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = float(os.getenv("VERIFY_FAKE_LATENCY", "0.05")) if latency is None else latency
+        self.jitter = float(os.getenv("VERIFY_FAKE_JITTER", "0.02")) if jitter is None else jitter
+        self.error_rate = float(os.getenv("VERIFY_FAKE_ERROR_RATE", "0")) if error_rate is None else error_rate
+        self.code = code or os.getenv("VERIFY_FAKE_CODE", "123456")
+        self.pending = {}
+        self.outbox = OrderedDict()  # number -> last SMS body delivered
+
+    async def _simulate(self):
+        await asyncio.sleep(self.latency + random.random() * self.jitter)
+        if random.random() < self.error_rate:
+            raise VerifyUnavailable("Fake provider error", code=20500, status=503)
+
+    async def _send(self, to):
+        await self._simulate()
+        if not self.E164.match(to):
+            raise VerifyError(f"Invalid parameter `To`: {to}", code=INVALID_NUMBER, status=400)
+        now = time.time()
+        if len(self.pending) > 10000:
+            # Verifications expire after 10 minutes at Twilio too
+            self.pending = {k: t for k, t in self.pending.items() if now - t < 600}
+        self.pending[to] = now
+        return "pending"
+
+    async def _check(self, to, code):
+        await self._simulate()
+        if to not in self.pending:
+            raise VerifyError("The requested resource was not found", code=NOT_FOUND, status=404)
+        if code != self.code:
+            return False
+        del self.pending[to]
+        return True
+
+    async def _deliver(self, to, body):
+        await self._simulate()
+        if not self.E164.match(to):
+            raise VerifyError(f"Invalid parameter `To`: {to}", code=INVALID_NUMBER, status=400)
+        self.outbox[to] = body
+        self.outbox.move_to_end(to)
+        while len(self.outbox) > 10000:
+            self.outbox.popitem(last=False)
+        return "queued"
+
+def make_verify_service(account_sid, auth_token, service_sid, backend=VERIFY_BACKEND):
+    """Returns the configured service, or None in dev mode (no credentials, no fake)."""
+    if backend == "fake":
+        return FakeVerifyService()
+    if account_sid and auth_token and service_sid:
+        return TwilioVerifyService(account_sid, auth_token, service_sid)
+    return None
+
+def make_sms_sender(account_sid, auth_token, backend=VERIFY_BACKEND):
+    """Returns a service that can deliver() OTP messages, or None in dev mode."""
+    if backend == "fake":
+        return FakeVerifyService()
+    if account_sid and auth_token and TWILIO_SMS_FROM:
+        return TwilioSmsSender(account_sid, auth_token)
+    return None
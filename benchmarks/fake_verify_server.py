@@ -0,0 +1,77 @@
+"""
+Local stand-in for the Twilio Verify v2 HTTP API, for load-testing OTP flows offline.
+
+Usage (from the project root):
+    python -m benchmarks.fake_verify_server --port 8081 --latency 0.2 --error-rate 0.05
+
+Then start the app against it:
+    TWILIO_ACCOUNT_SID=ACfake TWILIO_AUTH_TOKEN=fake TWILIO_VERIFY_SERVICE_SID=VAfake \\
+    TWILIO_VERIFY_BASE_URL=http://127.0.0.1:8081 uvicorn app.main:app
+
+Every number is accepted except non-E.164 ones (error 60200); the code is
+always --code. --error-rate of requests fail with a 503.
+"""
+import argparse
+import os
+import sys
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Form
+from fastapi.responses import JSONResponse
+
+from app.verify import FakeVerifyService, VerifyError
+
+def create_app(fake: FakeVerifyService) -> FastAPI:
+    app = FastAPI(title="Fake Twilio Verify")
+
+    def error(e: VerifyError):
+        return JSONResponse(
+            status_code=e.status or 400,
+            content={"code": e.code, "message": str(e), "more_info": f"https://www.twilio.com/docs/errors/{e.code}",
+                     "status": e.status or 400},
+        )
+
+    def verification(service_sid, to, status, channel="sms"):
+        return {"sid": "VE" + uuid.uuid4().hex, "service_sid": service_sid, "account_sid": "ACfake",
+                "to": to, "channel": channel, "status": status, "valid": status == "approved"}
+
+    @app.post("/v2/Services/{service_sid}/Verifications")
+    async def create_verification(service_sid: str, To: str = Form(...), Channel: str = Form("sms")):
+        try:
+            status = await fake._send(To)
+        except VerifyError as e:
+            return error(e)
+        return JSONResponse(status_code=201, content=verification(service_sid, To, status, Channel))
+
+    @app.post("/v2/Services/{service_sid}/VerificationCheck")
+    async def check_verification(service_sid: str, To: str = Form(...), Code: str = Form(...)):
+        try:
+            approved = await fake._check(To, Code)
+        except VerifyError as e:
+            return error(e)
+        return verification(service_sid, To, "approved" if approved else "pending")
+
+    @app.get("/stats")
+    async def stats():
+        return {"pending": len(fake.pending), "latency": fake.latency, "error_rate": fake.error_rate}
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Twilio Verify server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.02, help="up to this many extra random seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 503")
+    parser.add_argument("--code", default="123456", help="the code every verification accepts")
+    args = parser.parse_args()
+
+    import uvicorn
+    fake = FakeVerifyService(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, code=args.code)
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Concurrent load test: simulated users run weighted chat scenarios.
+
+Usage (from the project root):
+    python -m benchmarks.load_test --users 50 --duration 30
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --users 200 --duration 60
+    python -m benchmarks.load_test --threshold p95=50 --threshold otp:p99=400 --max-error-rate 0.01
+
+Without --url the app runs in-process over httpx's ASGI transport, fully
+offline: VERIFY_BACKEND=fake stands in for Twilio and sessions and users go
+to temporary SQLite files. Each simulated user has its own cookie jar and
+loops over scenarios picked by --mix weight until --duration is up:
+
+    browse   verified user clicking through menus and detail screens
+    signup   start, name, mobile number, OTP
+    courses  schools -> school -> course details, several courses deep
+    restart  /api/restart followed by a new conversation
+
+Prints throughput and p50/p95/p99 latency per step. Exits with status 1 if
+a --threshold or --max-error-rate is exceeded.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+DEFAULT_MIX = "browse=5,signup=2,courses=3,restart=1"
+
+class Stats:
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, step, seconds, ok):
+        self.latencies[step].append(seconds)
+        if not ok:
+            self.errors[step] += 1
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+class VirtualUser:
+
+    def __init__(self, client, stats, rng, otp_code, think_time):
+        self.client = client
+        self.stats = stats
+        self.rng = rng
+        self.otp_code = otp_code
+        self.think_time = think_time
+        self.session_id = ""
+
+    async def call(self, step, path, payload):
+        start = time.perf_counter()
+        try:
+            response = await self.client.post(path, json=payload)
+            data = response.json()
+            ok = response.status_code == 200 and not any(m.startswith("Error:") for m in data.get("messages", []))
+        except (httpx.HTTPError, ValueError):
+            data, ok = {}, False
+        self.stats.record(step, time.perf_counter() - start, ok)
+        if data.get("session_id"):
+            self.session_id = data["session_id"]
+        if self.think_time:
+            await asyncio.sleep(self.rng.random() * self.think_time)
+        return data
+
+    async def say(self, step, message):
+        return await self.call(step, "/api/message", {"session_id": self.session_id, "message": message})
+
+    def pick(self, data, prefix):
+        values = [b["value"] for b in data.get("buttons", []) if b["value"].startswith(prefix)]
+        return self.rng.choice(values) if values else None
+
+    async def signup(self):
+        self.client.cookies.clear()
+        self.session_id = ""
+        await self.call("start", "/api/start", {})
+        await self.say("name", f"Load{self.rng.randrange(10 ** 6)}")
+        await self.say("mobile", f"+919{self.rng.randrange(10 ** 9):09d}")
+        data = await self.say("otp", self.otp_code)
+        return data.get("input_type") == "button"
+
+    async def ensure_verified(self):
+        if self.session_id:
+            data = await self.say("menu", "main_menu")
+            if data.get("buttons"):
+                return data
+        if not await self.signup():
+            return None
+        return await self.say("menu", "main_menu")
+
+    async def browse(self):
+        menu = await self.ensure_verified()
+        if not menu:
+            return
+        for _ in range(self.rng.randint(2, 5)):
+            flow = self.pick(menu, "flow_")
+            if flow is None:
+                return
+            data = await self.say("menu", flow)
+            choice = self.pick(data, "")
+            if choice and choice not in ("main_menu", "exit", "restart"):
+                await self.say("detail", choice)
+            menu = await self.say("menu", "main_menu")
+
+    async def courses(self):
+        if not await self.ensure_verified():
+            return
+        schools = await self.say("schools", "flow_schools")
+        school = self.pick(schools, "school_")
+        if school is None:
+            return
+        courses = await self.say("school", school)
+        for _ in range(self.rng.randint(1, 4)):
+            course = self.pick(courses, "course_")
+            if course is None:
+                return
+            await self.say("course_detail", course)
+
+    async def restart(self):
+        await self.call("restart", "/api/restart", {"session_id": self.session_id})
+        self.session_id = ""
+        self.client.cookies.clear()
+        await self.signup()
+
+async def run_user(client, stats, scenarios, weights, deadline, seed, otp_code, think_time):
+    rng = random.Random(seed)
+    user = VirtualUser(client, stats, rng, otp_code, think_time)
+    while time.monotonic() < deadline:
+        scenario = rng.choices(scenarios, weights)[0]
+        await getattr(user, scenario)()
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("browse", "signup", "courses", "restart"):
+            raise SystemExit(f"Unknown scenario '{name}' in --mix")
+        weights[name.strip()] = float(weight or 1)
+    return list(weights), list(weights.values())
+
+def parse_threshold(text):
+    """'p95=50' (all steps) or 'otp:p99=400' -> (step or None, percentile, milliseconds)."""
+    target, _, limit = text.partition("=")
+    step, _, pct = target.rpartition(":")
+    if not pct.startswith("p") or not limit:
+        raise SystemExit(f"Bad --threshold '{text}', expected [step:]pNN=ms")
+    return step or None, float(pct[1:]), float(limit)
+
+def report(stats, elapsed, thresholds, max_error_rate):
+    total = sum(len(v) for v in stats.latencies.values())
+    errors = sum(stats.errors.values())
+    print(f"{'step':<14} {'count':>8} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    summary = {}
+    for step in sorted(stats.latencies):
+        values = sorted(stats.latencies[step])
+        row = {"count": len(values), "errors": stats.errors[step], "rps": len(values) / elapsed}
+        row.update({f"p{p}": percentile(values, p) * 1000 for p in (50, 95, 99)})
+        row["max"] = values[-1] * 1000
+        summary[step] = row
+        print(f"{step:<14} {row['count']:>8} {row['errors']:>7} {row['rps']:>9.1f} "
+              f"{row['p50']:>8.2f} {row['p95']:>8.2f} {row['p99']:>8.2f} {row['max']:>8.2f}")
+    error_rate = errors / total if total else 0.0
+    print(f"\n{total} requests in {elapsed:.1f}s = {total / elapsed:,.1f} req/s, error rate {error_rate:.2%}")
+
+    failures = []
+    for step, pct, limit in thresholds:
+        for name in ([step] if step else sorted(stats.latencies)):
+            values = sorted(stats.latencies.get(name, []))
+            if not values:
+                continue
+            value = percentile(values, pct) * 1000
+            if value > limit:
+                failures.append(f"{name} p{pct:g} {value:.2f}ms > {limit:g}ms")
+    if max_error_rate is not None and error_rate > max_error_rate:
+        failures.append(f"error rate {error_rate:.2%} > {max_error_rate:.2%}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return summary, failures
+
+def configure_offline(tmp):
+    """Environment for an in-process run; must be set before the app is imported."""
+    os.environ.setdefault("VERIFY_BACKEND", "fake")
+    os.environ.setdefault("SESSION_BACKEND", "sqlite")
+    os.environ.setdefault("SESSION_DB_PATH", os.path.join(tmp, "sessions.db"))
+    os.environ.setdefault("OTP_THROTTLE_DB_PATH", os.path.join(tmp, "sessions.db"))
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmp, 'users.db')}")
+    # Every simulated signup uses a fresh number, but restarts reuse a session key
+    os.environ.setdefault("OTP_SESSION_BURST", "1000000")
+
+async def run(args, app=None):
+    scenarios, weights = parse_mix(args.mix)
+    stats = Stats()
+    if app is not None:
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://loadtest"
+    else:
+        transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=args.users))
+        base_url = args.url.rstrip("/")
+    # One cookie jar per user, one shared transport/connection pool
+    clients = [httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout) for _ in range(args.users)]
+    if args.warmup:
+        await VirtualUser(clients[0], Stats(), random.Random(0), args.otp_code, 0).courses()
+    start = time.monotonic()
+    deadline = start + args.duration
+    await asyncio.gather(*[
+        run_user(client, stats, scenarios, weights, deadline, args.seed + i, args.otp_code, args.think_time)
+        for i, client in enumerate(clients)
+    ])
+    elapsed = time.monotonic() - start
+    await transport.aclose()
+    return stats, elapsed
+
+async def run_in_process(args):
+    from app.main import app
+    async with app.router.lifespan_context(app):
+        return await run(args, app)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="Base URL of a running server (default: in-process app)")
+    parser.add_argument("--users", type=int, default=50, help="Concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds to run")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Scenario weights (default {DEFAULT_MIX})")
+    parser.add_argument("--think-time", type=float, default=0, help="Max random pause after each step, seconds")
+    parser.add_argument("--otp-code", default="123456", help="Code accepted by the fake/dev verification")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+    parser.add_argument("--threshold", action="append", default=[], type=parse_threshold,
+                        help="[step:]pNN=ms, e.g. p95=50 or otp:p99=400 (repeatable)")
+    parser.add_argument("--max-error-rate", type=float)
+    parser.add_argument("--json", help="Also write the per-step summary to this file")
+    args = parser.parse_args()
+
+    if args.url:
+        stats, elapsed = asyncio.run(run(args))
+    else:
+        tmp = tempfile.mkdtemp(prefix="askgeeta-load-")
+        configure_offline(tmp)
+        stats, elapsed = asyncio.run(run_in_process(args))
+
+    summary, failures = report(stats, elapsed, args.threshold, args.max_error_rate)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"elapsed": elapsed, "users": args.users, "steps": summary, "failures": failures}, f, indent=2)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
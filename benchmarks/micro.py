@@ -0,0 +1,213 @@
+"""
+Micro-benchmarks for the flow handlers and data layer, without HTTP.
+
+Usage (from the project root):
+    python -m benchmarks.micro --save baselines/main.json
+    python -m benchmarks.micro --compare baselines/main.json [--tolerance 0.15 --fail-on-regression]
+    python -m benchmarks.micro --scale 500:20000 --filter handle_request
+
+Each case is timed timeit-style: the loop count is calibrated to ~0.2s, the
+loop is repeated --repeat times and the fastest run is reported (ns per
+call), which is the most stable figure on a noisy machine. --scale
+SCHOOLS:COURSES runs everything against a synthetic catalogue from
+benchmarks/synthetic_content.py to show how dispatch and lookups grow.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def build_cases():
+    """Returns [(name, zero-argument callable)]. Imports the app, so CONTENT_DIR must be set first."""
+    from app import content_snapshot, data_loader, responses, search, session
+    from app.router import BotResponse
+    from app.flows import manager, schools, courses, scholarships, campus, cocurricular, placements
+    from app.response_cache import response_cache
+
+    index = data_loader.get_index()
+    school_id = next(iter(index.schools))
+    course_id = next(c for c, course in index.courses.items() if course.get("has_details"))
+    last_course_id = next(reversed(index.courses))
+    scholarship_slug = next(iter(index.scholarships))
+    event_slug = next(iter(index.events))
+
+    sid = session.create_session("Bench")
+    user = session.get_session(sid)
+
+    # A compiled snapshot of the same content, for the cold load cases
+    snapshot_path = os.path.join(tempfile.mkdtemp(prefix="askgeeta-snapshot-"), "content.snapshot")
+    content_snapshot.build(data_loader.DATA_DIR, snapshot_path)
+
+    def cold_load(**kwargs):
+        content = data_loader.ContentRepository(data_loader.DATA_DIR, 3600, **kwargs).snapshot()
+        state = content.prebuilt.get("search")
+        return search.SearchIndex.from_state(state) if state else search.SearchIndex(content)
+
+    def first_choice(response, skip=("main_menu", "exit", "flow_schools")):
+        return next(b["value"] for b in response["buttons"] if b["value"] not in skip)
+
+    campus_choice = first_choice(campus.get_main_menu("Bench", sid))
+    placements_choice = first_choice(placements.get_placements_info("Bench", sid))
+
+    def in_state(state, fn, *args):
+        def run():
+            user["state"] = state
+            return fn(*args)
+        return run
+
+    def cached(state, choice):
+        response_cache.clear()
+        # The parent menu teaches the cache that `choice` is a real button payload
+        in_state("main_menu", manager.handle_request_cached, user, "flow_schools")()
+        run = in_state(state, manager.handle_request_cached, user, choice)
+        run()  # prime the entry
+        return run
+
+    cases = [
+        # Full dispatch through the transition table
+        ("manager.handle_request main_menu", in_state("schools_menu", manager.handle_request, user, "main_menu")),
+        ("manager.handle_request flow_schools", in_state("main_menu", manager.handle_request, user, "flow_schools")),
+        ("manager.handle_request school", in_state("schools_menu", manager.handle_request, user, f"school_{school_id}")),
+        ("manager.handle_request course", in_state("course_selection", manager.handle_request, user, f"course_{course_id}")),
+        ("manager.handle_request last course", in_state("course_selection", manager.handle_request, user, f"course_{last_course_id}")),
+        ("manager.handle_request course detail", in_state(f"course_detail_{course_id}", manager.handle_request, user, "detail_fees")),
+        ("manager.handle_request fallback", in_state("main_menu", manager.handle_request, user, "what are the fees?")),
+        ("search.search btech fees", lambda: search.search("btech fees")),
+        ("search.search no match", lambda: search.search("xyzzy")),
+        ("manager.handle_request_cached hit", cached("schools_menu", f"school_{school_id}")),
+        # Flow handlers called directly
+        ("schools.get_main_menu", lambda: schools.get_main_menu("Bench", sid)),
+        ("schools.handle_flow", in_state("schools_menu", schools.handle_flow, user, f"school_{school_id}")),
+        ("courses.get_courses_menu", lambda: courses.get_courses_menu("Bench", school_id, sid)),
+        ("courses.handle_flow", in_state("course_selection", courses.handle_flow, user, f"course_{course_id}")),
+        ("courses.handle_detail_view", in_state(f"course_detail_{course_id}", courses.handle_detail_view, user, "detail_curriculum")),
+        ("scholarships.get_scholarships_info", lambda: scholarships.get_scholarships_info("Bench", sid)),
+        ("scholarships.handle_flow", in_state("scholarships_view", scholarships.handle_flow, user, f"scholarship_{scholarship_slug}")),
+        ("campus.handle_flow", in_state("campus_menu", campus.handle_flow, user, campus_choice)),
+        ("cocurricular.handle_flow", in_state("cocurricular_view", cocurricular.handle_flow, user, f"event_{event_slug}")),
+        ("placements.handle_flow", in_state("placements_view", placements.handle_flow, user, placements_choice)),
+        ("manager.add_exit_button", lambda: manager.add_exit_button({"buttons": [{"text": "Back", "value": "main_menu"}]})),
+        # Response encoding: the direct path used by the chat endpoints vs FastAPI's response_model round trip
+        ("responses encode main menu", lambda: responses.dumps(responses.bot_response_body(manager.get_main_menu(sid)))),
+        ("BotResponse validate+dump main menu", lambda: BotResponse.model_validate(manager.get_main_menu(sid)).model_dump_json()),
+        # Data layer
+        ("data_loader.get_content", data_loader.get_content),
+        ("data_loader.get_index", data_loader.get_index),
+        ("data_loader.get_courses", data_loader.get_courses),
+        ("data_loader.get_schools", data_loader.get_schools),
+        ("data_loader.get_content_version", data_loader.get_content_version),
+        ("index.courses lookup", lambda: data_loader.get_index().courses.get(last_course_id)),
+        # Cold start: content, catalogue and search index from the JSON files vs a compiled snapshot
+        ("cold load JSON dir", cold_load),
+        ("cold load compiled snapshot", lambda: cold_load(snapshot_path=snapshot_path)),
+        # Course catalogue queries
+        ("catalog.query UG under fee", lambda: data_loader.get_catalog().query(
+            levels=["UG"], fee_ranges={"prog_fee_per_sem": (None, 60000)}, sort="prog_fee_per_sem")),
+        ("catalog.query all by tuition desc", lambda: data_loader.get_catalog().query(sort="tuition_fee", descending=True)),
+        ("catalog.query school PG", lambda: data_loader.get_catalog().query(schools=[school_id], levels=["PG"])),
+        # Sessions (the configured SESSION_BACKEND)
+        ("session.get_session", lambda: session.get_session(sid)),
+        ("session.update_session_state", lambda: session.update_session_state(sid, "main_menu", {"selected_school": school_id})),
+        ("session create+delete", lambda: session.delete_session(session.create_session("Tmp"))),
+    ]
+    return cases
+
+def measure(fn, repeat, target=0.2):
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * target / max(elapsed, 1e-9)))
+    runs = [t / number * 1e9 for t in timer.repeat(repeat=repeat, number=number)]
+    return {"ns": min(runs), "runs": [round(r, 1) for r in runs], "number": number}
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline, tolerance):
+    """Prints the change against `baseline`; returns names slower by more than `tolerance`."""
+    regressions = []
+    print(f"\n{'case':<44} {'baseline ns':>12} {'now ns':>12} {'change':>8}")
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<44} {'-':>12} {result['ns']:>12,.0f} {'new':>8}")
+            continue
+        change = result["ns"] / before["ns"] - 1
+        flag = ""
+        if change > tolerance:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -tolerance:
+            flag = "  faster"
+        print(f"{name:<44} {before['ns']:>12,.0f} {result['ns']:>12,.0f} {change:>+8.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--scale", help="SCHOOLS:COURSES synthetic catalogue, e.g. 500:20000")
+    parser.add_argument("--save", help="Write results as a JSON baseline to this path")
+    parser.add_argument("--compare", help="Compare against a JSON baseline written by --save")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Relative slowdown reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    # Keep the harness quiet and deterministic: no tracing, no content reload checks mid-run
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("CONTENT_RELOAD_INTERVAL", "3600")
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    content = {"dir": "data"}
+    if args.scale:
+        from benchmarks.synthetic_content import generate
+        schools, courses = (int(n) for n in args.scale.split(":"))
+        content_dir = tempfile.mkdtemp(prefix="askgeeta-content-")
+        content = dict(generate(content_dir, schools=schools, courses=courses), dir="synthetic")
+        os.environ["CONTENT_DIR"] = content_dir
+
+    results = {}
+    print(f"{'case':<44} {'ns/call':>12} {'calls/s':>12}")
+    for name, fn in build_cases():
+        if args.filter and args.filter not in name:
+            continue
+        result = measure(fn, args.repeat)
+        results[name] = result
+        print(f"{name:<44} {result['ns']:>12,.0f} {1e9 / result['ns']:>12,.0f}")
+
+    meta = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "session_backend": os.getenv("SESSION_BACKEND", "memory"),
+        "content": content,
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+        print(f"\nSaved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("content") != content:
+            print(f"\nWARNING: baseline was run on different content: {baseline['meta'].get('content')}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) slower than baseline by more than {args.tolerance:.0%}")
+            if args.fail_on_regression:
+                sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Replay chat traffic recorded with TRAFFIC_RECORD_PATH (see app/recorder.py).
+
+Usage (from the project root):
+    python -m benchmarks.replay traffic.jsonl                 # original pacing
+    python -m benchmarks.replay traffic.jsonl --speed 10      # 10x faster
+    python -m benchmarks.replay traffic.jsonl --speed max --url http://127.0.0.1:8000
+
+Each recorded conversation is replayed in order by its own client (cookie
+jar), starting at its recorded offset divided by --speed; `max` sends every
+request as soon as the previous one in its conversation has answered. The
+recorder's placeholders are filled with synthetic values: a made-up name and
+unique mobile number per conversation, --otp-code for <otp>, a wrong code for
+<wrong-otp> and "hello" for <text>. A start that carried a verified-device
+cookie is preceded by an unmeasured signup so the replay has one too.
+
+Every response is digested the same way the recorder did it, so the report
+shows per path how many answers differ from the recording, alongside replay
+latency and the latency the server recorded. Without --url the app runs
+in-process and offline, as in benchmarks/load_test.py. Exits with status 1
+on mismatches when --fail-on-mismatch is given.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from benchmarks.load_test import configure_offline, percentile
+
+def load_conversations(path):
+    """Returns ({conversation id: [events]} in recorded order, number of events skipped)."""
+    conversations = defaultdict(list)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                event = json.loads(line)
+                conversations[event["c"]].append(event)
+    skipped = 0
+    for c in list(conversations):
+        # Started before recording began (or the recorder forgot the session): nothing to replay against
+        if conversations[c][0].get("k"):
+            skipped += len(conversations.pop(c))
+    return dict(conversations), skipped
+
+class Results:
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.recorded = defaultdict(list)
+        self.mismatches = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.examples = []
+        self.max_lag = 0.0
+
+class ConversationReplay:
+
+    def __init__(self, client, number, args, results, semaphore):
+        self.client = client
+        self.args = args
+        self.results = results
+        self.semaphore = semaphore
+        self.name = f"Replay{number}"
+        self.mobile = f"+9190{number:08d}"
+        self.session_id = ""
+
+    def fill(self, message):
+        return {
+            "<name>": self.name,
+            "<mobile>": self.mobile,
+            "<otp>": self.args.otp_code,
+            "<wrong-otp>": "000000" if self.args.otp_code != "000000" else "999999",
+            "<text>": "hello",
+        }.get(message, message)
+
+    async def post(self, path, payload):
+        response = await self.client.post(path, json=payload)
+        data = response.json()
+        if path != "/api/restart" and data.get("session_id"):
+            self.session_id = data["session_id"]
+        return response.status_code, data
+
+    async def signup(self):
+        self.session_id = ""
+        await self.post("/api/start", {})
+        for message in (self.name, self.mobile, self.args.otp_code):
+            await self.post("/api/message", {"session_id": self.session_id, "message": message})
+
+    async def send(self, event):
+        from app.recorder import digest, normalize_response
+        path = event["p"]
+        if path == "/api/start":
+            if event.get("d"):
+                await self.signup()
+            else:
+                self.client.cookies.clear()
+            self.session_id = ""
+            payload = {}
+        elif path == "/api/restart":
+            payload = {"session_id": self.session_id}
+        elif path == "/api/message/batch":
+            payload = {"session_id": self.session_id, "messages": [self.fill(m) for m in event.get("m", [])],
+                       "mode": "all" if event.get("b") else "final"}
+        else:
+            payload = {"session_id": self.session_id, "message": self.fill(event.get("m"))}
+
+        start = time.perf_counter()
+        try:
+            async with self.semaphore:
+                status, data = await self.post(path, payload)
+        except (httpx.HTTPError, ValueError):
+            status, data = None, None
+        self.results.latencies[path].append(time.perf_counter() - start)
+        self.results.recorded[path].append(event.get("ms", 0) / 1000)
+        if path == "/api/restart":
+            self.session_id = ""
+        if status != event.get("s"):
+            self.results.errors[path] += 1
+        if data is None or digest(data, self.name) != event.get("h"):
+            self.results.mismatches[path] += 1
+            if len(self.results.examples) < self.args.show_mismatches:
+                self.results.examples.append((event, normalize_response(data or {}, self.name)))
+
+    async def run(self, events, origin, started):
+        for event in events:
+            if self.args.speed:
+                due = started + (event["ts"] - origin) / self.args.speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.results.max_lag = max(self.results.max_lag, -delay)
+            await self.send(event)
+
+async def replay(conversations, args, app=None):
+    results = Results()
+    if app is not None:
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://replay"
+    else:
+        transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=args.concurrency))
+        base_url = args.url.rstrip("/")
+    semaphore = asyncio.Semaphore(args.concurrency)
+    origin = min(events[0]["ts"] for events in conversations.values())
+    started = time.monotonic()
+    tasks = []
+    for number, events in enumerate(conversations.values()):
+        client = httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout)
+        tasks.append(ConversationReplay(client, number, args, results, semaphore).run(events, origin, started))
+    await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - started
+    await transport.aclose()
+    return results, elapsed
+
+async def replay_in_process(conversations, args):
+    from app.main import app
+    async with app.router.lifespan_context(app):
+        return await replay(conversations, args, app)
+
+def report(results, elapsed, recorded_span, speed):
+    total = sum(len(v) for v in results.latencies.values())
+    print(f"{'path':<20} {'count':>7} {'differ':>7} {'status':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'rec p50':>8} {'rec p95':>8}")
+    summary = {}
+    for path in sorted(results.latencies):
+        values = sorted(results.latencies[path])
+        recorded = sorted(results.recorded[path])
+        row = {"count": len(values), "mismatches": results.mismatches[path], "status_errors": results.errors[path]}
+        row.update({f"p{p}": percentile(values, p) * 1000 for p in (50, 95, 99)})
+        row.update({f"recorded_p{p}": percentile(recorded, p) * 1000 for p in (50, 95)})
+        summary[path] = row
+        print(f"{path:<20} {row['count']:>7} {row['mismatches']:>7} {row['status_errors']:>7} "
+              f"{row['p50']:>8.2f} {row['p95']:>8.2f} {row['p99']:>8.2f} "
+              f"{row['recorded_p50']:>8.2f} {row['recorded_p95']:>8.2f}")
+    pacing = "max speed" if not speed else f"{speed:g}x ({recorded_span:.1f}s recorded, fell behind by up to {results.max_lag * 1000:.0f}ms)"
+    print(f"\n{total} requests in {elapsed:.1f}s = {total / max(elapsed, 1e-9):,.1f} req/s at {pacing}")
+    for event, got in results.examples:
+        print(f"\nDIFFERS {event['c']} {event['p']} {event.get('m', '')!r}: got {json.dumps(got, ensure_ascii=False)[:300]}")
+    return summary
+
+def parse_speed(text):
+    return 0.0 if text == "max" else float(text)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("log", help="JSON-lines file written by TRAFFIC_RECORD_PATH")
+    parser.add_argument("--url", help="Base URL of a running server (default: in-process app)")
+    parser.add_argument("--speed", type=parse_speed, default=1.0, help="1 (recorded pacing), 10, ... or max")
+    parser.add_argument("--concurrency", type=int, default=100, help="Max requests in flight")
+    parser.add_argument("--otp-code", default="123456", help="Code accepted by the fake/dev verification")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--show-mismatches", type=int, default=5, help="Differing responses to print")
+    parser.add_argument("--fail-on-mismatch", action="store_true")
+    parser.add_argument("--json", help="Also write the per-path summary to this file")
+    args = parser.parse_args()
+
+    conversations, skipped = load_conversations(args.log)
+    if skipped:
+        print(f"Skipping {skipped} request(s) from conversations that started before recording")
+    if not conversations:
+        raise SystemExit("Nothing to replay")
+    timestamps = [e["ts"] for events in conversations.values() for e in events]
+    recorded_span = max(timestamps) - min(timestamps)
+
+    if args.url:
+        results, elapsed = asyncio.run(replay(conversations, args))
+    else:
+        configure_offline(tempfile.mkdtemp(prefix="askgeeta-replay-"))
+        os.environ.pop("TRAFFIC_RECORD_PATH", None)  # don't record the replay itself
+        results, elapsed = asyncio.run(replay_in_process(conversations, args))
+
+    summary = report(results, elapsed, recorded_span, args.speed)
+    mismatches = sum(results.mismatches.values())
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"elapsed": elapsed, "speed": args.speed or "max", "skipped": skipped, "paths": summary}, f, indent=2)
+    sys.exit(1 if args.fail_on_mismatch and mismatches else 0)
+
+if __name__ == "__main__":
+    main()
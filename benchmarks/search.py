@@ -0,0 +1,93 @@
+"""
+Benchmarks the free-text search index (app/search.py) as the catalogue grows.
+
+Usage (from the project root):
+    python -m benchmarks.search                      # real content, then 10x and 100x
+    python -m benchmarks.search --scales 1,100 --queries "btech fees" hostel
+
+For each scale a synthetic content directory is generated with
+benchmarks/synthetic_content.py (every record count multiplied by the
+scale), the index is built once and every query is timed over --rounds
+runs. Reports the build time, index size and per-query latency percentiles.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.data_loader import ContentRepository, get_index
+from app.search import SearchIndex, SEARCH_RESULTS
+from benchmarks.load_test import percentile
+from benchmarks.synthetic_content import generate
+
+DEFAULT_QUERIES = [
+    "btech fees", "hostel", "mba", "scholarship for sports", "placement package",
+    "phd eligibility", "tech fest", "data science career", "library timings", "xyzzy",
+]
+
+def bench_scale(scale, queries, rounds, limit):
+    index = get_index()
+    courses = len(index.courses)
+    with tempfile.TemporaryDirectory() as content_dir:
+        counts = generate(content_dir, len(index.schools) * scale, courses * scale,
+                          len(index.scholarships) * scale, len(index.events) * scale)
+        content = ContentRepository(content_dir, check_interval=3600).snapshot()
+
+    start = time.perf_counter()
+    search_index = SearchIndex(content)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    timings, hits = [], {}
+    for query in queries:
+        hits[query] = len(search_index.search(query, limit))
+        for _ in range(rounds):
+            start = time.perf_counter()
+            search_index.search(query, limit)
+            timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    return {
+        "scale": scale,
+        "records": len(search_index.records),
+        "screens": len(search_index.screens),
+        "terms": len(search_index.postings),
+        "postings": sum(len(p) for p in search_index.postings.values()),
+        "build_ms": round(build_ms, 1),
+        "query_us": {
+            "p50": round(percentile(timings, 50), 1),
+            "p95": round(percentile(timings, 95), 1),
+            "p99": round(percentile(timings, 99), 1),
+            "max": round(timings[-1], 1),
+        },
+        "content": counts,
+        "hits": hits,
+    }
+
+def report(results):
+    print(f"{'scale':>6} {'records':>7} {'screens':>7} {'terms':>7} {'postings':>9} {'build ms':>9} "
+          f"{'p50 us':>8} {'p95 us':>8} {'p99 us':>8} {'max us':>8}")
+    for r in results:
+        q = r["query_us"]
+        print(f"{r['scale']:>5}x {r['records']:>7} {r['screens']:>7} {r['terms']:>7} {r['postings']:>9} {r['build_ms']:>9} "
+              f"{q['p50']:>8} {q['p95']:>8} {q['p99']:>8} {q['max']:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scales", default="1,10,100", help="comma separated corpus multipliers")
+    parser.add_argument("--queries", nargs="+", default=DEFAULT_QUERIES)
+    parser.add_argument("--rounds", type=int, default=200, help="timed runs per query")
+    parser.add_argument("--limit", type=int, default=SEARCH_RESULTS)
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    results = [bench_scale(int(s), args.queries, args.rounds, args.limit) for s in args.scales.split(",")]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        report(results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compares session backends on the operations one chat click performs.
+
+Usage (from the project root):
+    python -m benchmarks.session_stores [--clicks 20000]
+
+Each simulated click does get_session() + update_session_state() on an
+existing session, the same as a menu navigation in manager.handle_request.
+"""
+import argparse
+import contextvars
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.session import InMemorySessionStore
+from app.session_backends import SQLiteSessionStore
+from app.session_tokens import TokenSessionStore
+from app.signing import Signer
+
+STATES = ["schools_menu", "course_selection", "course_detail_btech_cse", "main_menu"]
+
+def run_clicks(store, clicks, sessions=1000):
+    def verified_session(i):
+        sid = store.create(f"user{i}")
+        store.update(sid, "main_menu", {"mobile": "+919876543210"})
+        return store.current_id(sid)
+
+    ids = [contextvars.Context().run(verified_session, i) for i in range(sessions)]
+
+    timings = []
+    for n in range(clicks):
+        i = n % sessions
+
+        def click():
+            sid = ids[i]
+            session = store.get(sid)
+            store.update(sid, STATES[n % len(STATES)], {"selected_school": "cse"})
+            return store.current_id(session["id"])
+
+        start = time.perf_counter()
+        # Every click is its own request context, as under the ASGI server
+        ids[i] = contextvars.Context().run(click)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def report(name, timings, extra=""):
+    timings = sorted(timings)
+    p50 = timings[len(timings) // 2] * 1e6
+    p99 = timings[int(len(timings) * 0.99)] * 1e6
+    rate = len(timings) / sum(timings)
+    print(f"{name:<10} {statistics.mean(timings) * 1e6:>8.2f} {p50:>8.2f} {p99:>8.2f} {rate:>12,.0f}  {extra}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clicks", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'store':<10} {'mean µs':>8} {'p50 µs':>8} {'p99 µs':>8} {'clicks/s':>12}")
+    report("memory", run_clicks(InMemorySessionStore(), args.clicks))
+
+    token_store = TokenSessionStore(Signer([("bench", b"benchmark-key")]))
+    timings = run_clicks(token_store, args.clicks)
+    def deep_session():
+        sid = token_store.create("Rohan")
+        token_store.update(sid, "course_detail_btech_cse",
+                           {"mobile": "+919876543210", "selected_school": "cse", "selected_course": "btech_cse"})
+        return token_store.current_id(sid)
+
+    report("token", timings, f"(deep-state token {len(contextvars.Context().run(deep_session))} bytes)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_store = SQLiteSessionStore(os.path.join(tmp, "bench.db"))
+        sqlite_store.start_sweeper()
+        report("sqlite", run_clicks(sqlite_store, args.clicks), "(write-behind, local cache)")
+        sqlite_store.stop_sweeper()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Generates a synthetic content directory by scaling up the real data/ files.
+
+Usage (from the project root):
+    python -m benchmarks.synthetic_content /tmp/content --schools 200 --courses 5000
+    CONTENT_DIR=/tmp/content uvicorn app.main:app
+
+Schools, courses, scholarships and events are cloned from the real records
+with unique ids, names and fees, so every flow works unchanged on the larger
+catalogue. Campus and placement info is copied as is.
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import shutil
+from pathlib import Path
+
+# Not app.data_loader.BASE_DIR: importing the app here would load data/ before
+# callers get to point CONTENT_DIR at the generated catalogue
+SOURCE_DIR = Path(__file__).resolve().parent.parent / "data"
+
+def _load(name):
+    with open(SOURCE_DIR / name, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _write(out_dir, name, data):
+    with open(os.path.join(out_dir, name), "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+
+def generate(out_dir, schools=100, courses=2000, scholarships=50, events=50, seed=0):
+    """Writes a full content directory to `out_dir` and returns the number of records per file."""
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    real_schools = _load("schools.json")
+    real_courses = [c for school_courses in _load("courses.json").values() for c in school_courses]
+
+    school_list, course_map = [], {}
+    for i in range(schools):
+        school = copy.deepcopy(real_schools[i % len(real_schools)])
+        school["id"] = f"s{i}_{school['id']}"
+        school["name"] = f"{school['name']} (Campus {i})"
+        school_list.append(school)
+        course_map[school["id"]] = []
+
+    for i in range(courses):
+        course = copy.deepcopy(real_courses[i % len(real_courses)])
+        course["id"] = f"c{i}_{course['id']}"
+        course["name"] = f"{course['name']} #{i}"
+        fees = course.get("details", {}).get("fees")
+        if fees:
+            fees["prog_fee_per_sem"] = rng.randrange(20, 200) * 1000
+            fees["tuition_fee"] = fees["prog_fee_per_sem"] * 8
+        course_map[school_list[i % schools]["id"]].append(course)
+
+    def scaled(name, key, count):
+        records = _load(name)
+        out = []
+        for i in range(count):
+            record = copy.deepcopy(records[i % len(records)])
+            record[key] = f"{record[key]} {i}" if i >= len(records) else record[key]
+            out.append(record)
+        return out
+
+    _write(out_dir, "schools.json", school_list)
+    _write(out_dir, "courses.json", course_map)
+    _write(out_dir, "scholarships.json", scaled("scholarships.json", "title", scholarships))
+    _write(out_dir, "cocurricular.json", scaled("cocurricular.json", "name", events))
+    for name in ("campus.json", "placements.json"):
+        shutil.copyfile(SOURCE_DIR / name, os.path.join(out_dir, name))
+    return {"schools": schools, "courses": courses, "scholarships": scholarships, "events": events}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("out_dir")
+    parser.add_argument("--schools", type=int, default=100)
+    parser.add_argument("--courses", type=int, default=2000)
+    parser.add_argument("--scholarships", type=int, default=50)
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    counts = generate(args.out_dir, args.schools, args.courses, args.scholarships, args.events, args.seed)
+    print(f"Wrote {counts} to {args.out_dir}")
+
+if __name__ == "__main__":
+    main()
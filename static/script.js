@@ -1,4 +1,10 @@
 let sessionId = null;
+let prefetched = {}; // Responses the server sent ahead for the buttons on screen, by button value
+let pendingSync = Promise.resolve(); // Background call telling the server about a prefetched click
+let socket = null; // Open connection to /ws/chat, once the session is verified
+let shownAhead = []; // Per message in flight on the socket: the prefetched screen already shown, or null
+let heldBubbles = []; // Bubbles of a socket response held back while it may match what was shown
+let hideTyping = null;
 const chatBox = document.getElementById('chat-box');
 const inputArea = document.getElementById('input-area');
 const userInput = document.getElementById('user-input');
@@ -41,6 +47,8 @@ async function restartChat() {
 
         // Reset session ID to start fresh
         sessionId = null;
+        prefetched = {};
+        if (socket) socket.close();
 
         // Handle the restart response - no delays for instant restart
         if (data.session_id) {
@@ -66,6 +74,9 @@ function handleBotResponse(data) {
     if (data.session_id) {
         sessionId = data.session_id; // Store session
     }
+    if (data.session_id && data.input_type === 'button') {
+        connectSocket();
+    }
 
     // Display messages with delay
     let delay = 0;
@@ -107,6 +118,13 @@ function configureInput(data) {
         }
         userInput.focus();
     } else if (data.input_type === 'button') {
+        // Typed questions are answered in every state, so the text box stays next to the buttons
+        if (data.session_id) {
+            inputArea.classList.add('active');
+            userInput.type = 'text';
+            userInput.placeholder = "Or type your question...";
+        }
+
         const wrapper = document.createElement('div');
         wrapper.className = 'message-wrapper bot-wrapper';
         wrapper.style.paddingLeft = '45px'; // Offset for the icon space without showing the icon again
@@ -169,21 +187,51 @@ async function callMessageApi(messageOrValue) {
         return restartChat();
     }
 
+    // Show the next screen straight from memory, and update the server in the background
+    const ahead = prefetched[messageOrValue];
+    prefetched = {};
+    if (socket) {
+        if (ahead) {
+            showInstantly(ahead);
+        } else if (!hideTyping) {
+            hideTyping = showTypingIndicator(false);
+        }
+        await pendingSync;
+        if (!socket) {
+            addMessage("Connection lost. Please try again.", "bot", true);
+            return;
+        }
+        shownAhead.push(ahead || null);
+        socket.send(JSON.stringify({ session_id: sessionId, message: messageOrValue, prefetch: true }));
+        return;
+    }
+    if (ahead) {
+        showInstantly(ahead);
+        pendingSync = pendingSync
+            .then(() => fetchMessage(messageOrValue))
+            .then((data) => {
+                prefetched = data.prefetched || {};
+                // The server disagreed (e.g. the session expired): show what it actually said
+                if (!sameScreen(data, ahead)) handleBotResponse(data);
+            })
+            .catch((e) => console.error("Failed to sync prefetched choice", e));
+        return;
+    }
+
     // Show typing generic
     const removeTyping = await showTypingIndicator(false); // Immediate typing
 
     try {
-        const response = await fetch('/api/message', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                session_id: sessionId,
-                message: messageOrValue
-            })
-        });
+        await pendingSync; // Keep messages in order behind a background update
+        if (window.ReadableStream && window.TextDecoder) {
+            hideTyping = removeTyping; // Removed by the first frame
+            await streamMessage(messageOrValue); // Bubbles arrive paced by the server
+            return;
+        }
+        const data = await fetchMessage(messageOrValue);
 
         removeTyping(); // Remove "typing..." before handling response
-        const data = await response.json();
+        prefetched = data.prefetched || {};
         handleBotResponse(data);
 
     } catch (e) {
@@ -193,6 +241,132 @@ async function callMessageApi(messageOrValue) {
     }
 }
 
+async function fetchMessage(messageOrValue) {
+    const response = await fetch('/api/message', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            session_id: sessionId,
+            message: messageOrValue,
+            prefetch: true
+        })
+    });
+    const data = await response.json();
+    if (data.session_id) {
+        sessionId = data.session_id;
+    }
+    return data;
+}
+
+// NDJSON reply of /api/message: a header line, then one line per bubble as the server sends it
+async function streamMessage(messageOrValue) {
+    const response = await fetch('/api/message', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'Accept': 'application/x-ndjson' },
+        body: JSON.stringify({
+            session_id: sessionId,
+            message: messageOrValue,
+            prefetch: true
+        })
+    });
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let header = null;
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let end;
+        while ((end = buffer.indexOf('\n')) >= 0) {
+            const line = JSON.parse(buffer.slice(0, end));
+            buffer = buffer.slice(end + 1);
+            if (!header) {
+                header = line;
+                if (header.session_id) sessionId = header.session_id;
+            } else {
+                showFrame({ type: 'message', text: line.message });
+                showFrame({ type: 'typing' }); // Until the next line or the end of the stream
+            }
+        }
+    }
+    if (header) {
+        showFrame(Object.assign({ type: 'input' }, header));
+    } else {
+        showFrame({ type: 'error' });
+    }
+}
+
+function connectSocket() {
+    if (socket || !sessionId || !('WebSocket' in window)) return;
+    const scheme = location.protocol === 'https:' ? 'wss' : 'ws';
+    const ws = new WebSocket(`${scheme}://${location.host}/ws/chat?session_id=${encodeURIComponent(sessionId)}`);
+    ws.onopen = () => {
+        socket = ws;
+        shownAhead = [];
+        heldBubbles = [];
+    };
+    ws.onmessage = (event) => handleSocketFrame(JSON.parse(event.data));
+    ws.onclose = () => {
+        if (socket !== ws) return;
+        socket = null;
+        if (shownAhead.length) {
+            addMessage("Connection lost. Please try again.", "bot", true);
+        }
+    };
+}
+
+// Renders one frame of the streaming protocol (see app/streaming.py)
+function showFrame(frame) {
+    if (frame.type === 'typing') {
+        if (!hideTyping) hideTyping = showTypingIndicator(false);
+        return;
+    }
+    if (hideTyping) {
+        hideTyping();
+        hideTyping = null;
+    }
+    if (frame.type === 'message') {
+        addMessage(frame.text, 'bot');
+    } else if (frame.type === 'input') {
+        if (frame.session_id) sessionId = frame.session_id;
+        prefetched = frame.prefetched || {};
+        configureInput(frame);
+        if (frame.session_id && frame.input_type === 'button') connectSocket();
+    } else if (frame.type === 'error') {
+        addMessage("Sorry, something went wrong. Please try again.", "bot", true);
+    }
+}
+
+function handleSocketFrame(frame) {
+    const ahead = shownAhead[0];
+    if (frame.type === 'input' || frame.type === 'error') shownAhead.shift();
+    if (!ahead) return showFrame(frame);
+
+    // This screen was already shown from the prefetched copy; only update state unless it differs
+    if (frame.type === 'message') {
+        heldBubbles.push(frame.text);
+    } else if (frame.type === 'input') {
+        if (frame.session_id) sessionId = frame.session_id;
+        prefetched = frame.prefetched || {};
+        const actual = { messages: heldBubbles, buttons: frame.buttons, input_type: frame.input_type };
+        if (!sameScreen(actual, ahead)) {
+            heldBubbles.forEach((text) => addMessage(text, 'bot'));
+            configureInput(frame);
+        }
+        heldBubbles = [];
+    }
+}
+
+function showInstantly(data) {
+    data.messages.forEach((msg) => addMessage(msg, 'bot'));
+    configureInput(data);
+}
+
+function sameScreen(a, b) {
+    return JSON.stringify([a.messages, a.buttons, a.input_type]) === JSON.stringify([b.messages, b.buttons, b.input_type]);
+}
+
 function addMessage(text, sender, isError = false) {
     const div = document.createElement('div');
     div.className = `message-wrapper ${sender}-wrapper`;
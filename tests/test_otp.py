@@ -0,0 +1,14 @@
+import copy
+
+from app import otp
+from app.otp_throttle import MemoryThrottleBackend
+
+def test_replayed_record_does_not_reset_attempts():
+    engine = otp.OtpEngine(keys=[("k1", b"pepper")], max_attempts=5, attempts=MemoryThrottleBackend())
+    code, issued = engine.issue("+919999999999")
+    wrong = "000000" if code != "000000" else "111111"
+
+    # A token client replays the record it had before its first guess, every time
+    results = [engine.check(copy.deepcopy(issued), "+919999999999", wrong) for _ in range(6)]
+    assert results == [otp.WRONG] * 5 + [otp.LOCKED]
+    assert engine.check(copy.deepcopy(issued), "+919999999999", code) == otp.LOCKED
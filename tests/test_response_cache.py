@@ -0,0 +1,27 @@
+from app import session
+from app.flows import manager
+from app.response_cache import RenderedResponse, response_cache
+
+def choose(session_id, choice):
+    """Sends one button choice through the cached dispatcher, like /api/message does."""
+    response = manager.handle_request_cached(session.get_session(session_id), choice)
+    if isinstance(response, RenderedResponse):
+        return response.body().decode()
+    return str(response)
+
+def test_cache_hit_replays_context_the_handler_rewrote_unchanged():
+    # User A already has selected_course set when the course screen is rendered
+    # into a freshly cleared cache, so the handler's write changes nothing for A
+    a = session.create_session("A")
+    for choice in ("flow_schools", "school_cse", "course_btech_cse"):
+        choose(a, choice)
+    response_cache.clear()
+    for choice in ("school_cse", "course_btech_cse"):
+        choose(a, choice)
+
+    # User B gets the course screen from the cache and must still land on its details
+    b = session.create_session("B")
+    for choice in ("flow_schools", "school_cse", "course_btech_cse"):
+        choose(b, choice)
+    assert session.get_session(b)["context"]["selected_course"] == "btech_cse"
+    assert "Error retrieving details" not in choose(b, "detail_fees")
@@ -0,0 +1,14 @@
+from app import session
+from app.flows import manager
+
+def test_typed_question_is_searched_in_every_state():
+    sid = session.create_session("A")
+    for state in ("placements_view", "campus_menu", "scholarships_view", "course_selection", "schools_menu"):
+        session.update_session_state(sid, state)
+        response = manager.handle_request(session.get_session(sid), "hostel")
+        assert response["messages"] != ["Invalid selection."], state
+        assert response["messages"][0] == "Here is what I found that matches your question:", state
+
+def test_state_payloads_still_reach_their_flow():
+    assert manager.ROUTING.resolve("placements_view", "placements_recruiters").name == "placements_flow"
+    assert manager.ROUTING.resolve("placements_view", "hostel").name == "fallback"